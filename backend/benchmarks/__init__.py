@@ -0,0 +1 @@
+"""Standalone benchmarks (run with `python -m backend.benchmarks.<name>`)."""
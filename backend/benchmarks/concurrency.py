@@ -0,0 +1,144 @@
+"""Concurrent-request throughput: sync Session in async handlers vs AsyncSession.
+
+Both routes run the same aggregate query against a temporary SQLite file.
+"before" is the old pattern (blocking SessionLocal inside `async def`), which
+serializes all requests on the event loop; "after" is the async engine path.
+While the DB load runs, event-loop lag and the latency of a non-DB /ping route
+are sampled to show how long other requests wait behind a blocked loop. On a single core SQLite itself stays
+CPU-bound, so the DB req/s gain shows up mainly with more cores or a network
+database; the /ping latency difference shows up everywhere.
+
+    python -m backend.benchmarks.concurrency --requests 400 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker, aliased
+
+from ..database import Base, _async_url
+from ..models import User, Meal
+
+
+def _seed(url: str, meals: int):
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        user = User(telegram_id='bench')
+        db.add(user); db.flush()
+        day = datetime.utcnow().strftime('%Y-%m-%d')
+        db.add_all([Meal(user_id=user.id, food_name=f'meal {i}', calories=100 + i % 50, protein=10, carbs=20, fat=5, meal_type='lunch', day=day) for i in range(meals)])
+        db.commit()
+    engine.dispose()
+
+
+def _heavy_query():
+    # Self-join aggregate: cheap to write, slow enough (tens of ms) to expose blocking
+    other = aliased(Meal)
+    return select(func.count(), func.sum(Meal.calories)).select_from(Meal).join(other, other.user_id == Meal.user_id).where(other.calories > Meal.calories)
+
+
+def build_app(url: str) -> FastAPI:
+    sync_engine = create_engine(url, connect_args={"check_same_thread": False})
+    SyncSession = sessionmaker(bind=sync_engine)
+    async_engine = create_async_engine(_async_url(url))
+    AsyncSession = async_sessionmaker(async_engine)
+    app = FastAPI()
+
+    @app.get('/before')
+    async def before():
+        with SyncSession() as db:
+            return list(db.execute(_heavy_query()).one())
+
+    @app.get('/after')
+    async def after():
+        async with AsyncSession() as db:
+            return list((await db.execute(_heavy_query())).one())
+
+    @app.get('/ping')
+    async def ping():
+        return 'pong'
+
+    app.state.engines = (sync_engine, async_engine)
+    return app
+
+
+LAG_INTERVAL = 0.005
+
+
+def _pct(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[max(int(len(values) * q) - 1, 0)] * 1000 if values else 0.0
+
+
+async def _run(app: FastAPI, path: str, requests: int, concurrency: int) -> dict:
+    lags, pings = [], []
+    sem = asyncio.Semaphore(concurrency)
+    done = asyncio.Event()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://bench') as client:
+        await client.get(path)  # warm up pool / connections
+
+        async def one():
+            async with sem:
+                r = await client.get(path)
+                r.raise_for_status()
+
+        async def monitor():
+            # Event-loop lag: how late a 5 ms sleep wakes up while DB requests run
+            while not done.is_set():
+                t0 = time.perf_counter()
+                await asyncio.sleep(LAG_INTERVAL)
+                lags.append(time.perf_counter() - t0 - LAG_INTERVAL)
+
+        async def probe():
+            while not done.is_set():
+                t0 = time.perf_counter()
+                await asyncio.sleep(LAG_INTERVAL)
+                await client.get('/ping')
+                pings.append(time.perf_counter() - t0 - LAG_INTERVAL)
+
+        watchers = [asyncio.create_task(monitor()), asyncio.create_task(probe())]
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - t0
+        done.set()
+        await asyncio.gather(*watchers)
+    return {
+        'rps': requests / elapsed,
+        'lag_p95_ms': _pct(lags, 0.95),
+        'lag_max_ms': max(lags) * 1000 if lags else 0.0,
+        'ping_p50_ms': statistics.median(pings) * 1000 if pings else 0.0,
+        'ping_p95_ms': _pct(pings, 0.95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--meals', type=int, default=300)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        _seed(url, args.meals)
+        app = build_app(url)
+        print(f"{args.requests} requests, concurrency {args.concurrency}, {args.meals} meals")
+        for label, path in (('before (sync session)', '/before'), ('after (async session)', '/after')):
+            res = asyncio.run(_run(app, path, args.requests, args.concurrency))
+            print(f"{label:24s} {res['rps']:7.1f} req/s   loop lag p95 {res['lag_p95_ms']:6.1f} ms  max {res['lag_max_ms']:6.1f} ms"
+                  f"   /ping p50 {res['ping_p50_ms']:6.1f} ms  p95 {res['ping_p95_ms']:6.1f} ms")
+        sync_engine, async_engine = app.state.engines
+        sync_engine.dispose()
+        asyncio.run(async_engine.dispose())
+
+
+if __name__ == '__main__':
+    main()
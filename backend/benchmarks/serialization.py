@@ -0,0 +1,95 @@
+"""JSON serialization cost per 1k meal rows: default FastAPI path vs orjson fast path.
+
+Rows are loaded once from a temporary SQLite database; only building and
+serializing the response is timed:
+
+- "default": ORM instances -> MealOut models -> JSON-mode dump -> json.dumps
+  (what a `response_model` + JSONResponse endpoint does);
+- "orjson + models": the same models dumped to dicts and written by orjson
+  (ORJSONResponse as the default response class);
+- "orjson rows": SQLAlchemy `Row` tuples zipped with their field names and
+  written by orjson (the list_meals / history / weight_history fast path).
+
+    python -m backend.benchmarks.serialization --rows 1000 --repeat 50
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from ..database import Base
+from ..fast_json import dumps, rows_to_dicts
+from ..meal_schemas import MealOut
+from ..models import Meal, User
+
+
+def _seed(url: str, rows: int):
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        user = User(telegram_id='bench')
+        db.add(user); db.flush()
+        start = datetime(2024, 1, 1)
+        db.add_all([
+            Meal(user_id=user.id, food_name=f'Гречка с курицей {i}', calories=300.5 + i % 50, protein=20.1, carbs=35.2,
+                 fat=8.3, portion=150.0, meal_type='lunch', created_at=start + timedelta(minutes=7 * i))
+            for i in range(rows)
+        ])
+        db.commit()
+    return engine
+
+
+def _time(fn, repeat: int) -> float:
+    """Median seconds per call."""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    fields = list(MealOut.model_fields)
+    adapter = TypeAdapter(List[MealOut])
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = _seed(f"sqlite:///{os.path.join(tmp, 'bench.db')}", args.rows)
+        with sessionmaker(bind=engine)() as db:
+            meals = db.scalars(select(Meal)).all()
+            rows = db.execute(select(*[getattr(Meal, f) for f in fields])).all()
+        engine.dispose()
+
+    def default_path():
+        content = adapter.dump_python(adapter.validate_python([MealOut.model_validate(m) for m in meals]), mode='json')
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(',', ':')).encode()
+
+    def orjson_models():
+        return dumps([MealOut.model_validate(m).model_dump() for m in meals])
+
+    def orjson_rows():
+        return dumps(rows_to_dicts(rows, fields))
+
+    assert json.loads(default_path()) == json.loads(orjson_rows())
+    per_k = 1000 / args.rows
+    print(f"{args.rows} rows, median of {args.repeat} runs, ms per 1k rows")
+    base = None
+    for label, fn in (('default (models + json)', default_path), ('orjson + models', orjson_models), ('orjson rows', orjson_rows)):
+        ms = _time(fn, args.repeat) * 1000 * per_k
+        base = base or ms
+        print(f"{label:26s} {ms:8.3f} ms   x{base / ms:5.1f}   {len(fn()) / 1024:7.1f} KiB")
+
+
+if __name__ == '__main__':
+    main()
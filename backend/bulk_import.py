@@ -0,0 +1,303 @@
+"""Bulk import of historical weights and meals from CSV or NDJSON.
+
+The file is read as a stream (optionally gzip, detected by its magic bytes)
+and handled IMPORT_CHUNK records at a time, so memory does not depend on its
+size:
+
+- records are validated with the API schemas (WeightEntryIn, MealBatchItem);
+- weights are upserted with a bulk INSERT ... ON CONFLICT on
+  uq_user_weight_date, meals with a bulk INSERT ... ON CONFLICT DO NOTHING on
+  uq_meals_user_client (rows without a client_id get a content hash, so a
+  re-import does not duplicate them);
+- at the end every touched day's DailyLog is recomputed once with a bulk
+  upsert on uq_user_date (rollups follow) and progress is rebuilt.
+
+The format matches GET /export: NDJSON lines carry a "table" key
+(weight_entries / meals; daily_logs rows are derived and skipped), a CSV file
+holds one table and is recognized by its header (weight_kg -> weights).
+
+    python -m backend.bulk_import --user-id N weights.csv [--source device]
+"""
+import codecs
+import csv
+import gzip
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
+from typing import IO, Dict, Iterator, List, Optional, Tuple, Union
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from .config import get_settings
+from .daily_logs import dialect_insert, recalc_days
+from .food_catalog import portion_macros
+from .meal_schemas import MealBatchItem
+from .models import Food, Meal, User, WeightEntry
+from .schemas import WeightEntryIn
+from .utils import recalc_energy
+from . import data_version, frequent_foods, progress
+
+settings = get_settings()
+
+IMPORT_CHUNK = 500  # records per validation / INSERT round
+ERROR_SAMPLES = 20  # first errors reported back with their line numbers
+SOURCES = ('imported', 'device')
+WEIGHT_TABLES = ('weight_entries', 'weights')
+
+Record = Tuple[int, Union[dict, str]]  # (line number, parsed record or parse error)
+
+
+# ---- Reading ----
+def detect_format(filename: Optional[str], fmt: Optional[str] = None) -> str:
+    """`fmt` or the format implied by the file extension (.csv / .ndjson / .jsonl, optionally .gz)."""
+    if fmt:
+        return fmt
+    name = (filename or '').lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    raise ValueError("Unknown file format, pass format=csv|ndjson")
+
+
+def _text_lines(fileobj: IO[bytes]) -> Iterator[str]:
+    head = fileobj.read(2)
+    fileobj.seek(0)
+    raw = gzip.GzipFile(fileobj=fileobj, mode='rb') if head == b'\x1f\x8b' else fileobj
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    tail = ''
+    try:
+        while True:
+            block = raw.read(settings.PHOTO_UPLOAD_CHUNK)
+            text = tail + decoder.decode(block, final=not block)
+            lines = text.split('\n')
+            tail = lines.pop()
+            yield from (line + '\n' for line in lines)
+            if not block:
+                break
+    except UnicodeDecodeError:
+        raise ValueError("File is not valid UTF-8")
+    except (OSError, EOFError):
+        raise ValueError("Corrupt gzip stream")
+    if tail:
+        yield tail
+
+
+def read_records(fileobj: IO[bytes], fmt: str) -> Iterator[Record]:
+    """Records of the file, one at a time."""
+    if fmt == 'csv':
+        reader = csv.DictReader(_text_lines(fileobj))
+        for rec in reader:
+            yield reader.line_num, {k: (v if v != '' else None) for k, v in rec.items() if k}
+        return
+    for n, line in enumerate(_text_lines(fileobj), 1):
+        if not line.strip():
+            continue
+        try:
+            rec = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            yield n, "Invalid JSON"
+            continue
+        yield n, rec if isinstance(rec, dict) else "Expected a JSON object"
+
+
+def read_chunks(fileobj: IO[bytes], fmt: str, size: int = IMPORT_CHUNK) -> Iterator[List[Record]]:
+    chunk: List[Record] = []
+    for record in read_records(fileobj, fmt):
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ---- Validation ----
+def _error_text(e: ValidationError) -> str:
+    err = e.errors()[0]
+    loc = '.'.join(str(p) for p in err['loc'])
+    return f"{loc}: {err['msg']}" if loc else err['msg']
+
+
+def _utc_naive(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo is not None else value
+
+
+def _client_id(rec: dict) -> str:
+    """Stable idempotency key for meals exported without one."""
+    key = '|'.join(str(rec.get(f)) for f in ('id', 'created_at', 'food_name', 'food_id', 'calories', 'meal_type'))
+    return 'import-' + hashlib.sha1(key.encode()).hexdigest()[:24]
+
+
+def _weight_row(user_id: int, rec: dict, source: str, today: str) -> dict:
+    """Column values for a weigh-in; raises ValueError with a client-facing message."""
+    entry = WeightEntryIn.model_validate(dict(rec, source=rec.get('source') or source))
+    if not entry.date:
+        raise ValueError("date is required")
+    try:
+        date = datetime.strptime(entry.date[:10], '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        raise ValueError("date must be YYYY-MM-DD")
+    if date > today:
+        raise ValueError("date is in the future")
+    if not 0 < entry.weight_kg < 700:
+        raise ValueError("weight_kg out of range")
+    return {'user_id': user_id, 'date': date, 'weight_kg': entry.weight_kg, 'source': entry.source}
+
+
+def _meal_row(user_id: int, rec: dict, foods: Dict[int, Food], latest: datetime) -> dict:
+    """Column values for a meal; raises ValueError with a client-facing message."""
+    item = MealBatchItem.model_validate(dict(rec, client_id=rec.get('client_id') or _client_id(rec)))
+    if item.created_at is None:
+        raise ValueError("created_at is required")
+    created_at = _utc_naive(item.created_at)
+    if created_at > latest:
+        raise ValueError("created_at is in the future")
+    row = {
+        'user_id': user_id, 'client_id': item.client_id, 'meal_type': item.meal_type,
+        'created_at': created_at, 'day': created_at.strftime('%Y-%m-%d'), 'food_id': None, 'portion': item.portion,
+    }
+    if item.food_name and item.calories is not None:
+        # Logged values win over the catalog; keep the link only if the item still exists
+        row.update(food_name=item.food_name, calories=item.calories, protein=item.protein, carbs=item.carbs, fat=item.fat,
+                   food_id=item.food_id if item.food_id in foods else None)
+    elif item.food_id is not None:
+        food = foods.get(item.food_id)
+        if food is None:
+            raise ValueError("Food not found")
+        row.update(portion_macros(food, item.portion), food_name=item.food_name or food.name, food_id=food.id)
+    else:
+        raise ValueError("Provide food_id or food_name with calories")
+    return row
+
+
+# ---- Import ----
+class Importer:
+    """One import into `user`'s history; feed chunks with `add`, then call `finish` (neither commits)."""
+
+    def __init__(self, user: User, source: str = 'imported'):
+        self.user = user
+        self.source = source
+        self.today = datetime.utcnow().strftime('%Y-%m-%d')
+        self.days = set()  # meal days whose DailyLog must be recomputed
+        self.today_weight: Optional[float] = None
+        self.report = {'rows': 0, 'weights': 0, 'meals': 0, 'duplicates': 0, 'skipped': 0, 'errors': 0, 'error_samples': []}
+        self._t0 = time.perf_counter()
+
+    def _error(self, line: int, message: str):
+        self.report['errors'] += 1
+        if len(self.report['error_samples']) < ERROR_SAMPLES:
+            self.report['error_samples'].append({'line': line, 'error': message})
+
+    def add(self, db: Session, records: List[Record]):
+        self.report['rows'] += len(records)
+        weights: Dict[str, dict] = {}  # date -> row; the last weigh-in of a date wins
+        meals: List[Tuple[int, dict]] = []
+        for line, rec in records:
+            if isinstance(rec, str):
+                self._error(line, rec)
+                continue
+            rec = {k: v for k, v in rec.items() if v is not None}  # empty CSV cells, JSON nulls -> schema defaults
+            table = rec.get('table') or ('weight_entries' if 'weight_kg' in rec else 'meals')
+            if table in WEIGHT_TABLES:
+                try:
+                    row = _weight_row(self.user.id, rec, self.source, self.today)
+                except ValidationError as e:
+                    self._error(line, _error_text(e))
+                except ValueError as e:
+                    self._error(line, str(e))
+                else:
+                    weights[row['date']] = row
+            elif table == 'meals':
+                meals.append((line, rec))
+            else:
+                self.report['skipped'] += 1
+        if weights:
+            self._upsert_weights(db, list(weights.values()))
+        if meals:
+            self._insert_meals(db, meals)
+
+    def _upsert_weights(self, db: Session, rows: List[dict]):
+        insert = dialect_insert(db)
+        stmt = insert(WeightEntry)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[WeightEntry.user_id, WeightEntry.date],
+            set_={'weight_kg': stmt.excluded.weight_kg, 'source': stmt.excluded.source},
+        ), rows)
+        data_version.touch(db, self.user.id)
+        self.report['weights'] += len(rows)
+        for row in rows:
+            if row['date'] == self.today:
+                self.today_weight = row['weight_kg']
+
+    def _insert_meals(self, db: Session, meals: List[Tuple[int, dict]]):
+        food_ids = {int(r['food_id']) for _, r in meals if str(r.get('food_id', '')).isdigit()}
+        foods = {f.id: f for f in db.scalars(select(Food).where(Food.id.in_(food_ids)))} if food_ids else {}
+        latest = datetime.utcnow() + timedelta(seconds=settings.MEAL_BATCH_MAX_SKEW_SECONDS)
+        rows = []
+        for line, rec in meals:
+            try:
+                rows.append(_meal_row(self.user.id, rec, foods, latest))
+            except ValidationError as e:
+                self._error(line, _error_text(e))
+            except ValueError as e:
+                self._error(line, str(e))
+        if not rows:
+            return
+        insert = dialect_insert(db)
+        stmt = (
+            insert(Meal)
+            .on_conflict_do_nothing(index_elements=[Meal.user_id, Meal.client_id])
+            .returning(Meal.created_at, Meal.day, *[getattr(Meal, f) for f in frequent_foods.SNAPSHOT_FIELDS])
+        )
+        created = db.execute(stmt, rows).all()
+        self.report['meals'] += len(created)
+        self.report['duplicates'] += len(rows) - len(created)
+        self.days.update(r.day for r in created)
+        frequent_foods.record_many(db, self.user.id, [
+            ({f: getattr(r, f) for f in frequent_foods.SNAPSHOT_FIELDS}, r.created_at) for r in created
+        ])
+
+    def finish(self, db: Session) -> dict:
+        """Recompute touched days and progress; returns the report with throughput."""
+        self.report['days'] = recalc_days(db, self.user, sorted(self.days))
+        if self.today_weight is not None:
+            self.user.weight = self.today_weight
+            recalc_energy(self.user)
+        if self.report['weights'] or self.report['meals']:
+            progress.rebuild(db, user_id=self.user.id)
+        elapsed = time.perf_counter() - self._t0
+        self.report['seconds'] = round(elapsed, 3)
+        self.report['rows_per_sec'] = round(self.report['rows'] / elapsed, 1) if elapsed else 0.0
+        return self.report
+
+
+if __name__ == '__main__':
+    import argparse
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description='Import weights / meals into a user\'s history')
+    parser.add_argument('path')
+    parser.add_argument('--user-id', type=int, required=True)
+    parser.add_argument('--format', choices=('csv', 'ndjson'), default=None)
+    parser.add_argument('--source', choices=SOURCES, default='imported')
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        user = db.get(User, args.user_id)
+        if user is None:
+            raise SystemExit(f"user {args.user_id} not found")
+        importer = Importer(user, args.source)
+        with open(args.path, 'rb') as f:
+            for chunk in read_chunks(f, detect_format(args.path, args.format)):
+                importer.add(db, chunk)
+        report = importer.finish(db)
+        db.commit()
+    finally:
+        db.close()
+    for sample in report.pop('error_samples'):
+        print(f"line {sample['line']}: {sample['error']}")
+    print(' '.join(f"{k}={v}" for k, v in report.items()))
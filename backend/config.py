@@ -9,6 +9,61 @@ class Settings(BaseSettings):
     JWT_EXPIRE_MINUTES: int = 60 * 24
     PROJECT_NAME: str = "NutriAI API"
     ALLOW_ORIGINS: list[str] = ["http://localhost:5173"]
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: float = 60.0
+
+    # Connection pool (file SQLite and Postgres)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800  # seconds, -1 = never
+    DB_POOL_PRE_PING: bool = True
+
+    # SQLite PRAGMAs applied on every new connection
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE: int = -20000  # negative = KiB (here ~20 MB)
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+
+    # Photo analysis pipeline
+    MEDIA_DIR: str = "./media"
+    PHOTO_MAX_BYTES: int = 10 * 1024 * 1024
+    PHOTO_UPLOAD_CHUNK: int = 64 * 1024
+    PHOTO_WORKERS: int = 2  # process pool size, 0 = run in a thread (tests)
+    PHOTO_ANALYZER: str = "backend.photo_pipeline:stub_analyzer"
+    PHOTO_THUMB_PX: int = 512
+    IMAGE_STORE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024  # LRU-evict files above this
+    PHASH_MAX_DISTANCE: int = 6  # Hamming bits for a near-duplicate photo
+    PHASH_SCAN_LIMIT: int = 5000  # most recently used blobs compared per lookup
+
+    # Idempotency-Key replay store (per process)
+    IDEMPOTENCY_TTL_SECONDS: float = 24 * 3600
+    IDEMPOTENCY_MAX_ENTRIES: int = 50000
+    IDEMPOTENCY_MAX_BODY: int = 64 * 1024  # larger responses are not stored
+    IDEMPOTENCY_MAX_REQUEST_BODY: int = 256 * 1024  # larger (or non-JSON) requests bypass the store
+
+    # POST /meals/batch
+    MEAL_BATCH_MAX: int = 100
+    MEAL_BATCH_MAX_SKEW_SECONDS: int = 300  # tolerated client clock drift into the future
+
+    # Frequent / recent foods
+    FREQUENT_HALF_LIFE_DAYS: float = 14.0
+    FREQUENT_KEEP_PER_USER: int = 200
+
+    # Server-side response cache (overview, history)
+    RESPONSE_CACHE_BACKEND: str = "memory"  # memory | redis | fake-redis | off
+    RESPONSE_CACHE_URL: str = "redis://localhost:6379/0"
+    RESPONSE_CACHE_SIZE: int = 20000  # (user, endpoint) groups kept by the memory backend
+    RESPONSE_CACHE_TTL_SECONDS: float = 300.0
+
+    # Weight forecast cache (per user, keyed by data version)
+    FORECAST_CACHE_SIZE: int = 10000
+
+    # Telegram initData verification (POST /auth/telegram)
+    TELEGRAM_AUTH_MAX_AGE_SECONDS: int = 86400  # auth_date older than this is rejected
+    TELEGRAM_INITDATA_REUSE_SECONDS: float = 3600.0  # same init_data accepted again within this; later = replay, 0 = single use
+    TELEGRAM_INITDATA_CACHE_SIZE: int = 50000
 
     class Config:
         env_file = ".env"
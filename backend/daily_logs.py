@@ -0,0 +1,211 @@
+"""Incremental DailyLog maintenance and drift reconciliation.
+
+Meal writes apply their calorie / macro / meal-count delta to the matching
+DailyLog row, and to its weekly and monthly rollups, inside the caller's
+transaction (no re-summing, no extra commit). `reconcile` re-derives
+the totals from meals and repairs any drift; run it as a periodic job:
+
+    python -m backend.daily_logs --days 30
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from .models import User, Meal, DailyLog
+from . import data_version, rollups
+
+# Meal field -> DailyLog column maintained from it; meals_count counts the meals themselves
+LOG_FIELDS = {
+    'calories': 'calories',
+    'protein': 'protein',
+    'carbs': 'carbs',
+    'fat': 'fat',
+    'meals_count': 'meals_count',
+}
+COUNT_FIELD = 'meals_count'
+
+DRIFT_EPSILON = 0.01
+
+
+def meal_day(meal: Meal) -> str:
+    """Day the meal is accounted to; fills `meal.day` for not-yet-flushed meals."""
+    if not meal.day:
+        meal.day = (meal.created_at or datetime.utcnow()).strftime('%Y-%m-%d')
+    return meal.day
+
+
+def meal_values(meal) -> Dict[str, float]:
+    """Snapshot of the aggregated fields of a Meal or a meal column dict (zeros for None)."""
+    if meal is None:
+        return {f: 0 for f in LOG_FIELDS}
+    get = meal.get if isinstance(meal, dict) else (lambda f: getattr(meal, f))
+    values = {f: float(get(f) or 0) for f in LOG_FIELDS if f != COUNT_FIELD}
+    values[COUNT_FIELD] = 1
+    return values
+
+
+def _days_delta(before: int, after: int) -> int:
+    """Change in "days with meals" when a day's meal count goes from `before` to `after`."""
+    return (after > 0) - (before > 0)
+
+
+def meal_delta(before: Dict[str, float], after: Dict[str, float]) -> Dict[str, float]:
+    return {f: after[f] - before[f] for f in LOG_FIELDS}
+
+
+def apply_delta(db: Session, user: User, date: str, delta: Dict[str, float]):
+    """Add `delta` to the user's DailyLog for `date` and its rollups without committing.
+
+    One INSERT ... ON CONFLICT (user_id, date) DO UPDATE with column
+    arithmetic, RETURNING the new meal count, so concurrent first writes of a
+    day can't both insert.
+    """
+    if not any(delta.values()):
+        return
+    data_version.touch(db, user.id)
+    target = user.daily_calories
+    insert = dialect_insert(db)
+    first = {col: max(delta[f], 0) for f, col in LOG_FIELDS.items()}
+    stmt = insert(DailyLog).values(
+        user_id=user.id, date=date, target=target, deficit=(target - first['calories']) if target else None, **first,
+    )
+    values = {col: func.coalesce(getattr(DailyLog, col), 0) + delta[f] for f, col in LOG_FIELDS.items()}
+    values['target'] = target
+    values['deficit'] = (target - (func.coalesce(DailyLog.calories, 0) + delta['calories'])) if target else None
+    count = db.execute(
+        stmt.on_conflict_do_update(index_elements=[DailyLog.user_id, DailyLog.date], set_=values).returning(DailyLog.meals_count)
+    ).scalar_one()
+    rollups.apply(db, user.id, date, delta, _days_delta(count - delta[COUNT_FIELD], count))
+
+
+def dialect_insert(db: Session):
+    """INSERT construct with ON CONFLICT support for the session's backend."""
+    if db.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def add_water_l(db: Session, user_id: int, date: str, amount: float) -> float:
+    """Atomically add `amount` liters to the day's water (no commit); returns the new total.
+
+    One INSERT ... ON CONFLICT (user_id, date) DO UPDATE SET water_l = water_l + ?,
+    so concurrent adds can't lose updates and the row is created on first use.
+    """
+    data_version.touch(db, user_id)
+    insert = dialect_insert(db)
+    stmt = insert(DailyLog).values(user_id=user_id, date=date, calories=0, water_l=amount)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailyLog.user_id, DailyLog.date],
+        set_={'water_l': func.coalesce(DailyLog.water_l, 0) + stmt.excluded.water_l},
+    ).returning(DailyLog.water_l)
+    return db.execute(stmt).scalar_one()
+
+
+def _day_totals_query(db: Session):
+    cols = [func.coalesce(func.sum(getattr(Meal, f)), 0).label(f) for f in LOG_FIELDS if f != COUNT_FIELD]
+    cols.append(func.count(Meal.id).label(COUNT_FIELD))
+    return db.query(Meal.user_id, Meal.day, *cols).group_by(Meal.user_id, Meal.day)
+
+
+def recalc_day(db: Session, user: User, date: str) -> DailyLog:
+    """Full re-sum of one day's meals into its DailyLog (no commit); rollups get the difference."""
+    row = _day_totals_query(db).filter(Meal.user_id == user.id, Meal.day == date).first()
+    log = db.query(DailyLog).filter(DailyLog.user_id == user.id, DailyLog.date == date).first()
+    if not log:
+        log = DailyLog(user_id=user.id, date=date)
+        db.add(log)
+    before = {f: getattr(log, col) or 0 for f, col in LOG_FIELDS.items()}
+    for f, col in LOG_FIELDS.items():
+        setattr(log, col, getattr(row, f) if row else 0)
+    after = {f: getattr(log, col) or 0 for f, col in LOG_FIELDS.items()}
+    rollups.apply(db, user.id, date, meal_delta(before, after), _days_delta(before[COUNT_FIELD], after[COUNT_FIELD]))
+    log.target = user.daily_calories
+    log.deficit = (user.daily_calories - log.calories) if user.daily_calories else None
+    return log
+
+
+def recalc_days(db: Session, user: User, dates: List[str], chunk: int = 500) -> int:
+    """`recalc_day` for many days (no commit): one grouped re-sum, one upsert on uq_user_date
+    and one rollup upsert per chunk of days. Returns the number of days written."""
+    if not dates:
+        return 0
+    data_version.touch(db, user.id)
+    target = user.daily_calories
+    insert = dialect_insert(db)
+    cols = list(LOG_FIELDS.values())
+    for i in range(0, len(dates), chunk):
+        part = dates[i:i + chunk]
+        totals = {r.day: r for r in _day_totals_query(db).filter(Meal.user_id == user.id, Meal.day.in_(part))}
+        logs = {r.date: r for r in db.execute(
+            select(DailyLog.date, *[getattr(DailyLog, c) for c in cols]).where(DailyLog.user_id == user.id, DailyLog.date.in_(part))
+        )}
+        rows, changes = [], {}
+        for date in part:
+            row, log = totals.get(date), logs.get(date)
+            before = {f: (getattr(log, col) or 0) if log else 0 for f, col in LOG_FIELDS.items()}
+            after = {f: getattr(row, f) if row else 0 for f in LOG_FIELDS}
+            rows.append(dict(user_id=user.id, date=date, target=target, deficit=(target - after['calories']) if target else None,
+                             **{col: after[f] for f, col in LOG_FIELDS.items()}))
+            changes[date] = (meal_delta(before, after), _days_delta(before[COUNT_FIELD], after[COUNT_FIELD]))
+        stmt = insert(DailyLog)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[DailyLog.user_id, DailyLog.date],
+            set_={c: getattr(stmt.excluded, c) for c in cols + ['target', 'deficit']},
+        ), rows)
+        rollups.apply_many(db, user.id, changes)
+    return len(dates)
+
+
+def reconcile(db: Session, days: int = 30, user_id: Optional[int] = None) -> List[dict]:
+    """Compare DailyLog totals with meal sums for the last `days` days and fix drift.
+
+    Returns the list of repaired (user_id, date) rows with old/new values.
+    """
+    since = (datetime.utcnow().date() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    q = _day_totals_query(db).filter(Meal.day >= since)
+    logs_q = db.query(DailyLog).filter(DailyLog.date >= since)
+    if user_id is not None:
+        q = q.filter(Meal.user_id == user_id)
+        logs_q = logs_q.filter(DailyLog.user_id == user_id)
+    totals = {(r.user_id, r.day): r for r in q.all()}
+    logs = {(l.user_id, l.date): l for l in logs_q.all()}
+    users: Dict[int, User] = {}
+    repaired: List[dict] = []
+    for key in set(totals) | set(logs):
+        uid, date = key
+        row = totals.get(key)
+        log = logs.get(key)
+        expected = {f: float(getattr(row, f)) if row else 0.0 for f in LOG_FIELDS}
+        actual = {f: float(getattr(log, col) or 0) if log else None for f, col in LOG_FIELDS.items()}
+        if log is not None and all(abs(expected[f] - actual[f]) <= DRIFT_EPSILON for f in LOG_FIELDS):
+            continue
+        if log is None and not any(expected.values()):
+            continue
+        if uid not in users:
+            users[uid] = db.get(User, uid)
+        if users[uid] is None:
+            continue
+        recalc_day(db, users[uid], date)
+        repaired.append({'user_id': uid, 'date': date, 'before': actual, 'after': expected})
+    db.commit()
+    return repaired
+
+
+if __name__ == '__main__':
+    import argparse
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description='Repair DailyLog drift against meal totals')
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--user-id', type=int, default=None)
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        fixed = reconcile(db, days=args.days, user_id=args.user_id)
+    finally:
+        db.close()
+    for r in fixed:
+        print(f"user={r['user_id']} date={r['date']} before={r['before']} after={r['after']}")
+    print(f"repaired {len(fixed)} daily log(s)")
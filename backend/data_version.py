@@ -0,0 +1,77 @@
+"""Per-user data version for conditional GETs.
+
+`User.data_version` is bumped once per committed transaction that wrote the
+user's meals, daily logs, weight entries, progress or profile. Read handlers
+turn it into a weak ETag and answer `If-None-Match` with 304 before loading
+anything else, so an unchanged tab switch costs one primary-key lookup.
+
+ORM writes are picked up from the flush automatically; bulk/Core statements
+(UPDATE ... SET col = col + x, INSERT ... ON CONFLICT) call `touch` instead.
+"""
+import hashlib
+from typing import Optional
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+from .models import DailyLog, Meal, User, UserProgress, WeightEntry
+
+_PENDING = 'data_version.pending'
+_TRACKED = (Meal, DailyLog, WeightEntry, UserProgress)
+
+
+def touch(db: Session, *user_ids: int):
+    """Bump these users' version when the current transaction commits."""
+    db.info.setdefault(_PENDING, set()).update(user_ids)
+
+
+def current(db: Session, user_id: int) -> int:
+    return db.scalar(select(User.data_version).where(User.id == user_id)) or 0
+
+
+def etag(user_id: int, version: int, *parts) -> str:
+    """Weak ETag; `parts` are inputs that change the response without a write (e.g. today's date)."""
+    salt = hashlib.sha1('|'.join(str(p) for p in parts).encode()).hexdigest()[:8]
+    return f'W/"{user_id}.{version}.{salt}"'
+
+
+def matches(if_none_match: Optional[str], tag: str) -> bool:
+    """Weak comparison against an If-None-Match header value."""
+    if not if_none_match:
+        return False
+    bare = tag[2:]
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or (candidate[2:] if candidate.startswith('W/') else candidate) == bare:
+            return True
+    return False
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect(session: Session, flush_context, instances):
+    users = set()
+    for obj in session.new | session.deleted:
+        if isinstance(obj, _TRACKED):
+            users.add(obj.user_id)
+    for obj in session.dirty:
+        if isinstance(obj, _TRACKED + (User,)) and session.is_modified(obj, include_collections=False):
+            users.add(obj.id if isinstance(obj, User) else obj.user_id)
+    users.discard(None)
+    if users:
+        touch(session, *users)
+
+
+@event.listens_for(Session, 'before_commit')
+def _bump(session: Session):
+    session.flush()
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        # updated_at is kept as is: it tracks profile edits, not data changes
+        session.execute(
+            update(User).where(User.id.in_(sorted(pending)))
+            .values(data_version=User.data_version + 1, updated_at=User.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session: Session):
+    session.info.pop(_PENDING, None)
@@ -1,14 +1,146 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from .config import get_settings
+from . import metrics
 import os
+import threading
+import time
+
+settings = get_settings()
 
 DB_URL = os.getenv("DATABASE_URL", "sqlite:///./nutriai_fresh.db")
 
-if DB_URL.startswith("sqlite"):
-    engine = create_engine(DB_URL, connect_args={"check_same_thread": False})
+
+def _async_url(url: str) -> str:
+    """Map a sync DATABASE_URL to its asyncio driver (aiosqlite / asyncpg)."""
+    scheme, sep, rest = url.partition("://")
+    base = scheme.split("+", 1)[0]
+    if base == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if base in ("postgres", "postgresql"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    return url
+
+
+ASYNC_DB_URL = os.getenv("ASYNC_DATABASE_URL", _async_url(DB_URL))
+
+
+# ---- Pool metrics ----
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total_s += seconds
+            self.wait_max_s = max(self.wait_max_s, seconds)
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            data = {
+                'checkouts': self.checkouts,
+                'connects': self.connects,
+                'timeouts': self.timeouts,
+                'wait_avg_ms': round(self.wait_total_s / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'wait_max_ms': round(self.wait_max_s * 1000, 3),
+            }
+        if isinstance(pool, QueuePool):
+            data.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+        return data
+
+
+class _TimedPoolMixin:
+    """Times how long a checkout waits for a free connection."""
+    stats: PoolStats
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            self.stats.record_wait(time.perf_counter() - t0, timed_out=True)
+            raise
+        self.stats.record_wait(time.perf_counter() - t0)
+        return conn
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep the counters attached
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _pool_kwargs(url: str, poolclass) -> dict:
+    if url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith(":")):
+        return {}  # in-memory SQLite keeps SQLAlchemy's single-connection pool
+    return {
+        "poolclass": poolclass,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA cache_size={int(settings.SQLITE_CACHE_SIZE)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.close()
+
+
+def _instrument(name: str, sync_engine, is_sqlite: bool):
+    stats = PoolStats()
+    pool = sync_engine.pool
+    if isinstance(pool, _TimedPoolMixin):
+        pool.stats = stats
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        stats.connects += 1
+        if is_sqlite:
+            _sqlite_pragmas(dbapi_connection, connection_record)
+
+    metrics.register_stats(f"db_pool_{name}", lambda: stats.snapshot(sync_engine.pool))
+
+
+_is_sqlite = DB_URL.startswith("sqlite")
+
+# Sync engine: startup migrations and CLI jobs
+if _is_sqlite:
+    engine = create_engine(DB_URL, connect_args={"check_same_thread": False}, **_pool_kwargs(DB_URL, TimedQueuePool))
 else:
-    engine = create_engine(DB_URL)
+    engine = create_engine(DB_URL, **_pool_kwargs(DB_URL, TimedQueuePool))
+_instrument("sync", engine, _is_sqlite)
+
+# Async engine: request handlers
+async_engine = create_async_engine(ASYNC_DB_URL, **_pool_kwargs(ASYNC_DB_URL, TimedAsyncAdaptedQueuePool))
+_instrument("async", async_engine.sync_engine, ASYNC_DB_URL.startswith("sqlite"))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
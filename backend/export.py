@@ -0,0 +1,96 @@
+"""Streaming export of a user's meals, daily logs and weight entries.
+
+Rows are read through `AsyncSession.stream` with `yield_per` (a server-side
+cursor on Postgres, chunked fetches on SQLite) and written out one partition
+at a time, optionally through an incremental gzip compressor, so memory use
+does not depend on the size of the history.
+
+- `ndjson`: one JSON object per line with a "table" key; any set of tables.
+- `csv`: one table per file, header row first.
+"""
+import csv
+import io
+import zlib
+from datetime import date, datetime
+from typing import AsyncIterator, Iterable, List, Sequence, Tuple
+import orjson
+from sqlalchemy import select
+from .database import AsyncSessionLocal
+from .models import DailyLog, Meal, WeightEntry
+
+EXPORT_CHUNK = 1000  # rows per fetch / written block
+
+# table -> (model, exported columns, order)
+TABLES = {
+    'meals': (Meal, ('id', 'created_at', 'day', 'meal_type', 'food_name', 'calories', 'protein', 'carbs', 'fat',
+                     'portion', 'food_id', 'image_url', 'notes', 'client_id'), ('created_at', 'id')),
+    'daily_logs': (DailyLog, ('date', 'calories', 'protein', 'carbs', 'fat', 'meals_count', 'target', 'deficit',
+                              'water_l', 'sleep_h'), ('date',)),
+    'weight_entries': (WeightEntry, ('date', 'weight_kg', 'source'), ('date',)),
+}
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def _query(table: str, user_id: int):
+    model, columns, order = TABLES[table]
+    return (
+        select(*[getattr(model, c) for c in columns])
+        .where(model.user_id == user_id)
+        .order_by(*[getattr(model, c) for c in order])
+        .execution_options(yield_per=EXPORT_CHUNK)
+    )
+
+
+def _csv_value(value):
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+
+def _csv_block(rows: Iterable[Sequence], header: Sequence[str] = ()) -> bytes:
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    if header:
+        writer.writerow(header)
+    writer.writerows([_csv_value(v) for v in r] for r in rows)
+    return buf.getvalue().encode()
+
+
+def _ndjson_block(table: str, columns: Sequence[str], rows: Iterable[Sequence]) -> bytes:
+    keys = ('table',) + tuple(columns)
+    return b''.join(orjson.dumps(dict(zip(keys, (table, *r)))) + b'\n' for r in rows)
+
+
+async def _blocks(user_id: int, tables: List[str], fmt: str) -> AsyncIterator[bytes]:
+    async with AsyncSessionLocal() as db:
+        for table in tables:
+            columns = TABLES[table][1]
+            if fmt == 'csv':
+                yield _csv_block((), columns)
+            result = await db.stream(_query(table, user_id))
+            async for rows in result.partitions():
+                yield _csv_block(rows) if fmt == 'csv' else _ndjson_block(table, columns, rows)
+
+
+async def stream(user_id: int, tables: List[str], fmt: str, gzip: bool = False) -> AsyncIterator[bytes]:
+    """Export body as a byte stream (gzip member when `gzip`)."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    async for block in _blocks(user_id, tables, fmt):
+        if compressor is None:
+            yield block
+        else:
+            out = compressor.compress(block)
+            if out:
+                yield out
+    if compressor is not None:
+        yield compressor.flush()
+
+
+def parse_tables(value: str, fmt: str) -> Tuple[List[str], str]:
+    """Validated table list for the request; raises ValueError with a client-facing message."""
+    tables = list(TABLES) if value == 'all' else [t.strip() for t in value.split(',') if t.strip()]
+    unknown = [t for t in tables if t not in TABLES]
+    if unknown or not tables:
+        raise ValueError(f"Unknown table: {', '.join(unknown) or value}")
+    if fmt == 'csv' and len(tables) != 1:
+        raise ValueError("CSV export takes a single table")
+    name = tables[0] if len(tables) == 1 else 'all'
+    return tables, name
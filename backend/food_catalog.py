@@ -0,0 +1,333 @@
+"""Food catalog: bulk loading and an in-memory autocomplete index.
+
+The index maps every normalized name token to a NumPy posting array, so a
+prefix lookup is a bisect over the sorted vocabulary plus one array slice;
+multi-word queries AND the per-word masks, so every word must prefix-match
+some word of the name. Normalization lowercases, folds `ё` -> `е` and `й` -> `и`,
+strips Latin diacritics and punctuation, so "Гречка, отварная" is found by "гречка отв".
+When prefixes give fewer than `limit` hits, misspelled words ("плв",
+"chiken") fall back to vocabulary tokens with similar padded trigrams
+(Dice >= TRIGRAM_MIN_SIMILARITY), ranked by similarity.
+The index is built lazily from the foods table and dropped after an
+in-process load; an API process picks up a CLI load on restart.
+
+Bulk load (CSV with a header row, a JSON array or NDJSON):
+
+    python -m backend.food_catalog load foods.csv [--replace]
+
+Recognized columns: name, brand, calories, protein, carbs, fat, portion_g
+(macros per 100 g).
+"""
+import bisect
+import csv
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+import numpy as np
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+from .models import Food
+from . import metrics
+
+LOAD_CHUNK = 5000
+TRIGRAM_MIN_SIMILARITY = 0.4  # Dice coefficient of padded trigrams for a typo match
+FUZZY_TOKENS = 16  # closest vocabulary tokens tried per query word
+
+_SPLIT_RE = re.compile(r"[^0-9a-zа-я]+")
+_NEEDS_NFKD = re.compile(r"[^\x00-\x7fа-я]")
+_FOLD = str.maketrans({'ё': 'е', 'й': 'и'})
+
+
+def normalize(text: str) -> str:
+    text = text.lower().translate(_FOLD)
+    if _NEEDS_NFKD.search(text):
+        # Strip combining marks (Latin accents) only for names that have them
+        text = ''.join(ch for ch in unicodedata.normalize('NFKD', text) if not unicodedata.combining(ch))
+    return ' '.join(t for t in _SPLIT_RE.split(text) if t)
+
+
+def trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FoodHit(NamedTuple):
+    id: int
+    name: str
+    brand: Optional[str]
+    calories: float
+    protein: float
+    carbs: float
+    fat: float
+    portion_g: Optional[float]
+
+
+class FoodIndex:
+    """Token-prefix index in CSR form.
+
+    Items are stored in rank order (shorter normalized names first), so an
+    item's position doubles as its rank. `vocab` is the sorted token list and
+    `postings[offsets[i]:offsets[i + 1]]` are the positions containing
+    `vocab[i]`; a prefix maps to a contiguous vocab range and hence to one
+    slice of `postings`. The fuzzy fallback has the same layout one level up:
+    `gram_postings[gram_offsets[g]:gram_offsets[g + 1]]` are the vocab ids
+    containing trigram `g`.
+    """
+
+    def __init__(self, rows: Iterable[FoodHit]):
+        t0 = time.perf_counter()
+        keyed = sorted(((normalize(f"{r.name} {r.brand or ''}"), r) for r in rows), key=lambda x: (len(x[0]), x[0]))
+        self.items: List[FoodHit] = [r for _, r in keyed]
+        self.norm: List[str] = [n for n, _ in keyed]
+        by_token: Dict[str, List[int]] = {}
+        for pos, norm in enumerate(self.norm):
+            for tok in set(norm.split()):
+                by_token.setdefault(tok, []).append(pos)
+        self.vocab: List[str] = sorted(by_token)
+        sizes = np.fromiter((len(by_token[t]) for t in self.vocab), dtype=np.int64, count=len(self.vocab))
+        self.offsets = np.concatenate(([0], np.cumsum(sizes)))
+        self.postings = np.fromiter((p for t in self.vocab for p in by_token[t]), dtype=np.int32, count=int(self.offsets[-1]))
+        by_gram: Dict[str, List[int]] = {}
+        for tid, tok in enumerate(self.vocab):
+            for gram in trigrams(tok):
+                by_gram.setdefault(gram, []).append(tid)
+        self.gram_ids: Dict[str, int] = {g: i for i, g in enumerate(by_gram)}
+        self.gram_offsets = np.concatenate(([0], np.cumsum([len(v) for v in by_gram.values()], dtype=np.int64)))
+        self.gram_postings = np.fromiter((t for v in by_gram.values() for t in v), dtype=np.int32, count=int(self.gram_offsets[-1]))
+        self.token_grams = np.fromiter((len(trigrams(t)) for t in self.vocab), dtype=np.int32, count=len(self.vocab))
+        self.build_ms = round((time.perf_counter() - t0) * 1000, 1)
+
+    def __len__(self):
+        return len(self.items)
+
+    def _prefix_positions(self, word: str) -> np.ndarray:
+        lo = bisect.bisect_left(self.vocab, word)
+        hi = bisect.bisect_left(self.vocab, word + '\uffff', lo)
+        return self.postings[self.offsets[lo]:self.offsets[hi]]
+
+    def _similar_tokens(self, word: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(vocab ids, Dice similarity) of the closest tokens by shared trigrams, best first."""
+        grams = trigrams(word)
+        ids = [self.gram_ids[g] for g in grams if g in self.gram_ids]
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        hits = np.concatenate([self.gram_postings[self.gram_offsets[g]:self.gram_offsets[g + 1]] for g in ids])
+        common = np.bincount(hits, minlength=len(self.vocab))
+        tids = np.flatnonzero(common)
+        sims = 2 * common[tids] / (len(grams) + self.token_grams[tids])
+        keep = sims >= TRIGRAM_MIN_SIMILARITY
+        tids, sims = tids[keep], sims[keep]
+        order = np.argsort(-sims, kind='stable')[:FUZZY_TOKENS]
+        return tids[order], sims[order]
+
+    def _prefix_search(self, words: List[str], limit: int) -> List[int]:
+        # Every query word must prefix-match some token of the name
+        mask = None
+        for word in sorted(set(words), key=len, reverse=True):
+            hits = self._prefix_positions(word)
+            if not len(hits):
+                return []
+            word_mask = np.zeros(len(self.items), dtype=bool)
+            word_mask[hits] = True
+            mask = word_mask if mask is None else (mask & word_mask)
+        candidates = np.flatnonzero(mask)[:limit * 4].tolist()  # already in rank order
+        # Names starting with the typed phrase come first
+        phrase = ' '.join(words)
+        candidates.sort(key=lambda pos: not self.norm[pos].startswith(phrase))
+        return candidates[:limit]
+
+    def _fuzzy_search(self, words: List[str], limit: int, exclude: Set[int]) -> List[int]:
+        # Every query word must prefix-match (score 1) or resemble some token of the name
+        total = np.zeros(len(self.items))
+        ok = np.ones(len(self.items), dtype=bool)
+        for word in set(words):
+            score = np.zeros(len(self.items))
+            score[self._prefix_positions(word)] = 1.0
+            for tid, sim in zip(*self._similar_tokens(word)):
+                pos = self.postings[self.offsets[tid]:self.offsets[tid + 1]]
+                score[pos] = np.maximum(score[pos], sim)
+            ok &= score > 0
+            total += score
+        candidates = np.flatnonzero(ok)
+        if exclude:
+            candidates = candidates[~np.isin(candidates, list(exclude))]
+        # Most similar first, rank (position) breaks ties
+        order = np.lexsort((candidates, -total[candidates]))[:limit]
+        return candidates[order].tolist()
+
+    def search(self, query: str, limit: int = 10) -> List[FoodHit]:
+        words = normalize(query).split()
+        if not words:
+            return []
+        found = self._prefix_search(words, limit)
+        if len(found) < limit:
+            found += self._fuzzy_search(words, limit - len(found), set(found))
+        return [self.items[pos] for pos in found]
+
+
+# ---- Shared index ----
+_lock = threading.Lock()
+_index: Optional[FoodIndex] = None
+_stats = {'searches': 0, 'search_ms_total': 0.0, 'search_ms_max': 0.0}
+
+
+def _load_rows(db: Session) -> Iterator[FoodHit]:
+    q = select(Food.id, Food.name, Food.brand, Food.calories, Food.protein, Food.carbs, Food.fat, Food.portion_g)
+    for r in db.execute(q.execution_options(yield_per=LOAD_CHUNK)):
+        yield FoodHit(*r)
+
+
+def get_index(db: Session) -> FoodIndex:
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = FoodIndex(_load_rows(db))
+    return _index
+
+
+def warm() -> FoodIndex:
+    """Build the index with a private session, or wait for a build in progress (blocking; run off the event loop)."""
+    from .database import SessionLocal
+    db = SessionLocal()
+    try:
+        return get_index(db)
+    finally:
+        db.close()
+
+
+def invalidate():
+    global _index
+    with _lock:
+        _index = None
+
+
+def loaded_index() -> Optional[FoodIndex]:
+    return _index
+
+
+def search(index: FoodIndex, query: str, limit: int = 10) -> List[FoodHit]:
+    t0 = time.perf_counter()
+    hits = index.search(query, limit)
+    ms = (time.perf_counter() - t0) * 1000
+    with _lock:
+        _stats['searches'] += 1
+        _stats['search_ms_total'] += ms
+        _stats['search_ms_max'] = max(_stats['search_ms_max'], ms)
+    return hits
+
+
+def stats() -> dict:
+    with _lock:
+        data = dict(_stats)
+        index = _index
+    n = data.pop('search_ms_total')
+    data['search_ms_avg'] = round(n / data['searches'], 3) if data['searches'] else 0.0
+    data['search_ms_max'] = round(data['search_ms_max'], 3)
+    data['items'] = len(index) if index is not None else None
+    data['build_ms'] = index.build_ms if index is not None else None
+    return data
+
+
+metrics.register_stats('food_index', stats)
+
+
+# ---- Portions ----
+def portion_macros(food, portion_g: Optional[float]) -> Dict[str, float]:
+    """Macros for `portion_g` grams of a per-100 g catalog item (default: its serving or 100 g)."""
+    grams = portion_g or food.portion_g or 100.0
+    k = grams / 100.0
+    return {
+        'portion': grams,
+        'calories': round(food.calories * k, 1),
+        'protein': round((food.protein or 0) * k, 1),
+        'carbs': round((food.carbs or 0) * k, 1),
+        'fat': round((food.fat or 0) * k, 1),
+    }
+
+
+# ---- Bulk load ----
+def _float(value, default=None):
+    if value is None or value == '':
+        return default
+    return float(str(value).replace(',', '.'))
+
+
+def read_dump(path: str) -> Iterator[dict]:
+    """Yield catalog rows from a CSV (header row), JSON array or NDJSON file."""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        if ext == '.csv':
+            rows: Iterable[dict] = csv.DictReader(f)
+        elif ext == '.json':
+            rows = json.load(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for raw in rows:
+            name = (raw.get('name') or '').strip()
+            if not name or _float(raw.get('calories')) is None:
+                continue
+            yield {
+                'name': name,
+                'brand': (raw.get('brand') or '').strip() or None,
+                'calories': _float(raw.get('calories')),
+                'protein': _float(raw.get('protein'), 0.0),
+                'carbs': _float(raw.get('carbs'), 0.0),
+                'fat': _float(raw.get('fat'), 0.0),
+                'portion_g': _float(raw.get('portion_g')),
+            }
+
+
+def load(db: Session, rows: Iterable[dict], source: Optional[str] = None, replace: bool = False) -> int:
+    """Insert catalog rows in executemany chunks and commit; returns the row count."""
+    if replace:
+        db.execute(delete(Food))
+    total = 0
+    chunk: List[dict] = []
+    for row in rows:
+        chunk.append(dict(row, source=source))
+        if len(chunk) >= LOAD_CHUNK:
+            db.execute(insert(Food), chunk)
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        db.execute(insert(Food), chunk)
+        total += len(chunk)
+    db.commit()
+    invalidate()
+    return total
+
+
+if __name__ == '__main__':
+    import argparse
+    from .database import SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description='Food catalog maintenance')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p_load = sub.add_parser('load', help='bulk load a CSV / JSON / NDJSON dump')
+    p_load.add_argument('path')
+    p_load.add_argument('--replace', action='store_true', help='delete existing catalog rows first')
+    p_search = sub.add_parser('search', help='query the index (prints timing)')
+    p_search.add_argument('query')
+    args = parser.parse_args()
+    Food.__table__.create(bind=engine, checkfirst=True)
+    db = SessionLocal()
+    try:
+        if args.cmd == 'load':
+            t0 = time.perf_counter()
+            n = load(db, read_dump(args.path), source=os.path.basename(args.path), replace=args.replace)
+            dt = time.perf_counter() - t0
+            print(f"loaded {n} food(s) in {dt:.2f}s ({n / dt if dt else 0:.0f} rows/s)")
+        else:
+            index = get_index(db)
+            t0 = time.perf_counter()
+            hits = index.search(args.query)
+            print(f"{len(index)} items, built in {index.build_ms} ms, query {(time.perf_counter() - t0) * 1000:.3f} ms")
+            for h in hits:
+                print(f"{h.id}\t{h.name}\t{h.brand or ''}\t{h.calories} kcal/100g")
+    finally:
+        db.close()
@@ -0,0 +1,179 @@
+"""Weight forecast: robust trend over weigh-ins blended with the intake estimate.
+
+- Trend: Theil-Sen slope over the last WEIGHT_WINDOW_DAYS of WeightEntry
+  (median of pairwise slopes, so a single bad weigh-in can't tilt it); the
+  current level is the fitted line plus an exponentially decayed mean of the
+  residuals (EMA_HALF_LIFE_DAYS), i.e. a smoothed "trend weight".
+- Intake: mean DailyLog.deficit of the last INTAKE_LOGS logs / 7700 kcal per kg.
+- Blend: the trend's share grows with the number and span of weigh-ins;
+  with fewer than two weigh-ins the forecast is intake-only.
+- Bands: 80% interval from the level uncertainty plus the slope uncertainty
+  growing with the horizon.
+
+Everything after loading is vectorized with NumPy. Results are cached per
+user keyed by the user's data version (bumped by weight, log and profile
+writes), the date and the horizon, so repeated calls cost no DB work.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from .config import get_settings
+from .models import DailyLog, WeightEntry
+from . import metrics
+
+settings = get_settings()
+
+KCAL_PER_KG = 7700.0
+WEIGHT_WINDOW_DAYS = 90
+INTAKE_LOGS = 14
+EMA_HALF_LIFE_DAYS = 7.0
+FULL_TRUST_ENTRIES = 8  # weigh-ins needed before the trend fully replaces intake
+FULL_TRUST_SPAN_DAYS = 21  # ...spread over at least this many days
+WEIGH_IN_NOISE_KG = 0.6  # day-to-day scale noise, used when residuals can't be estimated
+INTAKE_MODEL_ERROR = 0.25  # relative error of the kcal/kg rule (adaptation, water shifts)
+BAND_Z = 1.2816  # 80% two-sided
+METHOD = "theil_sen_ema_intake_blend"
+
+
+# ---- Inputs ----
+def load_inputs(db: Session, user_id: int, today: str) -> Tuple[List[tuple], List[float]]:
+    """(date, kg) weigh-ins of the window, oldest first, and the recent deficits."""
+    since = (datetime.strptime(today, '%Y-%m-%d').date() - timedelta(days=WEIGHT_WINDOW_DAYS - 1)).isoformat()
+    weights = db.execute(
+        select(WeightEntry.date, WeightEntry.weight_kg)
+        .where(WeightEntry.user_id == user_id, WeightEntry.date >= since, WeightEntry.date <= today, WeightEntry.weight_kg.isnot(None))
+        .order_by(WeightEntry.date)
+    ).all()
+    deficits = db.scalars(
+        select(DailyLog.deficit)
+        .where(DailyLog.user_id == user_id, DailyLog.deficit.isnot(None))
+        .order_by(DailyLog.date.desc()).limit(INTAKE_LOGS)
+    ).all()
+    return [tuple(r) for r in weights], list(deficits)
+
+
+# ---- Model ----
+def theil_sen(t: np.ndarray, y: np.ndarray) -> Tuple[float, float]:
+    """Median pairwise slope and median intercept."""
+    i, j = np.triu_indices(len(t), 1)
+    slope = float(np.median((y[j] - y[i]) / (t[j] - t[i])))
+    return slope, float(np.median(y - slope * t))
+
+
+def _trend(t: np.ndarray, y: np.ndarray) -> Tuple[float, float, float, float]:
+    """(level today, slope kg/day, level sd, slope sd) from weigh-ins at day offsets `t` (<= 0)."""
+    slope, intercept = theil_sen(t, y)
+    resid = y - (intercept + slope * t)
+    sigma = max(1.4826 * float(np.median(np.abs(resid - np.median(resid)))), 0.1)
+    w = np.exp2(t / EMA_HALF_LIFE_DAYS)
+    level = intercept + float(np.dot(w, resid) / w.sum())
+    n_eff = w.sum() ** 2 / np.dot(w, w)
+    sxx = float(np.sum((t - t.mean()) ** 2))
+    return level, slope, sigma / np.sqrt(n_eff), sigma / np.sqrt(sxx)
+
+
+def forecast(weights: List[tuple], deficits: List[float], profile_weight: Optional[float],
+             target_weight: Optional[float], today: str, days: int) -> dict:
+    """WeightForecastResponse fields; raises ValueError when there is nothing to extrapolate."""
+    today_d = datetime.strptime(today, '%Y-%m-%d').date()
+    n = len(weights)
+    if n == 0 and not profile_weight:
+        raise ValueError("Current weight unknown")
+    if n < 2 and not deficits:
+        raise ValueError("Not enough data")
+
+    intake_slope = se_intake = None
+    avg_deficit = 0.0
+    if deficits:
+        d = np.asarray(deficits, dtype=float)
+        avg_deficit = float(d.mean())
+        intake_slope = -avg_deficit / KCAL_PER_KG
+        se_mean = float(d.std(ddof=1)) / np.sqrt(len(d)) / KCAL_PER_KG if len(d) > 1 else abs(intake_slope)
+        se_intake = float(np.hypot(se_mean, INTAKE_MODEL_ERROR * intake_slope))
+
+    trend_slope = None
+    share = 0.0
+    if n >= 2:
+        t = np.array([(datetime.strptime(day, '%Y-%m-%d').date() - today_d).days for day, _ in weights], dtype=float)
+        y = np.array([kg for _, kg in weights], dtype=float)
+        level, trend_slope, se_level, se_trend = _trend(t, y)
+        span = float(t[-1] - t[0])
+        share = 1.0 if intake_slope is None else min(1.0, n / FULL_TRUST_ENTRIES) * min(1.0, span / FULL_TRUST_SPAN_DAYS)
+    else:
+        level = float(weights[-1][1]) if n else float(profile_weight)
+        se_level = WEIGH_IN_NOISE_KG
+        se_trend = 0.0
+
+    slope = share * (trend_slope or 0.0) + (1 - share) * (intake_slope or 0.0)
+    se_slope = float(np.hypot(share * se_trend, (1 - share) * (se_intake or 0.0)))
+
+    d = np.arange(days + 1)
+    est = level + slope * d
+    band = BAND_Z * np.sqrt(se_level ** 2 + (d * se_slope) ** 2)
+    dates = (np.datetime64(today_d) + d).astype(str)
+    cumulative = avg_deficit * (d + 1)
+
+    target_date = None
+    if target_weight and slope and (target_weight - level) / slope > 0:
+        target_date = (today_d + timedelta(days=int(np.ceil((target_weight - level) / slope)))).isoformat()
+
+    rnd = lambda a, k: np.round(a, k).tolist()  # noqa: E731
+    points = [
+        {'day': int(i), 'date': dt, 'est_weight': w, 'cumulative_deficit': c, 'lower': lo, 'upper': hi}
+        for i, dt, w, c, lo, hi in zip(d.tolist(), dates.tolist(), rnd(est, 2), rnd(cumulative, 1), rnd(est - band, 2), rnd(est + band, 2))
+    ]
+    return {
+        'start_weight': round(level, 2),
+        'target_weight': target_weight,
+        'daily_avg_deficit': round(avg_deficit, 1),
+        'weekly_change_kg': round(slope * 7, 3),
+        'points': points,
+        'method': METHOD,
+        'trend_kg_per_week': round(trend_slope * 7, 3) if trend_slope is not None else None,
+        'intake_kg_per_week': round(intake_slope * 7, 3) if intake_slope is not None else None,
+        'trend_share': round(share, 2),
+        'weight_entries': n,
+        'target_date': target_date,
+    }
+
+
+# ---- Per-user cache ----
+_lock = threading.Lock()
+_cache: "OrderedDict[int, Tuple[tuple, bytes]]" = OrderedDict()
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+def cached(user_id: int, key: tuple) -> Optional[bytes]:
+    """Serialized forecast for `key` (data version, date, horizon), or None."""
+    with _lock:
+        entry = _cache.get(user_id)
+        if entry is not None and entry[0] == key:
+            _cache.move_to_end(user_id)
+            _stats['hits'] += 1
+            return entry[1]
+        _stats['misses'] += 1
+        return None
+
+
+def store(user_id: int, key: tuple, body: bytes):
+    with _lock:
+        _cache[user_id] = (key, body)
+        _cache.move_to_end(user_id)
+        while len(_cache) > settings.FORECAST_CACHE_SIZE:
+            _cache.popitem(last=False)
+            _stats['evictions'] += 1
+
+
+def stats() -> dict:
+    with _lock:
+        data = dict(_stats, size=len(_cache))
+    lookups = data['hits'] + data['misses']
+    data['hit_ratio'] = round(data['hits'] / lookups, 4) if lookups else 0.0
+    return data
+
+
+metrics.register_stats('forecast', stats)
@@ -0,0 +1,202 @@
+"""Per-user frequent / recent foods, maintained on meal writes.
+
+Every (food name, macros, meal type) combination a user logs has one
+UserFood row. Its score is a time-decayed use count with a
+FREQUENT_HALF_LIFE_DAYS half-life. Instead of decaying all rows as time
+passes, each use at time t adds 2 ** (t / half_life) and the row keeps the
+log2 of the sum: ranking by `log_score` equals ranking by the decayed
+score at any common "now", so a write touches one row and a read is an
+index range scan. Rows beyond FREQUENT_KEEP_PER_USER are trimmed.
+
+    python -m backend.frequent_foods --rebuild [--user-id N]
+"""
+import math
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from .config import get_settings
+from .daily_logs import dialect_insert
+from .food_catalog import normalize
+from .models import Meal, UserFood
+
+settings = get_settings()
+
+EPOCH = datetime(2024, 1, 1)
+SNAPSHOT_FIELDS = ('food_name', 'food_id', 'calories', 'protein', 'carbs', 'fat', 'meal_type')
+
+
+def snapshot(meal: Meal) -> Dict:
+    return {f: getattr(meal, f) for f in SNAPSHOT_FIELDS}
+
+
+def combo_key(snap: Dict) -> str:
+    macros = '|'.join(f"{float(snap[f] or 0):.1f}" for f in ('calories', 'protein', 'carbs', 'fat'))
+    return f"{normalize(snap['food_name'] or '')}|{macros}|{snap['meal_type'] or ''}"
+
+
+def _weight_log2(when: datetime) -> float:
+    """log2 of one use's contribution at `when`."""
+    return (when.replace(tzinfo=None) - EPOCH).total_seconds() / 86400.0 / settings.FREQUENT_HALF_LIFE_DAYS
+
+
+def _log2_add(a: float, b: float) -> float:
+    hi, lo = max(a, b), min(a, b)
+    return hi + math.log2(1 + 2 ** (lo - hi))
+
+
+def _log2_sub(a: float, b: float) -> Optional[float]:
+    """log2(2**a - 2**b), None when nothing (meaningful) remains."""
+    if b >= a:
+        return None
+    rest = 1 - 2 ** (b - a)
+    return a + math.log2(rest) if rest > 1e-12 else None
+
+
+def decayed_score(log_score: float, now: Optional[datetime] = None) -> float:
+    """Use count decayed to `now` (1.0 = one use right now)."""
+    return 2 ** (log_score - _weight_log2(now or datetime.utcnow()))
+
+
+def _new_row(user_id: int, key: str, snap: Dict, when: datetime) -> UserFood:
+    return UserFood(
+        user_id=user_id, combo_key=key, count=1, log_score=_weight_log2(when), last_used_at=when,
+        food_name=snap['food_name'], food_id=snap.get('food_id'), meal_type=snap.get('meal_type'),
+        calories=snap['calories'], protein=snap.get('protein') or 0, carbs=snap.get('carbs') or 0, fat=snap.get('fat') or 0,
+    )
+
+
+def _new_values(user_id: int, key: str, items: List[Tuple[Dict, datetime]]) -> dict:
+    """Column values of a new row holding all of `items` (uses of one combination)."""
+    snap = items[0][0]
+    log_score = _weight_log2(items[0][1])
+    for _, when in items[1:]:
+        log_score = _log2_add(log_score, _weight_log2(when))
+    food_ids = [s['food_id'] for s, _ in items if s.get('food_id')]
+    return dict(
+        user_id=user_id, combo_key=key, count=len(items), log_score=log_score, last_used_at=max(w for _, w in items),
+        food_name=snap['food_name'], food_id=food_ids[-1] if food_ids else None, meal_type=snap.get('meal_type'),
+        calories=snap['calories'], protein=snap.get('protein') or 0, carbs=snap.get('carbs') or 0, fat=snap.get('fat') or 0,
+    )
+
+
+def _locked_rows(db: Session, user_id: int, keys: List[str]) -> Dict[str, UserFood]:
+    q = select(UserFood).where(UserFood.user_id == user_id, UserFood.combo_key.in_(keys)).with_for_update()
+    return {r.combo_key: r for r in db.scalars(q)}
+
+
+def record(db: Session, user_id: int, snap: Dict, when: Optional[datetime], sign: int = 1):
+    """Add (+1) or remove (-1) one use of the combination (no commit)."""
+    record_many(db, user_id, [(snap, when)], sign)
+
+
+def record_many(db: Session, user_id: int, uses: Iterable[Tuple[Dict, Optional[datetime]]], sign: int = 1):
+    """Add or remove several uses with one lookup of the affected rows (no commit).
+
+    New combinations are inserted with ON CONFLICT DO NOTHING; one that a
+    concurrent request created first is re-read and counted onto that row.
+    """
+    by_key: Dict[str, List[Tuple[Dict, datetime]]] = {}
+    for snap, when in uses:
+        if not snap.get('food_name') or snap.get('calories') is None:
+            continue
+        by_key.setdefault(combo_key(snap), []).append((snap, (when or datetime.utcnow()).replace(tzinfo=None)))
+    if not by_key:
+        return
+    rows = _locked_rows(db, user_id, list(by_key))
+    added = False
+    missing = [k for k in by_key if k not in rows]
+    if sign > 0 and missing:
+        insert = dialect_insert(db)
+        stmt = (
+            insert(UserFood)
+            .on_conflict_do_nothing(index_elements=[UserFood.user_id, UserFood.combo_key])
+            .returning(UserFood.combo_key)
+        )
+        created = {r.combo_key for r in db.execute(stmt, [_new_values(user_id, k, by_key[k]) for k in missing])}
+        for key in created:
+            del by_key[key]
+        added = bool(created)
+        raced = [k for k in missing if k not in created]
+        if raced:
+            rows.update(_locked_rows(db, user_id, raced))
+    for key, items in by_key.items():
+        row = rows.get(key)
+        for snap, when in items:
+            w = _weight_log2(when)
+            if sign < 0:
+                if row is None:
+                    break
+                row.count -= 1
+                left = _log2_sub(row.log_score, w)
+                if row.count <= 0 or left is None:
+                    db.delete(row)
+                    row = None
+                else:
+                    row.log_score = left
+            else:
+                row.count += 1
+                row.log_score = _log2_add(row.log_score, w)
+                row.last_used_at = max(row.last_used_at, when)
+                row.food_id = snap.get('food_id') or row.food_id
+    if added:
+        db.flush()
+        _trim(db, user_id)
+
+
+def _trim(db: Session, user_id: int):
+    keep = select(UserFood.id).where(UserFood.user_id == user_id).order_by(UserFood.log_score.desc()).limit(settings.FREQUENT_KEEP_PER_USER)
+    db.execute(delete(UserFood).where(UserFood.user_id == user_id, UserFood.id.notin_(keep)).execution_options(synchronize_session=False))
+
+
+def top(db: Session, user_id: int, limit: int = 10, sort: str = 'frequent') -> List[UserFood]:
+    order = UserFood.last_used_at.desc() if sort == 'recent' else UserFood.log_score.desc()
+    return list(db.scalars(select(UserFood).where(UserFood.user_id == user_id).order_by(order).limit(limit)))
+
+
+def rebuild(db: Session, user_id: Optional[int] = None) -> int:
+    """Regenerate UserFood rows from the meals table (no commit); returns meals scanned."""
+    q = delete(UserFood)
+    mq = select(Meal.user_id, Meal.created_at, *[getattr(Meal, f) for f in SNAPSHOT_FIELDS])
+    if user_id is not None:
+        q = q.where(UserFood.user_id == user_id)
+        mq = mq.where(Meal.user_id == user_id)
+    db.execute(q)
+    rows: Dict[tuple, UserFood] = {}
+    n = 0
+    for r in db.execute(mq.order_by(Meal.user_id, Meal.created_at).execution_options(yield_per=5000)):
+        n += 1
+        snap = {f: getattr(r, f) for f in SNAPSHOT_FIELDS}
+        if not snap['food_name'] or snap['calories'] is None:
+            continue
+        when = (r.created_at or datetime.utcnow()).replace(tzinfo=None)
+        key = (r.user_id, combo_key(snap))
+        row = rows.get(key)
+        if row is None:
+            rows[key] = _new_row(r.user_id, key[1], snap, when)
+        else:
+            row.count += 1
+            row.log_score = _log2_add(row.log_score, _weight_log2(when))
+            row.last_used_at = max(row.last_used_at, when)
+    db.add_all(rows.values())
+    db.flush()
+    for uid in {k[0] for k in rows}:
+        _trim(db, uid)
+    return n
+
+
+if __name__ == '__main__':
+    import argparse
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description='Rebuild per-user frequent foods from meal history')
+    parser.add_argument('--rebuild', action='store_true', required=True)
+    parser.add_argument('--user-id', type=int, default=None)
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        n = rebuild(db, user_id=args.user_id)
+        db.commit()
+    finally:
+        db.close()
+    print(f"rebuilt frequent foods from {n} meal(s)")
@@ -0,0 +1,251 @@
+"""Idempotency-Key middleware for retried writes.
+
+A POST/PATCH/DELETE carrying an `Idempotency-Key` header is executed once per
+(caller, method, path, key). The response (status, content type, body) is
+kept in a TTL-evicted in-process store and replayed for retries with an
+`Idempotent-Replayed: true` header, without reaching the handler or the DB.
+
+- The caller is the user id of the bearer token (`identify`), so a retry
+  sent after a token refresh still matches; unauthenticated requests fall
+  back to a hash of the Authorization header. Keys never collide across
+  users.
+- Reusing a key with a different request body is rejected with 422.
+- A retry arriving while the first attempt is still running gets 409.
+- Only JSON (or empty) request bodies up to `max_request` bytes are
+  handled; uploads (multipart photo, import dumps) pass straight through.
+- Only 2xx and deterministic 4xx (400/404/409/422) responses are stored.
+  Auth failures, rate limits, 5xx, exceptions and bodies above `max_body`
+  are not, so the client may retry them.
+
+The store is per process: the guarantee holds for retries that reach the
+same worker. With several workers a retry routed elsewhere runs again, so
+writes that must never repeat also carry their own key (e.g. `client_id`
+in POST /meals/batch).
+"""
+import hashlib
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from . import metrics
+
+HEADER = b"idempotency-key"
+METHODS = ("POST", "PATCH", "DELETE")
+MAX_KEY_LENGTH = 200
+COMPRESS_ABOVE = 512  # bytes; larger stored bodies are zlib-compressed
+STORED_4XX = frozenset((400, 404, 409, 422))  # same request, same answer
+
+
+class _Entry:
+    __slots__ = ("expires", "request_hash", "status", "content_type", "body", "compressed")
+
+    def __init__(self, expires: float, request_hash: bytes):
+        self.expires = expires
+        self.request_hash = request_hash
+        self.status: Optional[int] = None  # None while the first attempt is in flight
+        self.content_type: Optional[bytes] = None
+        self.body = b""
+        self.compressed = False
+
+
+class IdempotencyStore:
+    """Thread-safe LRU + TTL map of request fingerprints to stored responses."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[bytes, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.replays = 0
+        self.conflicts = 0
+        self.stored = 0
+        self.evictions = 0
+
+    def begin(self, key: bytes, request_hash: bytes) -> Tuple[str, Optional[_Entry]]:
+        """Reserve `key`: ('new', None), ('replay', entry), ('mismatch'|'in_flight', entry)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry.expires <= now:
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self._data[key] = _Entry(now + self.ttl, request_hash)
+                self._evict()
+                return 'new', None
+            self._data.move_to_end(key)
+            if entry.request_hash != request_hash:
+                self.conflicts += 1
+                return 'mismatch', entry
+            if entry.status is None:
+                self.conflicts += 1
+                return 'in_flight', entry
+            self.replays += 1
+            return 'replay', entry
+
+    def complete(self, key: bytes, status: int, content_type: Optional[bytes], body: bytes):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return
+            entry.status = status
+            entry.content_type = content_type
+            if len(body) > COMPRESS_ABOVE:
+                entry.body, entry.compressed = zlib.compress(body, 6), True
+            else:
+                entry.body = body
+            self.stored += 1
+
+    def release(self, key: bytes):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def _evict(self):
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'stored': self.stored,
+                'replays': self.replays,
+                'conflicts': self.conflicts,
+                'evictions': self.evictions,
+                'bytes': sum(len(e.body) for e in self._data.values()),
+            }
+
+
+def _header(scope: Scope, name: bytes) -> Optional[bytes]:
+    for k, v in scope.get("headers", ()):
+        if k == name:
+            return v
+    return None
+
+
+def _is_json(content_type: bytes) -> bool:
+    media = content_type.split(b";", 1)[0].strip().lower()
+    return media == b"application/json" or (media.startswith(b"application/") and media.endswith(b"+json"))
+
+
+def _storable(status: int) -> bool:
+    return 200 <= status < 300 or status in STORED_4XX
+
+
+def _json(status: int, detail: str) -> Tuple[int, bytes]:
+    return status, ('{"detail":"%s"}' % detail).encode()
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app: ASGIApp, maxsize: int = 50000, ttl: float = 86400.0, max_body: int = 64 * 1024, max_request: int = 256 * 1024,
+                 identify: Optional[Callable[[Optional[str]], Optional[int]]] = None):
+        self.app = app
+        self.identify = identify  # Authorization header -> user id, None if not authenticated
+        self.store = IdempotencyStore(maxsize, ttl)
+        self.max_body = max_body
+        self.max_request = max_request
+        metrics.register_stats('idempotency', self.store.stats)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in METHODS:
+            return await self.app(scope, receive, send)
+        raw_key = _header(scope, HEADER)
+        if not raw_key:
+            return await self.app(scope, receive, send)
+        if len(raw_key) > MAX_KEY_LENGTH:
+            return await self._respond(send, *_json(400, "Idempotency-Key too long"))
+        request_type = _header(scope, b"content-type")
+        length = _header(scope, b"content-length")
+        if (request_type is not None and not _is_json(request_type)) or (length and length.isdigit() and int(length) > self.max_request):
+            return await self.app(scope, receive, send)
+
+        # Buffer the request body to fingerprint it, then hand it to the app unchanged
+        chunks = []
+        received = 0
+        more = True
+        while more:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            received += len(chunks[-1])
+            more = message.get("more_body", False)
+            if more and received > self.max_request:
+                # Chunked upload over the cap: stream it through untouched
+                return await self.app(scope, self._prepend(chunks, receive), send)
+        body = b"".join(chunks)
+        caller = self._caller(_header(scope, b"authorization"))
+        key = caller + b"|" + scope["method"].encode() + b"|" + scope["path"].encode() + b"|" + raw_key
+        state, entry = self.store.begin(key, hashlib.sha256(body).digest())
+        if state == 'replay':
+            payload = zlib.decompress(entry.body) if entry.compressed else entry.body
+            return await self._respond(send, entry.status, payload, entry.content_type, replayed=True)
+        if state == 'mismatch':
+            return await self._respond(send, *_json(422, "Idempotency-Key reused with a different request"))
+        if state == 'in_flight':
+            return await self._respond(send, *_json(409, "A request with this Idempotency-Key is in progress"))
+
+        sent_body = False
+
+        async def replay_receive() -> Message:
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status = 500
+        content_type = None
+        out = []
+        size = 0
+
+        async def capture_send(message: Message):
+            nonlocal status, content_type, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                content_type = dict(message.get("headers", ())).get(b"content-type")
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if size <= self.max_body:
+                    out.append(chunk)
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            self.store.release(key)
+            raise
+        if not _storable(status) or size > self.max_body:
+            self.store.release(key)
+        else:
+            self.store.complete(key, status, content_type, b"".join(out))
+
+    def _caller(self, authorization: Optional[bytes]) -> bytes:
+        user_id = self.identify(authorization.decode('latin-1')) if self.identify and authorization else None
+        if user_id is not None:
+            return b"u:%d" % user_id
+        return b"h:" + hashlib.sha256(authorization or b"").digest()[:16]
+
+    @staticmethod
+    def _prepend(chunks: list, receive: Receive) -> Receive:
+        """`receive` that first yields the already-read body chunks."""
+        pending = list(chunks)
+
+        async def wrapped() -> Message:
+            if pending:
+                return {"type": "http.request", "body": pending.pop(0), "more_body": True}
+            return await receive()
+        return wrapped
+
+    @staticmethod
+    async def _respond(send: Send, status: int, body: bytes, content_type: Optional[bytes] = b"application/json", replayed: bool = False):
+        headers = [(b"content-length", str(len(body)).encode())]
+        if content_type:
+            headers.append((b"content-type", content_type))
+        if replayed:
+            headers.append((b"idempotent-replayed", b"true"))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
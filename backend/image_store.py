@@ -0,0 +1,212 @@
+"""Content-addressed photo store with LRU eviction and per-hash result cache.
+
+Uploads are hashed while they stream to disk and kept once under
+MEDIA_DIR/cas/<aa>/<sha256><ext>; a repeat upload of the same bytes reuses
+the file and, if the blob was analyzed before, its cached result. Near-
+identical photos (re-encoded, resized) are matched by a 64-bit dHash within
+PHASH_MAX_DISTANCE bits. When stored files exceed IMAGE_STORE_MAX_BYTES the
+least recently used ones are deleted; their cached results are kept and
+meals showing an evicted photo lose their image_url in the same transaction.
+"""
+import hashlib
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import Optional, Tuple
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session
+from .config import get_settings
+from .daily_logs import dialect_insert
+from .models import ImageBlob, Meal, PhotoJob
+from . import data_version, metrics
+
+settings = get_settings()
+
+STORE_SUBDIR = "cas"
+TMP_SUBDIR = "tmp"
+PENDING_STATUSES = ("queued", "running")
+_UNLINK = "image_store.unlink"  # session.info key: files to delete after commit
+
+_lock = threading.Lock()
+_stats = {'exact_hits': 0, 'similar_hits': 0, 'misses': 0, 'deduped_files': 0, 'evictions': 0, 'evicted_bytes': 0}
+
+
+def _count(key: str, n: int = 1):
+    with _lock:
+        _stats[key] += n
+
+
+def stats() -> dict:
+    with _lock:
+        data = dict(_stats)
+    lookups = data['exact_hits'] + data['similar_hits'] + data['misses']
+    data['hit_ratio'] = round((data['exact_hits'] + data['similar_hits']) / lookups, 4) if lookups else 0.0
+    return data
+
+
+metrics.register_stats('image_store', stats)
+
+
+def store_dir(*parts: str) -> str:
+    return os.path.join(settings.MEDIA_DIR, STORE_SUBDIR, *parts)
+
+
+def blob_path(sha256: str, ext: str) -> str:
+    return store_dir(sha256[:2], sha256 + ext)
+
+
+def media_url(path: str) -> str:
+    return "/media/" + os.path.relpath(path, settings.MEDIA_DIR).replace(os.sep, "/")
+
+
+# ---- Ingest ----
+def hashing_copy(src, chunk: int, max_bytes: int) -> Tuple[str, str, int]:
+    """Stream `src` into a temp file under the store, hashing as it goes.
+
+    Returns (sha256, tmp_path, size); raises ValueError above `max_bytes`.
+    """
+    tmp_dir = store_dir(TMP_SUBDIR)
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as out:
+            while True:
+                block = src.read(chunk)
+                if not block:
+                    break
+                size += len(block)
+                if size > max_bytes:
+                    raise ValueError("too large")
+                h.update(block)
+                out.write(block)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return h.hexdigest(), tmp_path, size
+
+
+def put(db: Session, sha256: str, tmp_path: str, size: int, ext: str) -> ImageBlob:
+    """Move a hashed upload into the store, or drop it if the blob is already on disk (no commit)."""
+    now = datetime.utcnow()
+    blob = db.get(ImageBlob, sha256)
+    if blob is not None and blob.path and os.path.exists(blob.path):
+        os.remove(tmp_path)
+        _count('deduped_files')
+        blob.last_used_at = now
+        return blob
+    final = blob_path(sha256, ext)
+    os.makedirs(os.path.dirname(final), exist_ok=True)
+    os.replace(tmp_path, final)  # same bytes as any concurrent upload of this hash
+    # Upsert: a concurrent first upload of the same bytes must not fail on the primary key
+    insert = dialect_insert(db)
+    stmt = insert(ImageBlob).values(sha256=sha256, path=final, size=size, last_used_at=now)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[ImageBlob.sha256],
+        set_={'path': stmt.excluded.path, 'size': stmt.excluded.size, 'last_used_at': stmt.excluded.last_used_at},
+    ))
+    return db.get(ImageBlob, sha256, populate_existing=True)
+
+
+def lookup(blob: ImageBlob) -> Optional[str]:
+    """Cached analysis JSON for an exact-content hit, if any."""
+    if blob.result:
+        _count('exact_hits')
+        return blob.result
+    return None
+
+
+# ---- Perceptual hash ----
+def perceptual_hash(path: str) -> Optional[str]:
+    """64-bit difference hash (9x8 grayscale); None without Pillow or for undecodable files."""
+    try:
+        from PIL import Image  # type: ignore
+    except ImportError:
+        return None
+    try:
+        with Image.open(path) as img:
+            px = list(img.convert("L").resize((9, 8)).getdata())
+    except Exception:
+        return None
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (px[row * 9 + col] > px[row * 9 + col + 1])
+    return f"{bits:016x}"
+
+
+def find_similar(db: Session, phash: Optional[str], exclude_sha: str) -> Optional[ImageBlob]:
+    """Closest analyzed blob within PHASH_MAX_DISTANCE among the most recently used ones."""
+    if phash is None:
+        _count('misses')
+        return None
+    target = int(phash, 16)
+    rows = db.execute(
+        select(ImageBlob.sha256, ImageBlob.phash)
+        .where(ImageBlob.phash.isnot(None), ImageBlob.result.isnot(None), ImageBlob.sha256 != exclude_sha)
+        .order_by(ImageBlob.last_used_at.desc())
+        .limit(settings.PHASH_SCAN_LIMIT)
+    ).all()
+    best, best_dist = None, settings.PHASH_MAX_DISTANCE + 1
+    for sha, ph in rows:
+        dist = bin(target ^ int(ph, 16)).count("1")
+        if dist < best_dist:
+            best, best_dist = sha, dist
+    if best is None:
+        _count('misses')
+        return None
+    _count('similar_hits')
+    blob = db.get(ImageBlob, best)
+    blob.last_used_at = datetime.utcnow()
+    return blob
+
+
+# ---- Eviction ----
+def evict(db: Session, max_bytes: Optional[int] = None) -> int:
+    """Release least recently used files until the store fits `max_bytes` (no commit).
+
+    Blobs referenced by queued/running jobs are skipped. The rows, and the
+    image_url of meals showing those files, are cleared now; the files are
+    deleted only once the transaction commits, so a rollback never leaves
+    rows pointing at missing files. Returns bytes freed.
+    """
+    limit = settings.IMAGE_STORE_MAX_BYTES if max_bytes is None else max_bytes
+    total = db.scalar(select(func.coalesce(func.sum(ImageBlob.size), 0)).where(ImageBlob.path.isnot(None)))
+    if total <= limit:
+        return 0
+    busy = select(PhotoJob.sha256).where(PhotoJob.status.in_(PENDING_STATUSES), PhotoJob.sha256.isnot(None))
+    candidates = db.scalars(
+        select(ImageBlob).where(ImageBlob.path.isnot(None), ImageBlob.sha256.notin_(busy)).order_by(ImageBlob.last_used_at)
+    )
+    freed = 0
+    urls = []
+    for blob in candidates:
+        if total - freed <= limit:
+            break
+        db.info.setdefault(_UNLINK, []).append(blob.path)
+        urls.append(media_url(blob.path))
+        freed += blob.size
+        blob.path = None
+        blob.size = 0
+        _count('evictions')
+    if urls:
+        owners = db.scalars(update(Meal).where(Meal.image_url.in_(urls)).values(image_url=None).returning(Meal.user_id)).all()
+        data_version.touch(db, *owners)
+    _count('evicted_bytes', freed)
+    return freed
+
+
+@event.listens_for(Session, 'after_commit')
+def _unlink_evicted(session: Session):
+    for path in session.info.pop(_UNLINK, ()):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+@event.listens_for(Session, 'after_rollback')
+def _keep_evicted(session: Session):
+    session.info.pop(_UNLINK, None)
@@ -1,18 +1,47 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from sqlalchemy import String, literal, select, tuple_, type_coerce, update, func as sa_func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from .database import SessionLocal, engine
-from .models import Base, User, Meal, DailyLog, WeightEntry
+from .database import AsyncSessionLocal, async_engine, engine
+from .models import Base, User, Meal, DailyLog, WeightEntry, PhotoJob, Food
 from .schemas import (
-    UserCreate, UserOut, UserProfileUpdate, DailySummary, HistoryResponse, HistoryDay,
-    WeightForecastResponse, WeightForecastPoint, MacroGoals,
-    PhotoMealResponse, PhotoAnalysisResult
+    UserCreate, UserOut, UserProfileUpdate, DailySummary, SummaryDay, HistoryResponse,
+    WeightEntryIn, WeightEntryOut, WeightForecastResponse, MacroGoals,
+    PhotoJobOut, PhotoAnalysisResult
 )
-from .meal_schemas import MealCreate, MealOut, MealUpdate
+from .fast_json import ORJSONResponse, dumps as json_dumps, rows_to_dicts
+from .meal_schemas import MealCreate, MealOut, MealUpdate, MealPage, MealBatchIn, MealBatchOut, FoodOut, FrequentFood, MEAL_FIELDS, DEFAULT_MEAL_FIELDS
+from .pagination import encode_cursor, decode_cursor
 from .utils import recalc_energy
+from .targets import macro_split, MACRO_METHOD
+from .user_cache import UserCache
 from .config import get_settings
-import hmac, hashlib, urllib.parse, time, json
+from .migrations import run_migrations
+from .metrics import install_query_counter, count_queries
+from .idempotency import IdempotencyMiddleware
+from .daily_logs import add_water_l, apply_delta, dialect_insert, meal_day, meal_delta, meal_values
+from .overview import load_overview_data, build_overview
+from . import data_version
+from . import progress
+from . import response_cache
+from . import rollups
+from . import forecast
+from . import export
+from .telegram_auth import verify as verify_init_data
+from . import bulk_import
+from .response_cache import OVERVIEW, HISTORY
+from . import photo_pipeline
+from . import food_catalog
+from . import frequent_foods
+from . import meal_batch
+from . import metrics
+import time, json, os, threading
+from datetime import datetime
 import jwt  # type: ignore
 from jwt import PyJWTError
 
@@ -20,9 +49,30 @@ settings = get_settings()
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
+install_query_counter(engine)
+install_query_counter(async_engine.sync_engine)
 
-app = FastAPI(title=settings.PROJECT_NAME, version="1.4.0")
+app = FastAPI(title=settings.PROJECT_NAME, version="1.4.0", default_response_class=ORJSONResponse)
 
+def _bearer_user_id(authorization: Optional[str]) -> Optional[int]:
+    """User id (`sub`) of a valid bearer token, or None."""
+    if not authorization or not authorization.lower().startswith('bearer '):
+        return None
+    try:
+        return int(jwt.decode(authorization.split()[1], settings.JWT_SECRET, algorithms=["HS256"]).get('sub'))  # type: ignore
+    except (PyJWTError, IndexError, TypeError, ValueError):
+        return None
+
+# Added before CORS so replayed responses still get CORS headers
+app.add_middleware(
+    IdempotencyMiddleware,
+    maxsize=settings.IDEMPOTENCY_MAX_ENTRIES,
+    ttl=settings.IDEMPOTENCY_TTL_SECONDS,
+    max_body=settings.IDEMPOTENCY_MAX_BODY,
+    max_request=settings.IDEMPOTENCY_MAX_REQUEST_BODY,
+    identify=_bearer_user_id,
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.ALLOW_ORIGINS,
@@ -31,13 +81,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+os.makedirs(settings.MEDIA_DIR, exist_ok=True)
+app.mount("/media", StaticFiles(directory=settings.MEDIA_DIR), name="media")
+
+@app.on_event("startup")
+async def _resume_photo_jobs():
+    await photo_pipeline.resume_pending()
+
+@app.on_event("startup")
+async def _warm_food_index():
+    # Built off the event loop; searches arriving earlier wait on the build lock in a worker thread
+    threading.Thread(target=food_catalog.warm, name="food-index", daemon=True).start()
+
+@app.on_event("shutdown")
+async def _dispose_engine():
+    await photo_pipeline.shutdown()
+    # Pooled aiosqlite/asyncpg connections hold worker threads / sockets open
+    await async_engine.dispose()
+
 # Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 @app.get("/")
 async def root():
@@ -47,6 +112,10 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def get_metrics():
+    return metrics.snapshot()
+
 # --- Telegram Auth ---
 from fastapi import Body, Header
 from pydantic import BaseModel
@@ -60,26 +129,6 @@ class AuthResponse(BaseModel):
     user: UserOut
 
 
-def _check_telegram_auth(init_data: str):
-    if not settings.TELEGRAM_BOT_TOKEN:
-        raise HTTPException(status_code=500, detail="Bot token not configured")
-    data_pairs = urllib.parse.parse_qsl(init_data, keep_blank_values=True)
-    data_dict = dict(data_pairs)
-    if 'hash' not in data_dict:
-        raise HTTPException(status_code=400, detail="Missing hash")
-    received_hash = data_dict.pop('hash')
-    # Build data_check_string
-    data_check_arr = [f"{k}={v}" for k,v in sorted(data_dict.items())]
-    data_check_string = '\n'.join(data_check_arr)
-    secret_key = hashlib.sha256(settings.TELEGRAM_BOT_TOKEN.encode()).digest()
-    hmac_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
-    if not hmac.compare_digest(hmac_hash, received_hash):
-        raise HTTPException(status_code=401, detail="Invalid hash")
-    auth_date = int(data_dict.get('auth_date', '0'))
-    if time.time() - auth_date > 86400:  # 24h
-        raise HTTPException(status_code=401, detail="Auth data expired")
-    return data_dict
-
 def _issue_tokens(user: User):
     now = int(time.time())
     token_payload = {"sub": str(user.id), "tg_id": user.telegram_id, "exp": now + settings.JWT_EXPIRE_MINUTES*60}
@@ -89,19 +138,18 @@ def _issue_tokens(user: User):
     return token, refresh
 
 @app.post("/auth/telegram", response_model=AuthResponse)
-async def telegram_auth(payload: TelegramAuthPayload = Body(...), db: Session = Depends(get_db)):
-    data = _check_telegram_auth(payload.init_data)
+async def telegram_auth(payload: TelegramAuthPayload = Body(...), db: AsyncSession = Depends(get_db)):
+    data = verify_init_data(payload.init_data)
     user_id = data.get('id')
     if not user_id:
         raise HTTPException(status_code=400, detail="No user id")
-    username = data.get('username')
-    first_name = data.get('first_name')
-    last_name = data.get('last_name')
-    user = db.query(User).filter(User.telegram_id == str(user_id)).first()
-    if not user:
-        user = User(telegram_id=str(user_id), username=username, first_name=first_name, last_name=last_name)
-        db.add(user)
-        db.commit(); db.refresh(user)
+    # One round trip: create on first login, refresh the Telegram names on later ones
+    values = {'username': data.get('username'), 'first_name': data.get('first_name'), 'last_name': data.get('last_name')}
+    stmt = dialect_insert(db.sync_session)(User).values(telegram_id=str(user_id), **values)
+    stmt = stmt.on_conflict_do_update(index_elements=[User.telegram_id], set_={k: getattr(stmt.excluded, k) for k in values}).returning(User)
+    user = await db.scalar(stmt, execution_options={'populate_existing': True})
+    await db.commit()
+    user_cache.put(user)
     token, refresh = _issue_tokens(user)
     return AuthResponse(token=token, refresh=refresh, user=user)
 
@@ -109,7 +157,7 @@ class RefreshPayload(BaseModel):
     refresh: str
 
 @app.post("/auth/refresh", response_model=AuthResponse)
-async def refresh_token(payload: RefreshPayload, db: Session = Depends(get_db)):
+async def refresh_token(payload: RefreshPayload, db: AsyncSession = Depends(get_db)):
     try:
         data = jwt.decode(payload.refresh, settings.JWT_SECRET, algorithms=["HS256"])  # type: ignore
         if data.get('type') != 'refresh':
@@ -117,36 +165,61 @@ async def refresh_token(payload: RefreshPayload, db: Session = Depends(get_db)):
         user_id = int(data['sub'])
     except PyJWTError:
         raise HTTPException(status_code=401, detail='Invalid refresh token')
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=401, detail='User not found')
     token, refresh = _issue_tokens(user)
     return AuthResponse(token=token, refresh=refresh, user=user)
 
 # --- Auth helper
-def get_current_user(authorization: Optional[str] = Header(None), db: Session = Depends(get_db)) -> User:
+user_cache = UserCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL_SECONDS)
+metrics.register_stats('user_cache', user_cache.stats)
+
+def get_current_user_id(authorization: Optional[str] = Header(None)) -> int:
+    """Verify the bearer token and return its user id without loading the User row."""
     if not authorization or not authorization.lower().startswith('bearer '):
         raise HTTPException(status_code=401, detail='Missing token')
     token = authorization.split()[1]
     try:
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=["HS256"])  # type: ignore
-        user_id = int(payload.get('sub'))
+        return int(payload.get('sub'))
     except PyJWTError:
         raise HTTPException(status_code=401, detail='Invalid token')
-    user = db.query(User).filter(User.id == user_id).first()
+
+async def get_current_user(user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)) -> User:
+    user = user_cache.get(db, user_id)
+    if user is not None:
+        return user
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=401, detail='User not found')
+    user_cache.put(user)
     return user
 
+async def _not_modified(request: Request, response: Response, db: AsyncSession, user_id: int, *parts) -> Optional[Response]:
+    """304 if the client's ETag still matches the user's data version; otherwise set the ETag and return None."""
+    version = await db.run_sync(data_version.current, user_id)
+    request.state.data_version = version
+    tag = data_version.etag(user_id, version, app.version, *parts)
+    headers = {'ETag': tag, 'Cache-Control': 'private, no-cache', 'Vary': 'Authorization'}
+    if data_version.matches(request.headers.get('if-none-match'), tag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+def _json_body(body: bytes, response: Response) -> Response:
+    """Pre-serialized JSON carrying the headers set on the injected `response` (ETag, ...)."""
+    return Response(content=body, media_type='application/json', headers={k: v for k, v in response.headers.items() if k != 'content-length'})
+
 # --- Users & Meals ---
 @app.get("/users", response_model=List[UserOut])
-async def get_users(current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_users(user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
     # Возвращаем только текущего пользователя (для приватности)
-    return db.query(User).filter(User.id == current.id).all()
+    return (await db.scalars(select(User).where(User.id == user_id))).all()
 
 @app.post("/users", response_model=UserOut)
-async def create_or_update_user(payload: UserCreate, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.telegram_id == payload.telegram_id).first()
+async def create_or_update_user(payload: UserCreate, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.telegram_id == payload.telegram_id))
     if not user:
         user = User(telegram_id=payload.telegram_id)
         db.add(user)
@@ -154,17 +227,19 @@ async def create_or_update_user(payload: UserCreate, db: Session = Depends(get_d
         if value is not None:
             setattr(user, field, value)
     recalc_energy(user)
-    db.commit(); db.refresh(user)
+    await db.commit(); await db.refresh(user)
+    user_cache.invalidate(user.id)
+    await response_cache.cache.invalidate(user.id, OVERVIEW, HISTORY)
     return user
 
 # New endpoints for user profile management
 @app.get("/profile", response_model=UserOut)
-async def get_profile(current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_profile(current: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """Get current user profile with all onboarding data"""
     return UserOut.from_orm_with_json(current)
 
 @app.patch("/profile", response_model=UserOut)
-async def update_profile(payload: UserProfileUpdate, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def update_profile(payload: UserProfileUpdate, current: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """Update user profile with onboarding data"""
     user = current
     
@@ -179,13 +254,15 @@ async def update_profile(payload: UserProfileUpdate, current: User = Depends(get
     
     recalc_energy(user)
     
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    user_cache.invalidate(user.id)
+    await response_cache.cache.invalidate(user.id, OVERVIEW, HISTORY)
     return UserOut.from_orm_with_json(user)
 
 # Endpoint for creating demo/mock user (for testing)
 @app.post("/create-demo-user", response_model=UserOut)
-async def create_demo_user(db: Session = Depends(get_db)):
+async def create_demo_user(db: AsyncSession = Depends(get_db)):
     """Create a demo user for testing purposes"""
     import uuid
     
@@ -194,7 +271,7 @@ async def create_demo_user(db: Session = Depends(get_db)):
     mock_username = f"demo_user_{uuid.uuid4().hex[:6]}"
     
     # Check if user already exists
-    user = db.query(User).filter(User.telegram_id == mock_telegram_id).first()
+    user = await db.scalar(select(User).where(User.telegram_id == mock_telegram_id))
     if user:
         return UserOut.from_orm_with_json(user)
     
@@ -220,166 +297,326 @@ async def create_demo_user(db: Session = Depends(get_db)):
     )
     
     # Calculate BMR/TDEE
-    bmr = 10 * user.weight + 6.25 * user.height - 5 * user.age + 5  # Male formula
-    tdee = bmr * user.activity_multiplier
-    daily = tdee * 0.8  # 20% deficit for weight loss
-    
-    user.bmr = round(bmr, 1)
-    user.tdee = round(tdee, 1)
-    user.daily_calories = round(daily, 0)
+    recalc_energy(user)
     
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     return UserOut.from_orm_with_json(user)
 
-def _recalc_today_log(db: Session, user: User):
-    from datetime import datetime
-    from sqlalchemy import func as sa_func
-    today = datetime.utcnow().strftime('%Y-%m-%d')
-    total = db.query(sa_func.coalesce(sa_func.sum(Meal.calories), 0)).filter(
-        Meal.user_id==user.id,
-        sa_func.strftime('%Y-%m-%d', Meal.created_at)==today
-    ).scalar()
-    log = db.query(DailyLog).filter(DailyLog.user_id==user.id, DailyLog.date==today).first()
-    if not log:
-        log = DailyLog(user_id=user.id, date=today)
-        db.add(log)
-    log.calories = total
-    log.target = user.daily_calories
-    log.deficit = (user.daily_calories - total) if user.daily_calories else None
-    db.commit()
-
 @app.post("/meals", response_model=MealOut)
-async def create_meal(payload: MealCreate, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    meal = Meal(user_id=current.id, food_name=payload.food_name, calories=payload.calories, protein=payload.protein, carbs=payload.carbs, fat=payload.fat, meal_type=payload.meal_type)
-    db.add(meal); db.commit(); db.refresh(meal)
-    _recalc_today_log(db, current)
+async def create_meal(payload: MealCreate, current: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    if payload.food_id is not None:
+        food = await db.get(Food, payload.food_id)
+        if not food:
+            raise HTTPException(status_code=404, detail='Food not found')
+        meal = Meal(user_id=current.id, food_name=payload.food_name or food.name, food_id=food.id, meal_type=payload.meal_type, **food_catalog.portion_macros(food, payload.portion))
+    elif payload.food_name and payload.calories is not None:
+        meal = Meal(user_id=current.id, food_name=payload.food_name, calories=payload.calories, protein=payload.protein, carbs=payload.carbs, fat=payload.fat, meal_type=payload.meal_type, portion=payload.portion)
+    else:
+        raise HTTPException(status_code=422, detail='Provide food_id or food_name with calories')
+    db.add(meal)
+    await db.run_sync(apply_delta, current, meal_day(meal), meal_delta(meal_values(None), meal_values(meal)))
+    await db.run_sync(progress.record_meal_change, current.id, meal.day, 1)
+    await db.run_sync(frequent_foods.record, current.id, frequent_foods.snapshot(meal), None)
+    await db.commit(); await db.refresh(meal)
+    await response_cache.cache.invalidate(current.id, OVERVIEW, HISTORY)
     return meal
 
-@app.get("/meals", response_model=List[MealOut])
-async def list_meals(current: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(Meal).filter(Meal.user_id==current.id).order_by(Meal.created_at.desc()).all()
+@app.get("/foods/search", response_model=List[FoodOut])
+async def search_foods(q: str = Query(..., min_length=1, max_length=100), limit: int = Query(10, ge=1, le=50), user_id: int = Depends(get_current_user_id)):
+    """Catalog autocomplete from the in-memory index (built on first use)."""
+    # Building or waiting for the startup build blocks, so never on the event loop
+    index = food_catalog.loaded_index() or await run_in_threadpool(food_catalog.warm)
+    hits = food_catalog.search(index, q, limit)
+    return [FoodOut(**h._asdict()) for h in hits]
+
+@app.get("/meals/frequent", response_model=List[FrequentFood])
+async def frequent_meals(limit: int = Query(10, ge=1, le=50), sort: str = Query('frequent', pattern='^(frequent|recent)$'), user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
+    """Top-N foods for quick re-logging, ranked by decayed frequency or recency."""
+    rows = await db.run_sync(frequent_foods.top, user_id, limit, sort)
+    now = datetime.utcnow()
+    return [FrequentFood.model_validate(r).model_copy(update={'score': round(frequent_foods.decayed_score(r.log_score, now), 3)}) for r in rows]
+
+@app.post("/meals/batch", response_model=MealBatchOut)
+async def create_meals_batch(payload: MealBatchIn, current: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Idempotent bulk create for offline-queued meals (keyed by client_id)."""
+    if len(payload.items) > settings.MEAL_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {settings.MEAL_BATCH_MAX} items per batch")
+    try:
+        results = await db.run_sync(meal_batch.insert_batch, current, payload.items)
+        await db.commit()
+    except IntegrityError:
+        # A concurrent replay inserted some client_ids first; the retry reports them as existing
+        await db.rollback()
+        results = await db.run_sync(meal_batch.insert_batch, current, payload.items)
+        await db.commit()
+    if any(r['status'] == 'created' for r in results):
+        await response_cache.cache.invalidate(current.id, OVERVIEW, HISTORY)
+    return MealBatchOut(created=sum(r['status'] == 'created' for r in results), items=results)
+
+DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+
+def _meals_page_query(user_id: int, selected: List[str], date_from: Optional[str], date_to: Optional[str], after: Optional[tuple], dialect: str):
+    """Newest-first page query; `after` is the (created_at, id) of the previous page's last row."""
+    cols = [getattr(Meal, f).label(f) for f in selected] + [Meal.id.label('_id'), Meal.created_at.label('_created')]
+    q = select(*cols).where(Meal.user_id == user_id)
+    if date_from:
+        q = q.where(Meal.day >= date_from)
+    if date_to:
+        q = q.where(Meal.day <= date_to)
+    if after:
+        created_key = Meal.created_at
+        if dialect == 'sqlite':
+            # Stored as text; server-default rows lack the fractional seconds the driver binds
+            created_key = sa_func.substr(type_coerce(Meal.created_at, String) + '.000000', 1, 26)
+        q = q.where(tuple_(created_key, Meal.id) < tuple_(literal(after[0], Meal.created_at.type), after[1]))
+    return q.order_by(Meal.created_at.desc(), Meal.id.desc())
+
+def _decode_meals_cursor(cursor: str) -> tuple:
+    created, meal_id = decode_cursor(cursor, 2)
+    try:
+        return datetime.fromisoformat(created), int(meal_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+
+@app.get("/meals", response_model=MealPage)
+async def list_meals(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    date_from: Optional[str] = Query(None, alias="from", pattern=DATE_PATTERN),
+    date_to: Optional[str] = Query(None, alias="to", pattern=DATE_PATTERN),
+    fields: Optional[str] = None,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    """Newest-first meals, keyset-paginated on (created_at, id).
+
+    `fields` is a comma-separated projection; only those columns are loaded.
+    """
+    selected = [f.strip() for f in fields.split(',') if f.strip()] if fields else list(DEFAULT_MEAL_FIELDS)
+    unknown = [f for f in selected if f not in MEAL_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    after = _decode_meals_cursor(cursor) if cursor else None
+    q = _meals_page_query(user_id, selected, date_from, date_to, after, db.bind.dialect.name)
+    rows = (await db.execute(q.limit(limit + 1))).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]._created.isoformat(), rows[-1]._id)
+    # Rows go straight to orjson (same JSON as MealPage, without building models)
+    return _json_body(json_dumps({'items': rows_to_dicts(rows, selected), 'next_cursor': next_cursor}), response)
 
 @app.patch("/meals/{meal_id}", response_model=MealOut)
-async def update_meal(meal_id: int, payload: MealUpdate, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    meal = db.query(Meal).filter(Meal.id == meal_id, Meal.user_id == current.id).first()
+async def update_meal(meal_id: int, payload: MealUpdate, current: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    meal = await db.scalar(select(Meal).where(Meal.id == meal_id, Meal.user_id == current.id))
     if not meal:
         raise HTTPException(status_code=404, detail='Meal not found')
+    before = meal_values(meal)
+    before_snap = frequent_foods.snapshot(meal)
     for field, value in payload.model_dump(exclude_unset=True).items():
         if value is not None:
             setattr(meal, field, value)
-    db.commit(); db.refresh(meal)
-    _recalc_today_log(db, current)
+    await db.run_sync(apply_delta, current, meal_day(meal), meal_delta(before, meal_values(meal)))
+    await db.run_sync(progress.record_meal_change, current.id, meal.day, 0)
+    after_snap = frequent_foods.snapshot(meal)
+    if after_snap != before_snap:
+        await db.run_sync(frequent_foods.record, current.id, before_snap, meal.created_at, -1)
+        await db.run_sync(frequent_foods.record, current.id, after_snap, meal.created_at)
+    await db.commit(); await db.refresh(meal)
+    await response_cache.cache.invalidate(current.id, OVERVIEW, HISTORY)
     return meal
 
 @app.delete("/meals/{meal_id}")
-async def delete_meal(meal_id: int, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    meal = db.query(Meal).filter(Meal.id == meal_id, Meal.user_id == current.id).first()
+async def delete_meal(meal_id: int, current: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    meal = await db.scalar(select(Meal).where(Meal.id == meal_id, Meal.user_id == current.id))
     if not meal:
         raise HTTPException(status_code=404, detail='Meal not found')
-    db.delete(meal); db.commit()
-    _recalc_today_log(db, current)
+    await db.run_sync(apply_delta, current, meal_day(meal), meal_delta(meal_values(meal), meal_values(None)))
+    # Detach photo jobs still pointing at it (ondelete isn't enforced on SQLite)
+    await db.execute(update(PhotoJob).where(PhotoJob.meal_id == meal.id).values(meal_id=None))
+    await db.delete(meal)
+    await db.run_sync(progress.record_meal_change, current.id, meal.day, -1)
+    await db.run_sync(frequent_foods.record, current.id, frequent_foods.snapshot(meal), meal.created_at, -1)
+    await db.commit()
+    await response_cache.cache.invalidate(current.id, OVERVIEW, HISTORY)
     return {"status": "deleted"}
 
+SUMMARY_MAX_DAYS = 92
+
 @app.get("/summary/{telegram_id}", response_model=DailySummary)
-async def daily_summary(telegram_id: str, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def daily_summary(
+    telegram_id: str,
+    date: Optional[str] = Query(None, pattern=DATE_PATTERN),
+    date_from: Optional[str] = Query(None, alias="from", pattern=DATE_PATTERN),
+    date_to: Optional[str] = Query(None, alias="to", pattern=DATE_PATTERN),
+    include_meals: bool = False,
+    current: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Totals for one day (default today) or a from/to range, summed in SQL per day."""
     if current.telegram_id != telegram_id:
         raise HTTPException(status_code=403, detail='Forbidden')
-    meals = db.query(Meal).filter(Meal.user_id == current.id).all()
-    cal_total = sum(m.calories for m in meals)
-    protein_total = sum(m.protein for m in meals)
-    carbs_total = sum(m.carbs for m in meals)
-    fat_total = sum(m.fat for m in meals)
-    target = current.daily_calories
+    if date and (date_from or date_to):
+        raise HTTPException(status_code=400, detail='Use either date or from/to')
+    start = date or date_from or date_to or _today()
+    end = date or date_to or date_from or start
+    try:
+        n_days = (datetime.strptime(end, '%Y-%m-%d') - datetime.strptime(start, '%Y-%m-%d')).days + 1
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Invalid date')
+    if n_days < 1:
+        raise HTTPException(status_code=400, detail='from must not be after to')
+    if n_days > SUMMARY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f'Range too long (max {SUMMARY_MAX_DAYS} days)')
+    day_filter = (Meal.user_id == current.id, Meal.day >= start, Meal.day <= end)
+    rows = (await db.execute(select(
+        Meal.day,
+        sa_func.coalesce(sa_func.sum(Meal.calories), 0),
+        sa_func.coalesce(sa_func.sum(Meal.protein), 0),
+        sa_func.coalesce(sa_func.sum(Meal.carbs), 0),
+        sa_func.coalesce(sa_func.sum(Meal.fat), 0),
+        sa_func.count(Meal.id),
+    ).where(*day_filter).group_by(Meal.day).order_by(Meal.day))).all()
+    days_out = [SummaryDay(date=d, calories=cal, protein=p, carbs=c, fat=f, meals_count=n) for d, cal, p, c, f, n in rows]
+    cal_total = sum(d.calories for d in days_out)
+    protein_total = sum(d.protein for d in days_out)
+    carbs_total = sum(d.carbs for d in days_out)
+    fat_total = sum(d.fat for d in days_out)
+    meals_count = sum(d.meals_count for d in days_out)
+    meals = (await db.scalars(select(Meal).where(*day_filter).order_by(Meal.created_at))).all() if include_meals else []
+    target = current.daily_calories * n_days if current.daily_calories else None
     remaining = target - cal_total if target else None
     progress = (cal_total / target * 100) if target and target > 0 else 0
     msg = "Отлично! Вы в пределах цели" if target and cal_total <= target else "Внимание: перебор калорий" if target else "Цель не настроена"
-    return DailySummary(user_id=current.id, calories_target=target, calories_consumed=cal_total, calories_remaining=remaining, meals_count=len(meals), progress_percent=round(progress,1), protein_total=protein_total, carbs_total=carbs_total, fat_total=fat_total, message=msg, meals=meals)
+    return DailySummary(user_id=current.id, date_from=start, date_to=end, calories_target=target, calories_consumed=cal_total, calories_remaining=remaining, meals_count=meals_count, progress_percent=round(progress,1), protein_total=protein_total, carbs_total=carbs_total, fat_total=fat_total, message=msg, days=days_out, meals=meals)
+
+HISTORY_MAX_DAYS = {'day': 366, 'week': 3660, 'month': 3660}
+
+def _history_bucket(start, calories, protein, carbs, fat, meals_count, days_logged, target):
+    n = days_logged or 0
+    avg = calories / n if n else 0.0
+    return {
+        'date': start, 'calories': round(avg, 1), 'target': target,
+        'deficit': round(target - avg, 1) if target else None, 'percent': (avg / target * 100) if target else 0.0,
+        'protein': round(protein / n, 1) if n else 0.0, 'carbs': round(carbs / n, 1) if n else 0.0, 'fat': round(fat / n, 1) if n else 0.0,
+        'meals_count': meals_count, 'days_logged': n, 'calories_total': calories,
+    }
 
 @app.get("/history/{days}", response_model=HistoryResponse)
-async def history(days: int, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    days = min(max(days,1), 90)
-    logs = db.query(DailyLog).filter(DailyLog.user_id==current.id).order_by(DailyLog.date.desc()).limit(days).all()
-    mapped = [HistoryDay(date=l.date, calories=l.calories or 0, target=l.target, deficit=l.deficit, percent=((l.calories / l.target * 100) if l.target else 0)) for l in reversed(logs)]
-    return HistoryResponse(days=mapped)
+async def history(
+    days: int,
+    request: Request,
+    response: Response,
+    resolution: str = Query('day', pattern='^(day|week|month)$'),
+    current: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Per-day logs (the last `days` logged days) or week / month rollups covering the last `days` days."""
+    days = min(max(days,1), HISTORY_MAX_DAYS[resolution])
+    # Week / month buckets shift with today's date, per-day logs don't
+    start = rollups.range_start(days, resolution) if resolution != 'day' else ''
+    if (cached := await _not_modified(request, response, db, current.id, resolution, days, start)) is not None:
+        return cached
+    variant = f"{request.state.data_version}:{resolution}:{days}:{start}"
+    token, body = await response_cache.cache.get(current.id, HISTORY, variant)
+    if body is None:
+        if resolution == 'day':
+            logs = (await db.execute(
+                select(DailyLog.date, DailyLog.calories, DailyLog.target, DailyLog.deficit,
+                       DailyLog.protein, DailyLog.carbs, DailyLog.fat, DailyLog.meals_count)
+                .where(DailyLog.user_id==current.id).order_by(DailyLog.date.desc()).limit(days)
+            )).all()
+            mapped = [
+                {'date': d, 'calories': float(cal or 0), 'target': t, 'deficit': deficit, 'percent': ((cal or 0) / t * 100) if t else 0.0,
+                 'protein': float(p or 0), 'carbs': float(c or 0), 'fat': float(f or 0), 'meals_count': n or 0}
+                for d, cal, t, deficit, p, c, f, n in reversed(logs)
+            ]
+        else:
+            target = current.daily_calories
+            rows = (await db.execute(rollups.range_query(current.id, resolution, start))).all()
+            mapped = [_history_bucket(*r, target) for r in rows]
+        body = json_dumps({'resolution': resolution, 'days': mapped})
+        await response_cache.cache.put(current.id, HISTORY, variant, token, body)
+    return _json_body(body, response)
 
 from fastapi import UploadFile, File
-from datetime import datetime, timedelta
 
-# --- Photo Analysis (placeholder implementation) ---
-@app.post("/analyze/photo", response_model=PhotoMealResponse)
-async def analyze_photo(file: UploadFile = File(...), current: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Accept an image and create a placeholder meal (zero macros).
-    TODO: persist file, run vision model, extract items & macros.
+# --- Photo Analysis ---
+def _photo_job_out(job: PhotoJob, meal: Optional[Meal] = None) -> PhotoJobOut:
+    return PhotoJobOut(
+        job_id=job.id, status=job.status, meal_id=job.meal_id,
+        meal=MealOut.model_validate(meal) if meal is not None and job.status == 'done' else None,
+        analysis=PhotoAnalysisResult(**json.loads(job.result)) if job.result else None,
+        error=job.error, created_at=job.created_at, finished_at=job.finished_at,
+    )
+
+@app.post("/analyze/photo", response_model=PhotoJobOut, status_code=202)
+async def analyze_photo(response: Response, file: UploadFile = File(...), current: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Store the image and queue it for analysis; poll GET /analyze/photo/jobs/{job_id}.
+
+    An image analyzed before (same SHA-256) is answered from cache with 200.
     """
-    filename = file.filename or "upload.jpg"
-    meal = Meal(user_id=current.id, food_name=f"Фото: {filename}", calories=0, protein=0, carbs=0, fat=0, meal_type="snack")
-    db.add(meal); db.commit(); db.refresh(meal)
-    analysis = PhotoAnalysisResult(status="placeholder", notes="Vision analysis not implemented")
-    return PhotoMealResponse(meal=meal, analysis=analysis)
+    upload = await photo_pipeline.save_upload(file)
+    job, cached = await db.run_sync(photo_pipeline.create_job, current.id, file.filename or 'upload.jpg', *upload)
+    await db.commit()
+    await response_cache.cache.invalidate(current.id, OVERVIEW, HISTORY)
+    if cached:
+        response.status_code = 200
+        return _photo_job_out(job, await db.get(Meal, job.meal_id))
+    photo_pipeline.submit(job.id, job.file_path)
+    return _photo_job_out(job)
+
+@app.get("/analyze/photo/jobs/{job_id}", response_model=PhotoJobOut)
+async def photo_job_status(job_id: str, user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
+    job = await db.scalar(select(PhotoJob).where(PhotoJob.id == job_id, PhotoJob.user_id == user_id))
+    if not job:
+        raise HTTPException(status_code=404, detail='Job not found')
+    meal = await db.scalar(select(Meal).where(Meal.id == job.meal_id, Meal.user_id == user_id)) if job.status == 'done' and job.meal_id else None
+    return _photo_job_out(job, meal)
 
 # --- Weight Forecast ---
 @app.get("/forecast/weight", response_model=WeightForecastResponse)
-async def weight_forecast(current: User = Depends(get_current_user), db: Session = Depends(get_db), days: int = 30):
-    if not current.weight:
-        raise HTTPException(status_code=400, detail="Current weight unknown")
+async def weight_forecast(request: Request, response: Response, current: User = Depends(get_current_user), db: AsyncSession = Depends(get_db), days: int = 30):
     days = min(max(days,7), 90)
-    logs = db.query(DailyLog).filter(DailyLog.user_id==current.id, DailyLog.deficit!=None).order_by(DailyLog.date.desc()).limit(14).all()
-    if not logs:
-        raise HTTPException(status_code=400, detail="Not enough data")
-    avg_deficit = sum(l.deficit or 0 for l in logs) / len(logs)
-    daily_weight_change = (avg_deficit / 7700.0)
-    weekly_change = daily_weight_change * 7
-    start_date = datetime.utcnow().date()
-    start_weight = current.weight
-    points: List[WeightForecastPoint] = []
-    cumulative_deficit = 0.0
-    for d in range(0, days+1):
-        date = start_date + timedelta(days=d)
-        est_weight = start_weight - daily_weight_change * d
-        cumulative_deficit += avg_deficit
-        points.append(WeightForecastPoint(day=d, date=date.isoformat(), est_weight=round(est_weight,2), cumulative_deficit=round(cumulative_deficit,1)))
-    return WeightForecastResponse(
-        start_weight=start_weight,
-        target_weight=current.target_weight,
-        daily_avg_deficit=round(avg_deficit,1),
-        weekly_change_kg=round(weekly_change,3),
-        points=points,
-        method="avg_deficit_14d"
-    )
+    today = _today()
+    if (cached := await _not_modified(request, response, db, current.id, today, days)) is not None:
+        return cached
+    key = (request.state.data_version, today, days)
+    body = forecast.cached(current.id, key)
+    if body is None:
+        weights, deficits = await db.run_sync(forecast.load_inputs, current.id, today)
+        try:
+            result = forecast.forecast(weights, deficits, current.weight, current.target_weight, today, days)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        body = json_dumps(result)
+        forecast.store(current.id, key, body)
+    return _json_body(body, response)
 
 # --- Macro Goals ---
 @app.get("/goals/macros", response_model=MacroGoals)
-async def macro_goals(current: User = Depends(get_current_user)):
+async def macro_goals(request: Request, response: Response, current: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    if (cached := await _not_modified(request, response, db, current.id, MACRO_METHOD)) is not None:
+        return cached
     if not current.daily_calories and not current.tdee:
         raise HTTPException(status_code=400, detail="Calorie target unknown")
     calories = current.daily_calories or current.tdee
     if not calories:
         raise HTTPException(status_code=400, detail="Calorie target unavailable")
-    weight = current.weight or 70
-    protein = weight * 1.7
-    protein_kcal = protein * 4
-    fat_kcal = calories * 0.28
-    fat = fat_kcal / 9
-    remaining_kcal = calories - protein_kcal - fat_kcal
-    if remaining_kcal < 0:
-        remaining_kcal = max(calories * 0.25, 0)
-    carbs = remaining_kcal / 4
-    total_assigned = protein_kcal + fat_kcal + remaining_kcal
-    protein_pct = protein_kcal / total_assigned * 100 if total_assigned else 0
-    fat_pct = fat_kcal / total_assigned * 100 if total_assigned else 0
-    carbs_pct = remaining_kcal / total_assigned * 100 if total_assigned else 0
+    split = macro_split(calories, current.weight)
     return MacroGoals(
         calories=round(calories,0),
-        protein_g=round(protein,1),
-        fat_g=round(fat,1),
-        carbs_g=round(carbs,1),
-        protein_pct=round(protein_pct,1),
-        fat_pct=round(fat_pct,1),
-        carbs_pct=round(carbs_pct,1),
-        method="protein_1.7g_per_kg_fat28pct"
+        protein_g=round(split.protein_g,1),
+        fat_g=round(split.fat_g,1),
+        carbs_g=round(split.carbs_g,1),
+        protein_pct=round(split.protein_pct,1),
+        fat_pct=round(split.fat_pct,1),
+        carbs_pct=round(split.carbs_pct,1),
+        method=MACRO_METHOD
     )
 
 # ---- Profile Extensions ----
@@ -389,16 +626,6 @@ from datetime import datetime as _dt
 def _today():
     return _dt.utcnow().strftime('%Y-%m-%d')
 
-class WeightEntryIn(_BM):
-    date: Optional[str] = None  # YYYY-MM-DD
-    weight_kg: float
-    source: Optional[str] = "manual"
-
-class WeightEntryOut(_BM):
-    date: str
-    weight_kg: float
-    source: Optional[str]
-
 class WeightHistoryResponse(_BM):
     entries: List[WeightEntryOut]
 
@@ -423,9 +650,9 @@ class OverviewResponse(_BM):
     meals_grouped: Optional[dict] = None
 
 @app.post('/profile/weight', response_model=WeightEntryOut)
-async def add_weight(entry: WeightEntryIn, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def add_weight(entry: WeightEntryIn, current: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     date = entry.date or _today()
-    we = db.query(WeightEntry).filter(WeightEntry.user_id==current.id, WeightEntry.date==date).first()
+    we = await db.scalar(select(WeightEntry).where(WeightEntry.user_id==current.id, WeightEntry.date==date))
     if not we:
         we = WeightEntry(user_id=current.id, date=date, weight_kg=entry.weight_kg, source=entry.source)
         db.add(we)
@@ -435,206 +662,100 @@ async def add_weight(entry: WeightEntryIn, current: User = Depends(get_current_u
     if date == _today():
         current.weight = entry.weight_kg
         recalc_energy(current)
-    db.commit(); db.refresh(we)
+    await db.run_sync(progress.record_weight, current.id)
+    await db.commit(); await db.refresh(we)
+    user_cache.invalidate(current.id)
+    await response_cache.cache.invalidate(current.id, OVERVIEW, HISTORY)
     return WeightEntryOut(date=we.date, weight_kg=we.weight_kg, source=we.source)
 
 @app.get('/profile/weight/history', response_model=WeightHistoryResponse)
-async def weight_history(days: int = 30, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def weight_history(request: Request, response: Response, days: int = 30, user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
     days = min(max(days,1), 120)
-    q = db.query(WeightEntry).filter(WeightEntry.user_id==current.id).order_by(WeightEntry.date.desc()).limit(days).all()
-    return WeightHistoryResponse(entries=[WeightEntryOut(date=w.date, weight_kg=w.weight_kg, source=w.source) for w in reversed(q)])
+    if (cached := await _not_modified(request, response, db, user_id, days)) is not None:
+        return cached
+    rows = (await db.execute(
+        select(WeightEntry.date, WeightEntry.weight_kg, WeightEntry.source)
+        .where(WeightEntry.user_id==user_id).order_by(WeightEntry.date.desc()).limit(days)
+    )).all()
+    return _json_body(json_dumps({'entries': rows_to_dicts(reversed(rows), ('date', 'weight_kg', 'source'))}), response)
 
 @app.post('/profile/water')
-async def add_water(payload: WaterIntakeIn, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def add_water(payload: WaterIntakeIn, current: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     date = payload.date or _today()
-    log = db.query(DailyLog).filter(DailyLog.user_id==current.id, DailyLog.date==date).first()
-    if not log:
-        log = DailyLog(user_id=current.id, date=date, calories=0)
-        db.add(log)
-    log.water_l = (log.water_l or 0) + payload.amount_l
-    db.commit()
-    return {"date": date, "water_l": log.water_l}
+    water_l = await db.run_sync(add_water_l, current.id, date, payload.amount_l)
+    await db.run_sync(progress.record_water, current, water_l)
+    await db.commit()
+    await response_cache.cache.invalidate(current.id, OVERVIEW)
+    return {"date": date, "water_l": water_l}
 
 @app.post('/profile/sleep')
-async def set_sleep(payload: SleepLogIn, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def set_sleep(payload: SleepLogIn, user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
     date = payload.date or _today()
-    log = db.query(DailyLog).filter(DailyLog.user_id==current.id, DailyLog.date==date).first()
+    log = await db.scalar(select(DailyLog).where(DailyLog.user_id==user_id, DailyLog.date==date))
     if not log:
-        log = DailyLog(user_id=current.id, date=date, calories=0)
+        log = DailyLog(user_id=user_id, date=date, calories=0)
         db.add(log)
     log.sleep_h = payload.hours
-    db.commit()
+    await db.run_sync(progress.record_sleep, user_id, payload.hours)
+    await db.commit()
+    await response_cache.cache.invalidate(user_id, OVERVIEW)
     return {"date": date, "sleep_h": log.sleep_h}
 
+@app.post('/import')
+async def import_data(
+    file: UploadFile = File(...),
+    fmt: Optional[str] = Query(None, alias='format', pattern='^(csv|ndjson)$'),
+    source: str = Query('imported', pattern='^(imported|device)$'),
+    current: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Bulk-load weights / meals (CSV or NDJSON, optionally gzip) in the /export layout; returns counts and throughput."""
+    try:
+        chunks = bulk_import.read_chunks(file.file, bulk_import.detect_format(file.filename, fmt))
+        importer = bulk_import.Importer(current, source)
+        # Parse off the event loop, write through the session
+        while (chunk := await run_in_threadpool(next, chunks, None)) is not None:
+            await db.run_sync(importer.add, chunk)
+    except ValueError as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    report = await db.run_sync(importer.finish)
+    await db.commit()
+    user_cache.invalidate(current.id)
+    await response_cache.cache.invalidate(current.id, OVERVIEW, HISTORY)
+    return report
+
+@app.get('/export')
+async def export_data(
+    fmt: str = Query('ndjson', alias='format', pattern='^(csv|ndjson)$'),
+    table: str = Query('all'),
+    gzip: bool = False,
+    user_id: int = Depends(get_current_user_id),
+):
+    """Stream the user's meals / daily_logs / weight_entries as NDJSON (any tables) or CSV (one table)."""
+    try:
+        tables, name = export.parse_tables(table, fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filename = f"nutriai-{name}-{_today()}.{fmt}" + ('.gz' if gzip else '')
+    return StreamingResponse(
+        export.stream(user_id, tables, fmt, gzip),
+        media_type='application/gzip' if gzip else export.FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+
 @app.get('/profile/overview', response_model=OverviewResponse)
-async def profile_overview(current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def profile_overview(request: Request, response: Response, current: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     today = _today()
-    log = db.query(DailyLog).filter(DailyLog.user_id==current.id, DailyLog.date==today).first()
-    if not log:
-        _recalc_today_log(db, current)
-        log = db.query(DailyLog).filter(DailyLog.user_id==current.id, DailyLog.date==today).first()
-    meals = db.query(Meal).filter(Meal.user_id==current.id).order_by(Meal.created_at.desc()).limit(5).all()
-    # Meals for today (for macro sums)
-    from sqlalchemy import func as _f
-    today_meals = db.query(Meal).filter(
-        Meal.user_id==current.id,
-        _f.strftime('%Y-%m-%d', Meal.created_at)==today
-    ).all()
-    recent_meals = [ { 'id': m.id, 'food_name': m.food_name, 'calories': m.calories } for m in meals ]
-    wq = db.query(WeightEntry).filter(WeightEntry.user_id==current.id).order_by(WeightEntry.date.desc()).limit(2).all()
-    weight_block = None
-    if wq:
-        last = wq[0]
-        prev = wq[1] if len(wq) > 1 else None
-        diff = (last.weight_kg - prev.weight_kg) if prev else None
-        weight_block = {
-            'current': last.weight_kg,
-            'diff_from_prev': diff,
-            'target': current.target_weight
-        }
-    # streak
-    from datetime import timedelta as _td, datetime as _dt2
-    streak_days = 0
-    d_cursor = _dt2.utcnow().date()
-    for _ in range(120):
-        ds = d_cursor.strftime('%Y-%m-%d')
-        l = db.query(DailyLog).filter(DailyLog.user_id==current.id, DailyLog.date==ds).first()
-        if l and l.calories and l.calories > 0:
-            streak_days += 1
-            d_cursor = d_cursor - _td(days=1)
-        else:
-            break
-    streak = { 'current_days': streak_days, 'longest_days': streak_days }
-    cal_target = current.daily_calories
-    calories = log.calories if log else 0
-    percent = round((calories / cal_target * 100),1) if cal_target else 0
-    zone = 'ok'
-    if cal_target:
-        if percent < 90: zone = 'under'
-        elif percent > 105: zone = 'over'
-    # Macro goals (reuse logic inline to avoid second endpoint call)
-    macro_block = None
-    if (current.daily_calories or current.tdee) and today_meals:
-        calories_goal = current.daily_calories or current.tdee
-        weight_ref = current.weight or 70
-        protein_goal = weight_ref * 1.7
-        protein_kcal = protein_goal * 4
-        fat_kcal_goal = calories_goal * 0.28
-        fat_goal = fat_kcal_goal / 9
-        remaining_kcal = calories_goal - protein_kcal - fat_kcal_goal
-        if remaining_kcal < 0:
-            remaining_kcal = max(calories_goal * 0.25, 0)
-        carbs_goal = remaining_kcal / 4
-        # Consumed
-        p_val = sum(m.protein for m in today_meals)
-        c_val = sum(m.carbs for m in today_meals)
-        f_val = sum(m.fat for m in today_meals)
-        macro_block = {
-            'protein': { 'value': round(p_val,1), 'target': round(protein_goal,1), 'percent': (round(p_val / protein_goal *100,1) if protein_goal else None) },
-            'carbs': { 'value': round(c_val,1), 'target': round(carbs_goal,1), 'percent': (round(c_val / carbs_goal *100,1) if carbs_goal else None) },
-            'fat': { 'value': round(f_val,1), 'target': round(fat_goal,1), 'percent': (round(f_val / fat_goal *100,1) if fat_goal else None) }
-        }
-    today_block = {
-        'date': today,
-        'calories': { 'value': calories, 'target': cal_target, 'percent': percent, 'zone': zone },
-        'water_l': { 'value': (log.water_l if log else 0), 'target': current.water_intake, 'percent': ((log.water_l / current.water_intake *100) if log and log.water_l and current.water_intake else None) },
-    'sleep_h': { 'value': (log.sleep_h if log else None), 'target': 8 },
-    'meals_count': len(today_meals)
-    }
-    # Achievements (ephemeral calculation)
-    ach: List[dict] = []
-    total_meals = db.query(Meal).filter(Meal.user_id==current.id).count()
-    if total_meals >= 1: ach.append({'id':'first_meal','title':'Первое блюдо'})
-    if total_meals >= 5: ach.append({'id':'five_meals','title':'5 блюд'})
-    if streak_days >= 3: ach.append({'id':'streak_3','title':'Стрик 3 дня'})
-    if streak_days >= 7: ach.append({'id':'streak_7','title':'Стрик 7 дней'})
-    if log and current.water_intake and log.water_l and log.water_l >= current.water_intake: ach.append({'id':'water_goal','title':'Цель по воде'})
-    if log and log.sleep_h and log.sleep_h >= 8: ach.append({'id':'sleep_8h','title':'Сон 8 часов'})
-    w_today = db.query(WeightEntry).filter(WeightEntry.user_id==current.id, WeightEntry.date==today).first()
-    if w_today: ach.append({'id':'weight_logged','title':'Вес обновлён'})
-    # Meals grouped (today)
-    meals_grouped = None
-    if today_meals:
-        groups = {}
-        for m in today_meals:
-            mt = m.meal_type or 'other'
-            if mt not in groups:
-                groups[mt] = { 'count': 0, 'calories': 0, 'protein': 0.0, 'carbs': 0.0, 'fat': 0.0 }
-            g = groups[mt]
-            g['count'] += 1
-            g['calories'] += m.calories or 0
-            g['protein'] += m.protein or 0
-            g['carbs'] += m.carbs or 0
-            g['fat'] += m.fat or 0
-        # round macro sums
-        for v in groups.values():
-            v['protein'] = round(v['protein'],1)
-            v['carbs'] = round(v['carbs'],1)
-            v['fat'] = round(v['fat'],1)
-        meals_grouped = groups
-
-    # Day score (0-100) simple heuristic
-    day_score = None
-    if log:
-        score = 0
-        # Calories component (0-40)
-        if cal_target and calories:
-            pct = calories / cal_target
-            if 0.9 <= pct <= 1.05: score += 40
-            elif (0.8 <= pct < 0.9) or (1.05 < pct <= 1.15): score += 30
-            elif (0.6 <= pct < 0.8) or (1.15 < pct <= 1.3): score += 20
-            else: score += 10
-        # Water (0-20)
-        if current.water_intake:
-            wv = (log.water_l or 0)
-            w_pct = (wv / current.water_intake) if current.water_intake else 0
-            if w_pct >= 1: score += 20
-            else: score += int(min(w_pct,1)*20)
-        # Sleep (0-15)
-        if log.sleep_h:
-            sh = log.sleep_h
-            if 7 <= sh <= 9: score += 15
-            elif sh >= 6: score += 10
-            elif sh >= 5: score += 6
-            else: score += 2
-        # Macros (0-25)
-        if macro_block:
-            percents = []
-            for k in ['protein','carbs','fat']:
-                p = macro_block[k]['percent']
-                if p is not None:
-                    percents.append(min(p,100))
-            if percents:
-                avg = sum(percents)/len(percents)
-                score += int(round(avg/100 * 25))
-        day_score = min(score,100)
-
-    # Next tip logic (server-side)
-    next_tip = None
-    if macro_block:
-        protein_gap = macro_block['protein']['target'] - macro_block['protein']['value'] if macro_block['protein']['target'] else 0
-        fat_pct = macro_block['fat']['percent'] or 0
-        if protein_gap > 15:
-            next_tip = 'Добавьте источник белка (творог / курица / йогурт)'
-        elif fat_pct < 40 and today_block['meals_count'] >= 2:
-            next_tip = 'Немного полезных жиров (орехи / оливковое масло)'
-        elif today_block['calories']['percent'] < 60:
-            next_tip = 'Спланируйте основной приём пищи заранее'
-    if not next_tip and day_score is not None:
-        if day_score >= 80:
-            next_tip = 'Отличный прогресс! Поддерживайте темп'
-        elif day_score < 50:
-            next_tip = 'Сконцентрируйтесь на базовых целях: калории, вода, сон'
-
-    return OverviewResponse(
-        user={'id': current.id, 'telegram_id': current.telegram_id, 'goal': current.goal, 'gender': current.gender},
-        today=today_block,
-        weight=weight_block,
-        streak=streak,
-        achievements=ach,
-        recent_meals=recent_meals,
-        macros=macro_block,
-        next_tip=next_tip,
-        day_score=day_score,
-        meals_grouped=meals_grouped
-    )
+    if (cached := await _not_modified(request, response, db, current.id, today)) is not None:
+        return cached
+    variant = f"{request.state.data_version}:{today}"
+    token, body = await response_cache.cache.get(current.id, OVERVIEW, variant)
+    if body is None:
+        with count_queries('profile_overview') as queries:
+            data = await db.run_sync(load_overview_data, current.id, today)
+            payload = build_overview(current, data, today)
+        response.headers['X-DB-Queries'] = str(queries[0])
+        body = OverviewResponse(**payload).model_dump_json().encode()
+        await response_cache.cache.put(current.id, OVERVIEW, variant, token, body)
+    return _json_body(body, response)
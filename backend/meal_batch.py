@@ -0,0 +1,106 @@
+"""POST /meals/batch: idempotent bulk insert for offline-queued meals.
+
+Each item carries a client-generated `client_id` (unique per user via
+uq_meals_user_client), so a replayed batch returns the stored meals instead
+of inserting twice. New items are written with one multi-row INSERT; the
+DailyLog of every touched day and the user's progress are updated once per
+day, and frequent foods with one lookup, all in the caller's transaction.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from .config import get_settings
+from .daily_logs import apply_delta, meal_values
+from .food_catalog import portion_macros
+from .meal_schemas import MealBatchItem, MealOut
+from .models import Food, Meal, User
+from . import frequent_foods, progress
+
+settings = get_settings()
+
+
+def _utc_naive(value: Optional[datetime], now: datetime) -> datetime:
+    if value is None:
+        return now
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _meal_row(user_id: int, item: MealBatchItem, foods: Dict[int, Food], created_at: datetime) -> dict:
+    """Column values for a new meal; raises ValueError with a client-facing message."""
+    row = {
+        'user_id': user_id, 'client_id': item.client_id, 'meal_type': item.meal_type,
+        'created_at': created_at, 'day': created_at.strftime('%Y-%m-%d'), 'food_id': None, 'portion': item.portion,
+    }
+    if item.food_id is not None:
+        food = foods.get(item.food_id)
+        if food is None:
+            raise ValueError('Food not found')
+        row.update(portion_macros(food, item.portion), food_name=item.food_name or food.name, food_id=food.id)
+    elif item.food_name and item.calories is not None:
+        row.update(food_name=item.food_name, calories=item.calories, protein=item.protein, carbs=item.carbs, fat=item.fat)
+    else:
+        raise ValueError('Provide food_id or food_name with calories')
+    return row
+
+
+def _meal_out(meal_id: int, row: dict) -> MealOut:
+    return MealOut(id=meal_id, **{f: row[f] for f in MealOut.model_fields if f != 'id'})
+
+
+def insert_batch(db: Session, user: User, items: List[MealBatchItem]) -> List[dict]:
+    """Insert the batch (no commit); returns one result dict per item, in order."""
+    now = datetime.utcnow()
+    keys = {it.client_id for it in items}
+    existing = {m.client_id: m for m in db.scalars(select(Meal).where(Meal.user_id == user.id, Meal.client_id.in_(keys)))}
+    food_ids = {it.food_id for it in items if it.food_id is not None}
+    foods = {f.id: f for f in db.scalars(select(Food).where(Food.id.in_(food_ids)))} if food_ids else {}
+
+    results: List[Optional[dict]] = [None] * len(items)
+    rows: List[dict] = []
+    row_item: List[int] = []
+    first_of: Dict[str, int] = {}  # client_id -> index of its row in `rows`
+    repeats: List[int] = []
+    for i, item in enumerate(items):
+        if item.client_id in existing:
+            results[i] = {'client_id': item.client_id, 'status': 'exists', 'meal': MealOut.model_validate(existing[item.client_id])}
+            continue
+        if item.client_id in first_of:
+            repeats.append(i)
+            continue
+        created_at = _utc_naive(item.created_at, now)
+        if created_at > now + timedelta(seconds=settings.MEAL_BATCH_MAX_SKEW_SECONDS):
+            results[i] = {'client_id': item.client_id, 'status': 'error', 'error': 'created_at is in the future'}
+            continue
+        try:
+            row = _meal_row(user.id, item, foods, created_at)
+        except ValueError as e:
+            results[i] = {'client_id': item.client_id, 'status': 'error', 'error': str(e)}
+            continue
+        first_of[item.client_id] = len(rows)
+        rows.append(row)
+        row_item.append(i)
+
+    if rows:
+        # Materialize progress first so a first-time rebuild doesn't count this batch twice
+        progress.get_progress(db, user.id)
+        ids = db.scalars(insert(Meal).returning(Meal.id, sort_by_parameter_order=True), rows).all()
+        for meal_id, row, i in zip(ids, rows, row_item):
+            row['id'] = meal_id
+            results[i] = {'client_id': row['client_id'], 'status': 'created', 'meal': _meal_out(meal_id, row)}
+        # One DailyLog delta and one progress update per touched day
+        per_day: Dict[str, Dict[str, float]] = {}
+        for row in rows:
+            delta = per_day.setdefault(row['day'], meal_values(None))
+            for f, v in meal_values(row).items():
+                delta[f] += v
+        for day in sorted(per_day):
+            apply_delta(db, user, day, per_day[day])
+            progress.record_meal_change(db, user.id, day, per_day[day]['meals_count'])
+        frequent_foods.record_many(db, user.id, [({f: row[f] for f in frequent_foods.SNAPSHOT_FIELDS}, row['created_at']) for row in rows])
+    for i in repeats:
+        first = results[row_item[first_of[items[i].client_id]]]
+        results[i] = dict(first, status='exists') if first['status'] == 'created' else first
+    return results
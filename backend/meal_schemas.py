@@ -1,14 +1,24 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List, Dict, Any
+from datetime import datetime
 
 class MealCreate(BaseModel):
     user_telegram_id: str | None = None  # optional once auth in place
-    food_name: str
-    calories: float
+    food_name: Optional[str] = None  # required unless food_id is given
+    calories: Optional[float] = None
     protein: float = 0
     carbs: float = 0
     fat: float = 0
     meal_type: str = Field(..., pattern="^(breakfast|lunch|dinner|snack)$")
+    food_id: Optional[int] = None  # catalog item; macros computed server-side
+    portion: Optional[float] = Field(None, gt=0, le=5000)  # grams of food_id (default: item serving or 100 g)
+
+class MealBatchItem(MealCreate):
+    client_id: str = Field(..., min_length=1, max_length=64)  # idempotency key, unique per user
+    created_at: Optional[datetime] = None  # back-dated log time (UTC if naive); default now
+
+class MealBatchIn(BaseModel):
+    items: List[MealBatchItem] = Field(..., min_length=1)
 
 class MealUpdate(BaseModel):
     food_name: Optional[str] = None
@@ -29,3 +39,46 @@ class MealOut(BaseModel):
 
     class Config:
         from_attributes = True
+
+# Fields selectable via GET /meals?fields=...
+MEAL_FIELDS = ('id', 'food_name', 'calories', 'protein', 'carbs', 'fat', 'meal_type', 'portion', 'food_id', 'image_url', 'notes', 'day', 'created_at')
+DEFAULT_MEAL_FIELDS = tuple(MealOut.model_fields)
+
+class MealPage(BaseModel):
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+class FoodOut(BaseModel):
+    id: int
+    name: str
+    brand: Optional[str] = None
+    calories: float  # per 100 g
+    protein: float
+    carbs: float
+    fat: float
+    portion_g: Optional[float] = None
+
+class FrequentFood(BaseModel):
+    food_name: str
+    food_id: Optional[int] = None
+    calories: float
+    protein: float
+    carbs: float
+    fat: float
+    meal_type: Optional[str] = None
+    count: int
+    last_used_at: datetime
+    score: float = 0  # uses decayed to now
+
+    class Config:
+        from_attributes = True
+
+class MealBatchResult(BaseModel):
+    client_id: str
+    status: str  # created / exists / error
+    meal: Optional[MealOut] = None
+    error: Optional[str] = None
+
+class MealBatchOut(BaseModel):
+    created: int
+    items: List[MealBatchResult]
@@ -0,0 +1,57 @@
+"""Lightweight in-process metrics (query counters, per-endpoint stats)."""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Active query counter for the current request (None = not counting)
+_query_counter: ContextVar[Optional[list]] = ContextVar("query_counter", default=None)
+
+# endpoint -> {'calls', 'queries_last', 'queries_max', 'queries_total'}
+QUERY_STATS: Dict[str, Dict[str, int]] = {}
+
+# name -> callable returning a stats dict (caches, pools, ...)
+_PROVIDERS: Dict[str, Callable[[], dict]] = {}
+
+
+def register_stats(name: str, provider: Callable[[], dict]):
+    _PROVIDERS[name] = provider
+
+
+def _on_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def install_query_counter(engine: Engine):
+    """Attach the cursor-execute listener to the engine (idempotent)."""
+    if not event.contains(engine, "before_cursor_execute", _on_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _on_cursor_execute)
+
+
+@contextmanager
+def count_queries(endpoint: str):
+    """Count SQL statements executed inside the block and record them under `endpoint`.
+
+    Yields a one-item list whose value is the running count.
+    """
+    counter = [0]
+    token = _query_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_counter.reset(token)
+        stats = QUERY_STATS.setdefault(endpoint, {'calls': 0, 'queries_last': 0, 'queries_max': 0, 'queries_total': 0})
+        stats['calls'] += 1
+        stats['queries_last'] = counter[0]
+        stats['queries_max'] = max(stats['queries_max'], counter[0])
+        stats['queries_total'] += counter[0]
+
+
+def snapshot() -> dict:
+    data = {'queries': {k: dict(v) for k, v in QUERY_STATS.items()}}
+    for name, provider in _PROVIDERS.items():
+        data[name] = provider()
+    return data
@@ -0,0 +1,92 @@
+"""Idempotent startup migrations for schema changes create_all can't apply.
+
+`Base.metadata.create_all` only creates missing tables; columns and indexes
+added to existing tables are handled here (safe to run on every start).
+"""
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from .models import LogRollup, Meal, PhotoJob
+from . import rollups
+
+
+def _add_column(conn, table: str, column: str, ddl_type: str):
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def _meals_day(engine: Engine):
+    cols = {c['name'] for c in inspect(engine).get_columns('meals')}
+    with engine.begin() as conn:
+        if 'day' not in cols:
+            _add_column(conn, 'meals', 'day', 'VARCHAR')
+        # Backfill rows written before the column existed
+        if engine.dialect.name == 'sqlite':
+            day_expr = "strftime('%Y-%m-%d', created_at)"
+        else:
+            day_expr = "to_char(created_at AT TIME ZONE 'UTC', 'YYYY-MM-DD')"
+        conn.execute(text(f"UPDATE meals SET day = {day_expr} WHERE day IS NULL AND created_at IS NOT NULL"))
+
+
+def _meals_columns(engine: Engine):
+    cols = {c['name'] for c in inspect(engine).get_columns('meals')}
+    with engine.begin() as conn:
+        if 'food_id' not in cols:
+            _add_column(conn, 'meals', 'food_id', 'INTEGER REFERENCES foods(id)')
+        if 'client_id' not in cols:
+            _add_column(conn, 'meals', 'client_id', 'VARCHAR')
+
+
+def _meals_indexes(engine: Engine):
+    for idx in Meal.__table__.indexes:
+        idx.create(bind=engine, checkfirst=True)
+
+
+def _photo_jobs_sha256(engine: Engine):
+    cols = {c['name'] for c in inspect(engine).get_columns('photo_jobs')}
+    if 'sha256' not in cols:
+        with engine.begin() as conn:
+            _add_column(conn, 'photo_jobs', 'sha256', 'VARCHAR')
+    for idx in PhotoJob.__table__.indexes:
+        idx.create(bind=engine, checkfirst=True)
+
+
+def _users_data_version(engine: Engine):
+    cols = {c['name'] for c in inspect(engine).get_columns('users')}
+    if 'data_version' not in cols:
+        with engine.begin() as conn:
+            _add_column(conn, 'users', 'data_version', 'INTEGER NOT NULL DEFAULT 0')
+
+
+def _daily_logs_macros(engine: Engine):
+    cols = {c['name'] for c in inspect(engine).get_columns('daily_logs')}
+    added = [c for c in ('protein', 'carbs', 'fat', 'meals_count') if c not in cols]
+    if not added:
+        return
+    with engine.begin() as conn:
+        for col in added:
+            _add_column(conn, 'daily_logs', col, 'INTEGER DEFAULT 0' if col == 'meals_count' else 'FLOAT DEFAULT 0')
+        # Backfill from meals (one pass per column, runs once)
+        per_day = "FROM meals m WHERE m.user_id = daily_logs.user_id AND m.day = daily_logs.date"
+        sets = [f"{c} = (SELECT COALESCE(SUM(m.{c}), 0) {per_day})" for c in added if c != 'meals_count']
+        if 'meals_count' in added:
+            sets.append(f"meals_count = (SELECT COUNT(*) {per_day})")
+        conn.execute(text(f"UPDATE daily_logs SET {', '.join(sets)}"))
+
+
+def _log_rollups(engine: Engine):
+    # Fill the rollup table once from existing logs; afterwards it is maintained incrementally
+    with Session(engine) as db:
+        if db.scalar(select(func.count()).select_from(LogRollup)):
+            return
+        rollups.rebuild(db)
+        db.commit()
+
+
+def run_migrations(engine: Engine):
+    _meals_day(engine)
+    _meals_columns(engine)
+    _meals_indexes(engine)
+    _photo_jobs_sha256(engine)
+    _users_data_version(engine)
+    _daily_logs_macros(engine)
+    _log_rollups(engine)
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from datetime import datetime
 from .database import Base
 
 class User(Base):
@@ -34,12 +35,19 @@ class User(Base):
     tdee = Column(Float, nullable=True)
     daily_calories = Column(Float, nullable=True)
 
+    # Bumped on every committed write to the user's data (see data_version.py)
+    data_version = Column(Integer, nullable=False, default=0, server_default='0')
+
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationships
     meals = relationship("Meal", back_populates="user")
 
+def _meal_day_default(ctx):
+    created = ctx.get_current_parameters().get('created_at')
+    return (created or datetime.utcnow()).strftime('%Y-%m-%d')
+
 class Meal(Base):
     __tablename__ = "meals"
 
@@ -52,14 +60,23 @@ class Meal(Base):
     carbs = Column(Float)  # g
     fat = Column(Float)  # g
     portion = Column(Float, nullable=True)  # grams or multiplier
+    food_id = Column(Integer, ForeignKey("foods.id"), nullable=True)  # catalog item the macros came from
+    client_id = Column(String, nullable=True)  # client idempotency key (offline batch sync)
     image_url = Column(String, nullable=True)
     notes = Column(Text, nullable=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    day = Column(String, nullable=True, default=_meal_day_default)  # YYYY-MM-DD (UTC), denormalized from created_at
 
     # Relationships
     user = relationship("User", back_populates="meals")
 
+# Day-scoped lookups and newest-first listing per user
+Index('ix_meals_user_day', Meal.user_id, Meal.day)
+Index('ix_meals_user_created', Meal.user_id, Meal.created_at.desc())
+Index('uq_meals_user_client', Meal.user_id, Meal.client_id, unique=True)
+Index('ix_meals_image_url', Meal.image_url)  # photo eviction detaches meals by URL
+
 class DailyLog(Base):
     __tablename__ = "daily_logs"
     __table_args__ = (UniqueConstraint('user_id','date', name='uq_user_date'),)
@@ -68,6 +85,10 @@ class DailyLog(Base):
     user_id = Column(Integer, ForeignKey("users.id"), index=True)
     date = Column(String, index=True)  # YYYY-MM-DD
     calories = Column(Float, default=0)
+    protein = Column(Float, default=0)  # g
+    carbs = Column(Float, default=0)  # g
+    fat = Column(Float, default=0)  # g
+    meals_count = Column(Integer, default=0)
     target = Column(Float, nullable=True)
     deficit = Column(Float, nullable=True)
     water_l = Column(Float, nullable=True)  # суммарное потребление воды за день
@@ -76,6 +97,23 @@ class DailyLog(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
 
+class LogRollup(Base):
+    """Weekly / monthly sums of DailyLog meal totals, maintained with every DailyLog delta."""
+    __tablename__ = "log_rollups"
+    __table_args__ = (UniqueConstraint('user_id', 'period', 'start', name='uq_rollup_user_period_start'),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    period = Column(String, nullable=False)  # week, month
+    start = Column(String, nullable=False)  # YYYY-MM-DD: ISO Monday / first of month
+    calories = Column(Float, nullable=False, default=0)
+    protein = Column(Float, nullable=False, default=0)
+    carbs = Column(Float, nullable=False, default=0)
+    fat = Column(Float, nullable=False, default=0)
+    meals_count = Column(Integer, nullable=False, default=0)
+    days_logged = Column(Integer, nullable=False, default=0)  # days with at least one meal
+
+
 class WeightEntry(Base):
     __tablename__ = "weight_entries"
     __table_args__ = (UniqueConstraint('user_id','date', name='uq_user_weight_date'),)
@@ -87,3 +125,85 @@ class WeightEntry(Base):
     source = Column(String, nullable=True)  # manual / imported / device
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class UserProgress(Base):
+    """Materialized streak / achievement state, maintained on meal and log writes."""
+    __tablename__ = "user_progress"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    current_streak = Column(Integer, default=0, nullable=False)  # consecutive logged days ending at last_logged_day
+    longest_streak = Column(Integer, default=0, nullable=False)
+    last_logged_day = Column(String, nullable=True)  # YYYY-MM-DD, last day with calories > 0
+    total_meals = Column(Integer, default=0, nullable=False)
+    achievements = Column(Text, nullable=True)  # JSON object {achievement_id: unlocked_at ISO}
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class PhotoJob(Base):
+    """Queued photo analysis; the worker fills the placeholder meal when done."""
+    __tablename__ = "photo_jobs"
+
+    id = Column(String, primary_key=True)  # uuid4 hex
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    meal_id = Column(Integer, ForeignKey("meals.id", ondelete="SET NULL"), nullable=True)
+    status = Column(String, default="queued", nullable=False)  # queued / running / done / failed
+    file_path = Column(String, nullable=False)
+    sha256 = Column(String, nullable=True, index=True)  # ImageBlob key
+    result = Column(Text, nullable=True)  # JSON from the analyzer
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class ImageBlob(Base):
+    """Content-addressed upload (keyed by SHA-256) with its cached analysis."""
+    __tablename__ = "image_blobs"
+
+    sha256 = Column(String, primary_key=True)
+    path = Column(String, nullable=True)  # NULL once the file was evicted (result stays cached)
+    size = Column(Integer, default=0, nullable=False)
+    phash = Column(String, nullable=True)  # 64-bit dHash as 16 hex chars
+    result = Column(Text, nullable=True)  # analyzer JSON
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class Food(Base):
+    """Food catalog item; macros are per 100 g."""
+    __tablename__ = "foods"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    brand = Column(String, nullable=True)
+    calories = Column(Float, nullable=False)
+    protein = Column(Float, default=0, nullable=False)
+    carbs = Column(Float, default=0, nullable=False)
+    fat = Column(Float, default=0, nullable=False)
+    portion_g = Column(Float, nullable=True)  # typical serving, default portion for meals
+    source = Column(String, nullable=True)  # dump the row was loaded from
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class UserFood(Base):
+    """Per-user (food, macros, meal type) combination ranked by time-decayed frequency."""
+    __tablename__ = "user_foods"
+    __table_args__ = (UniqueConstraint('user_id', 'combo_key', name='uq_user_food_combo'),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    combo_key = Column(String, nullable=False)  # normalized name + rounded macros + meal type
+    food_name = Column(String, nullable=False)
+    food_id = Column(Integer, ForeignKey("foods.id"), nullable=True)
+    calories = Column(Float, nullable=False)
+    protein = Column(Float, default=0, nullable=False)
+    carbs = Column(Float, default=0, nullable=False)
+    fat = Column(Float, default=0, nullable=False)
+    meal_type = Column(String, nullable=True)
+    count = Column(Integer, default=0, nullable=False)
+    # log2 of sum(2 ** (t_i / half_life)) over uses; ordering by it = ordering by decayed frequency
+    log_score = Column(Float, nullable=False)
+    last_used_at = Column(DateTime, nullable=False)
+
+Index('ix_user_foods_score', UserFood.user_id, UserFood.log_score.desc())
+Index('ix_user_foods_recent', UserFood.user_id, UserFood.last_used_at.desc())
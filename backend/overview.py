@@ -0,0 +1,197 @@
+"""Data assembly for GET /profile/overview.
+
+All data is fetched in a fixed number of grouped queries (today's log +
+materialized progress, recent meals + total count, today's per-meal-type sums,
+last weights), so the number of DB round trips does not depend on streak
+length or meal history.
+"""
+from types import SimpleNamespace
+from typing import Optional
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+from .models import User, Meal, DailyLog, WeightEntry, UserProgress
+from .targets import macro_split
+from . import progress as progress_state
+
+RECENT_MEALS_LIMIT = 5
+
+
+EMPTY_LOG = SimpleNamespace(calories=0, water_l=None, sleep_h=None)
+
+
+def load_overview_data(db: Session, user_id: int, today: str) -> dict:
+    """Fetch everything the overview needs in four queries.
+
+    Rows are loaded as plain column tuples, so nothing here is tracked by the
+    session. Read-only: a missing daily log is rendered as an empty day.
+    """
+    # 1. Today's log and materialized progress, anchored on the user row
+    head = db.query(User.id, DailyLog.date, DailyLog.calories, DailyLog.water_l, DailyLog.sleep_h, UserProgress).outerjoin(
+        DailyLog, and_(DailyLog.user_id == User.id, DailyLog.date == today)
+    ).outerjoin(UserProgress, UserProgress.user_id == User.id).filter(User.id == user_id).first()
+    # 2. Recent meals with the total meal count as a window aggregate
+    recent = db.query(
+        Meal.id, Meal.food_name, Meal.calories, func.count().over().label('total')
+    ).filter(Meal.user_id == user_id).order_by(Meal.created_at.desc()).limit(RECENT_MEALS_LIMIT).all()
+    # 3. Today's meals aggregated per meal type
+    groups = db.query(
+        Meal.meal_type,
+        func.count(Meal.id),
+        func.coalesce(func.sum(Meal.calories), 0),
+        func.coalesce(func.sum(Meal.protein), 0),
+        func.coalesce(func.sum(Meal.carbs), 0),
+        func.coalesce(func.sum(Meal.fat), 0),
+    ).filter(Meal.user_id == user_id, Meal.day == today).group_by(Meal.meal_type).all()
+    # 4. Last two weight entries (diff + "logged today" check)
+    weights = db.query(WeightEntry.date, WeightEntry.weight_kg).filter(
+        WeightEntry.user_id == user_id
+    ).order_by(WeightEntry.date.desc()).limit(2).all()
+    progress = head.UserProgress if head else None
+    if head is not None and progress is None and (recent or weights):
+        # History without a materialized row (predates it): derive it, not persisted by this read
+        progress = progress_state.derive_progress(db, user_id)
+    return {
+        'today_log': head if head is not None and head.date is not None else None,
+        'progress': progress,
+        'recent_meals': recent,
+        'total_meals': recent[0].total if recent else 0,
+        'meal_groups': groups,
+        'weights': weights,
+    }
+
+
+def build_overview(current: User, data: dict, today: str) -> dict:
+    """Compute the overview payload (fields of OverviewResponse) from preloaded data."""
+    # No log yet = nothing logged today (meal, water and sleep writes create it)
+    log = data['today_log'] or EMPTY_LOG
+    recent_meals = [{'id': m.id, 'food_name': m.food_name, 'calories': m.calories} for m in data['recent_meals']]
+    wq = data['weights']
+    weight_block = None
+    if wq:
+        last = wq[0]
+        prev = wq[1] if len(wq) > 1 else None
+        diff = (last.weight_kg - prev.weight_kg) if prev else None
+        weight_block = {
+            'current': last.weight_kg,
+            'diff_from_prev': diff,
+            'target': current.target_weight
+        }
+    progress = data['progress']
+    streak = {
+        'current_days': progress_state.current_streak(progress, today),
+        'longest_days': (progress.longest_streak or 0) if progress else 0,
+    }
+    cal_target = current.daily_calories
+    calories = log.calories if log else 0
+    percent = round((calories / cal_target * 100), 1) if cal_target else 0
+    zone = 'ok'
+    if cal_target:
+        if percent < 90: zone = 'under'
+        elif percent > 105: zone = 'over'
+    # Today's per-meal-type sums
+    meals_count = 0
+    p_val = c_val = f_val = 0.0
+    groups = {}
+    for meal_type, count, cal_sum, p_sum, c_sum, f_sum in data['meal_groups']:
+        meals_count += count
+        p_val += p_sum
+        c_val += c_sum
+        f_val += f_sum
+        g = groups.setdefault(meal_type or 'other', {'count': 0, 'calories': 0, 'protein': 0.0, 'carbs': 0.0, 'fat': 0.0})
+        g['count'] += count
+        g['calories'] += cal_sum
+        g['protein'] += p_sum
+        g['carbs'] += c_sum
+        g['fat'] += f_sum
+    # Macro goals (shared memoized split, same as /goals/macros)
+    macro_block = None
+    if (current.daily_calories or current.tdee) and meals_count:
+        split = macro_split(current.daily_calories or current.tdee, current.weight)
+        protein_goal, fat_goal, carbs_goal = split.protein_g, split.fat_g, split.carbs_g
+        macro_block = {
+            'protein': { 'value': round(p_val,1), 'target': round(protein_goal,1), 'percent': (round(p_val / protein_goal *100,1) if protein_goal else None) },
+            'carbs': { 'value': round(c_val,1), 'target': round(carbs_goal,1), 'percent': (round(c_val / carbs_goal *100,1) if carbs_goal else None) },
+            'fat': { 'value': round(f_val,1), 'target': round(fat_goal,1), 'percent': (round(f_val / fat_goal *100,1) if fat_goal else None) }
+        }
+    today_block = {
+        'date': today,
+        'calories': { 'value': calories, 'target': cal_target, 'percent': percent, 'zone': zone },
+        'water_l': { 'value': (log.water_l if log else 0), 'target': current.water_intake, 'percent': ((log.water_l / current.water_intake *100) if log and log.water_l and current.water_intake else None) },
+        'sleep_h': { 'value': (log.sleep_h if log else None), 'target': 8 },
+        'meals_count': meals_count
+    }
+    # Meals grouped (today)
+    meals_grouped: Optional[dict] = None
+    if groups:
+        # round macro sums
+        for v in groups.values():
+            v['protein'] = round(v['protein'],1)
+            v['carbs'] = round(v['carbs'],1)
+            v['fat'] = round(v['fat'],1)
+        meals_grouped = groups
+
+    # Day score (0-100) simple heuristic
+    day_score = None
+    if log:
+        score = 0
+        # Calories component (0-40)
+        if cal_target and calories:
+            pct = calories / cal_target
+            if 0.9 <= pct <= 1.05: score += 40
+            elif (0.8 <= pct < 0.9) or (1.05 < pct <= 1.15): score += 30
+            elif (0.6 <= pct < 0.8) or (1.15 < pct <= 1.3): score += 20
+            else: score += 10
+        # Water (0-20)
+        if current.water_intake:
+            wv = (log.water_l or 0)
+            w_pct = (wv / current.water_intake) if current.water_intake else 0
+            if w_pct >= 1: score += 20
+            else: score += int(min(w_pct,1)*20)
+        # Sleep (0-15)
+        if log.sleep_h:
+            sh = log.sleep_h
+            if 7 <= sh <= 9: score += 15
+            elif sh >= 6: score += 10
+            elif sh >= 5: score += 6
+            else: score += 2
+        # Macros (0-25)
+        if macro_block:
+            percents = []
+            for k in ['protein','carbs','fat']:
+                p = macro_block[k]['percent']
+                if p is not None:
+                    percents.append(min(p,100))
+            if percents:
+                avg = sum(percents)/len(percents)
+                score += int(round(avg/100 * 25))
+        day_score = min(score,100)
+
+    # Next tip logic (server-side)
+    next_tip = None
+    if macro_block:
+        protein_gap = macro_block['protein']['target'] - macro_block['protein']['value'] if macro_block['protein']['target'] else 0
+        fat_pct = macro_block['fat']['percent'] or 0
+        if protein_gap > 15:
+            next_tip = 'Добавьте источник белка (творог / курица / йогурт)'
+        elif fat_pct < 40 and today_block['meals_count'] >= 2:
+            next_tip = 'Немного полезных жиров (орехи / оливковое масло)'
+        elif today_block['calories']['percent'] < 60:
+            next_tip = 'Спланируйте основной приём пищи заранее'
+    if not next_tip and day_score is not None:
+        if day_score >= 80:
+            next_tip = 'Отличный прогресс! Поддерживайте темп'
+        elif day_score < 50:
+            next_tip = 'Сконцентрируйтесь на базовых целях: калории, вода, сон'
+
+    return dict(
+        user={'id': current.id, 'telegram_id': current.telegram_id, 'goal': current.goal, 'gender': current.gender},
+        today=today_block,
+        weight=weight_block,
+        streak=streak,
+        achievements=progress_state.achievements_list(progress),
+        recent_meals=recent_meals,
+        macros=macro_block,
+        next_tip=next_tip,
+        day_score=day_score,
+        meals_grouped=meals_grouped
+    )
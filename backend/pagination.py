@@ -0,0 +1,21 @@
+"""Opaque keyset cursors for paginated listings."""
+import base64
+import json
+from typing import Any, List
+from fastapi import HTTPException
+
+
+def encode_cursor(*values: Any) -> str:
+    raw = json.dumps(list(values), separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    return values
@@ -0,0 +1,256 @@
+"""Asynchronous photo analysis pipeline.
+
+POST /analyze/photo streams the upload into the content-addressed image
+store in fixed-size chunks, creates a placeholder meal plus a PhotoJob and
+returns 202 immediately (or the cached result for an already analyzed
+image). The
+CPU-bound analysis (decode, resize, hash, macro estimate) runs in a process
+pool; when it finishes the meal, its DailyLog and the user's progress are
+updated in one transaction.
+
+The analyzer is pluggable via PHOTO_ANALYZER ("module:function"). It receives
+the stored file path, the thumbnail directory and the thumbnail size and
+returns a dict with the PhotoAnalysisResult fields. `stub_analyzer` is
+deterministic (macros derived from the content hash) and is the default
+until a vision model is wired in.
+"""
+import asyncio
+import hashlib
+import importlib
+import json
+import os
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional, Set, Tuple
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from .config import get_settings
+from .database import AsyncSessionLocal
+from .models import ImageBlob, Meal, PhotoJob, User
+from .daily_logs import apply_delta, meal_day, meal_delta, meal_values
+from . import frequent_foods, image_store, progress, response_cache
+
+settings = get_settings()
+
+THUMB_SUBDIR = "thumbs"
+PENDING_STATUSES = ("queued", "running")
+
+_executor: Optional[Executor] = None
+_tasks: Set[asyncio.Task] = set()
+
+
+def media_path(*parts: str) -> str:
+    return os.path.join(settings.MEDIA_DIR, *parts)
+
+
+# ---- Analyzers (run inside the worker process) ----
+def _sha256_file(path: str, chunk: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _thumbnail(path: str, thumb_dir: str, name: str, max_px: int):
+    """Downscale to `max_px` with Pillow if it is installed; returns (width, height) of the original."""
+    try:
+        from PIL import Image  # type: ignore
+    except ImportError:
+        return None, None
+    try:
+        with Image.open(path) as img:
+            size = img.size
+            img.thumbnail((max_px, max_px))
+            os.makedirs(thumb_dir, exist_ok=True)
+            img.convert("RGB").save(os.path.join(thumb_dir, name + ".jpg"), "JPEG", quality=85)
+            return size
+    except Exception:
+        return None, None
+
+
+def stub_analyzer(path: str, thumb_dir: str, max_px: int = 512) -> dict:
+    """Deterministic placeholder: same bytes -> same macros."""
+    digest = _sha256_file(path)
+    width, height = _thumbnail(path, thumb_dir, digest, max_px)
+    seed = int(digest[:8], 16)
+    calories = 150 + seed % 550
+    protein = round(calories * (0.15 + (seed >> 8) % 10 / 100) / 4, 1)
+    fat = round(calories * (0.25 + (seed >> 12) % 10 / 100) / 9, 1)
+    carbs = round(max(calories - protein * 4 - fat * 9, 0) / 4, 1)
+    return {
+        "analyzer": "stub",
+        "sha256": digest,
+        "width": width,
+        "height": height,
+        "food_name": "Блюдо с фото",
+        "calories": float(calories),
+        "protein": protein,
+        "carbs": carbs,
+        "fat": fat,
+        "notes": "Оценка без модели распознавания",
+    }
+
+
+def load_analyzer(spec: str):
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def run_analysis(spec: str, path: str, thumb_dir: str, max_px: int) -> dict:
+    """Worker entry point (must stay a picklable top-level function)."""
+    return load_analyzer(spec)(path, thumb_dir, max_px)
+
+
+# ---- Executor ----
+def get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if settings.PHOTO_WORKERS > 0:
+            _executor = ProcessPoolExecutor(max_workers=settings.PHOTO_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="photo")
+    return _executor
+
+
+async def shutdown():
+    global _executor
+    for task in list(_tasks):
+        task.cancel()
+    if _tasks:
+        await asyncio.gather(*_tasks, return_exceptions=True)
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+# ---- Upload ----
+async def save_upload(file: UploadFile) -> Tuple[str, str, int, str]:
+    """Hash the upload into the store's temp dir chunk by chunk off the event loop.
+
+    Returns (sha256, tmp_path, size, ext); `image_store.put` moves it into place.
+    """
+    if file.content_type and not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=415, detail="Only image uploads are supported")
+    ext = os.path.splitext(file.filename or "")[1].lower()[:10] or ".jpg"
+    try:
+        sha256, tmp_path, size = await run_in_threadpool(image_store.hashing_copy, file.file, settings.PHOTO_UPLOAD_CHUNK, settings.PHOTO_MAX_BYTES)
+    except ValueError:
+        raise HTTPException(status_code=413, detail="Image too large")
+    if size == 0:
+        os.remove(tmp_path)
+        raise HTTPException(status_code=400, detail="Empty upload")
+    return sha256, tmp_path, size, ext
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+# ---- Job execution ----
+def _apply_result(db: Session, job: PhotoJob, result: dict):
+    """Mark the job done and fill its placeholder meal from `result` (no commit)."""
+    job.status = "done"
+    job.result = json.dumps(result, ensure_ascii=False)
+    job.finished_at = datetime.utcnow()
+    # Owner check: without FK enforcement on SQLite a deleted meal's id can be reused by another user's meal
+    meal = db.scalar(select(Meal).where(Meal.id == job.meal_id, Meal.user_id == job.user_id)) if job.meal_id else None
+    user = db.get(User, job.user_id)
+    if meal is None or user is None:
+        return  # meal deleted while the job was running
+    before = meal_values(meal)
+    for field in ("food_name", "calories", "protein", "carbs", "fat"):
+        setattr(meal, field, result[field])
+    meal.image_url = image_store.media_url(job.file_path)
+    apply_delta(db, user, meal_day(meal), meal_delta(before, meal_values(meal)))
+    progress.record_meal_change(db, user.id, meal.day, 0)
+    frequent_foods.record(db, user.id, frequent_foods.snapshot(meal), meal.created_at)
+
+
+def create_job(db: Session, user_id: int, filename: str, sha256: str, tmp_path: str, size: int, ext: str) -> Tuple[PhotoJob, bool]:
+    """Store the upload, create the placeholder meal and its job (no commit).
+
+    Returns (job, cached); a cached job is already done and must not be submitted.
+    """
+    blob = image_store.put(db, sha256, tmp_path, size, ext)
+    meal = Meal(user_id=user_id, food_name=f"Фото: {filename}", calories=0, protein=0, carbs=0, fat=0, meal_type="snack")
+    db.add(meal)
+    apply_delta(db, db.get(User, user_id), meal_day(meal), meal_delta(meal_values(None), meal_values(meal)))
+    progress.record_meal_change(db, user_id, meal.day, 1)
+    job = PhotoJob(id=new_job_id(), user_id=user_id, meal_id=meal.id, status="queued", file_path=blob.path, sha256=sha256)
+    db.add(job)
+    cached = image_store.lookup(blob)
+    if cached:
+        _apply_result(db, job, dict(json.loads(cached), cache="sha256"))
+    db.flush()
+    image_store.evict(db)
+    return job, bool(cached)
+
+
+def _finish_job(db: Session, job_id: str, phash: Optional[str], result: Optional[dict], error: Optional[str]):
+    job = db.get(PhotoJob, job_id)
+    if job is None:
+        return
+    if error is not None:
+        job.status = "failed"
+        job.error = error
+        job.finished_at = datetime.utcnow()
+        return
+    blob = db.get(ImageBlob, job.sha256) if job.sha256 else None
+    if blob is not None:
+        blob.phash = phash
+        blob.result = json.dumps({k: v for k, v in result.items() if k != "cache"}, ensure_ascii=False)
+    _apply_result(db, job, result)
+
+
+def _similar_result(db: Session, phash: Optional[str], sha256: Optional[str]) -> Optional[dict]:
+    similar = image_store.find_similar(db, phash, sha256 or "")
+    return dict(json.loads(similar.result), cache="phash") if similar is not None else None
+
+
+async def _run_job(job_id: str, path: str):
+    async with AsyncSessionLocal() as db:
+        job = await db.get(PhotoJob, job_id)
+        if job is None:
+            return
+        sha256, user_id = job.sha256, job.user_id
+        job.status = "running"
+        await db.commit()
+    loop = asyncio.get_running_loop()
+    phash = result = error = None
+    try:
+        phash = await loop.run_in_executor(get_executor(), image_store.perceptual_hash, path)
+        async with AsyncSessionLocal() as db:
+            result = await db.run_sync(_similar_result, phash, sha256)
+            await db.commit()
+        if result is None:
+            result = await loop.run_in_executor(
+                get_executor(), run_analysis, settings.PHOTO_ANALYZER, path, media_path(THUMB_SUBDIR), settings.PHOTO_THUMB_PX
+            )
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:  # analyzer failure is reported on the job, not raised
+        error = f"{type(e).__name__}: {e}"
+    async with AsyncSessionLocal() as db:
+        await db.run_sync(_finish_job, job_id, phash, result, error)
+        await db.commit()
+    if error is None:
+        await response_cache.cache.invalidate(user_id, response_cache.OVERVIEW, response_cache.HISTORY)
+
+
+def submit(job_id: str, path: str):
+    task = asyncio.get_running_loop().create_task(_run_job(job_id, path))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def resume_pending():
+    """Re-submit jobs left queued/running by a previous process."""
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(select(PhotoJob.id, PhotoJob.file_path).where(PhotoJob.status.in_(PENDING_STATUSES)))).all()
+    for job_id, path in rows:
+        submit(job_id, path)
+    return len(rows)
@@ -0,0 +1,233 @@
+"""Materialized per-user progress: streaks, meal totals and achievements.
+
+Meal, water, sleep and weight writes update the UserProgress row
+incrementally so the overview reads it in O(1). A missing row is rebuilt from
+history on first use; the whole table can be regenerated with:
+
+    python -m backend.progress --rebuild [--user-id N]
+"""
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from .models import User, Meal, DailyLog, WeightEntry, UserProgress
+
+ACHIEVEMENTS = {
+    'first_meal': 'Первое блюдо',
+    'five_meals': '5 блюд',
+    'streak_3': 'Стрик 3 дня',
+    'streak_7': 'Стрик 7 дней',
+    'water_goal': 'Цель по воде',
+    'sleep_8h': 'Сон 8 часов',
+    'weight_logged': 'Вес обновлён',
+}
+
+SLEEP_GOAL_H = 8
+
+
+def _day(s: str):
+    return datetime.strptime(s, '%Y-%m-%d').date()
+
+
+def _now_iso() -> str:
+    return datetime.utcnow().replace(microsecond=0).isoformat()
+
+
+def unlocked(progress: Optional[UserProgress]) -> Dict[str, str]:
+    if progress is None or not progress.achievements:
+        return {}
+    try:
+        return json.loads(progress.achievements)
+    except ValueError:
+        return {}
+
+
+def unlock(progress: UserProgress, achievement_id: str, when: Optional[str] = None):
+    data = unlocked(progress)
+    if achievement_id not in data:
+        data[achievement_id] = when or _now_iso()
+        progress.achievements = json.dumps(data)
+
+
+def _check_counters(progress: UserProgress):
+    if progress.total_meals >= 1: unlock(progress, 'first_meal')
+    if progress.total_meals >= 5: unlock(progress, 'five_meals')
+    if progress.longest_streak >= 3: unlock(progress, 'streak_3')
+    if progress.longest_streak >= 7: unlock(progress, 'streak_7')
+
+
+def current_streak(progress: Optional[UserProgress], today: str) -> int:
+    """Streak as of `today`: only counts if today itself is logged."""
+    if progress is None or progress.last_logged_day != today:
+        return 0
+    return progress.current_streak or 0
+
+
+def achievements_list(progress: Optional[UserProgress]) -> List[dict]:
+    data = unlocked(progress)
+    return [{'id': a, 'title': title, 'unlocked_at': data[a]} for a, title in ACHIEVEMENTS.items() if a in data]
+
+
+# ---- Streak computation ----
+def _streaks(days: Iterable[str]) -> tuple:
+    """(current streak ending at the last day, longest streak, last day, {n: day streak first reached n})."""
+    current = longest = 0
+    last = None
+    reached: Dict[int, str] = {}
+    for d in days:
+        if last is not None and _day(d) - _day(last) == timedelta(days=1):
+            current += 1
+        elif d != last:
+            current = 1
+        last = d
+        longest = max(longest, current)
+        for n in (3, 7):
+            if current >= n and n not in reached:
+                reached[n] = d
+    return current, longest, last, reached
+
+
+def _logged_days(db: Session, user_id: int) -> List[str]:
+    return list(db.scalars(
+        select(DailyLog.date).where(DailyLog.user_id == user_id, DailyLog.calories > 0).order_by(DailyLog.date)
+    ))
+
+
+def _recompute_streaks(db: Session, progress: UserProgress):
+    current, longest, last, _ = _streaks(_logged_days(db, progress.user_id))
+    progress.current_streak = current
+    progress.longest_streak = longest
+    progress.last_logged_day = last
+
+
+# ---- Incremental maintenance ----
+def get_progress(db: Session, user_id: int) -> UserProgress:
+    progress = db.get(UserProgress, user_id)
+    if progress is None:
+        progress = rebuild(db, user_id=user_id)[0]
+    return progress
+
+
+def derive_progress(db: Session, user_id: int) -> UserProgress:
+    """Progress derived from history for a read; the row is not added to the session."""
+    return rebuild(db, user_id=user_id, persist=False)[0]
+
+
+def record_meal_change(db: Session, user_id: int, day: str, meals_delta: int):
+    """Apply a meal insert (+1) / delete (-1) / update (0) on `day` (no commit).
+
+    Must run after the DailyLog delta so the day's calories are current.
+    """
+    db.flush()
+    progress = db.get(UserProgress, user_id)
+    if progress is None:
+        # First touch: the rebuild already sees the flushed change
+        _check_counters(rebuild(db, user_id=user_id)[0])
+        return
+    progress.total_meals = max((progress.total_meals or 0) + meals_delta, 0)
+    calories = db.scalar(select(DailyLog.calories).where(DailyLog.user_id == user_id, DailyLog.date == day)) or 0
+    last = progress.last_logged_day
+    if calories > 0:
+        if last is None or _day(day) - _day(last) == timedelta(days=1):
+            progress.current_streak = (progress.current_streak or 0) + 1 if last else 1
+            progress.last_logged_day = day
+        elif day > last:
+            progress.current_streak = 1
+            progress.last_logged_day = day
+        elif day < last:
+            # Back-dated day may bridge a gap
+            _recompute_streaks(db, progress)
+        progress.longest_streak = max(progress.longest_streak or 0, progress.current_streak or 0)
+    elif last and _day(last) - timedelta(days=(progress.current_streak or 1) - 1) <= _day(day) <= _day(last):
+        # Day inside the current streak dropped to zero calories
+        _recompute_streaks(db, progress)
+    _check_counters(progress)
+
+
+def record_water(db: Session, user: User, water_l: float):
+    if user.water_intake and water_l >= user.water_intake:
+        unlock(get_progress(db, user.id), 'water_goal')
+
+
+def record_sleep(db: Session, user_id: int, hours: float):
+    if hours >= SLEEP_GOAL_H:
+        unlock(get_progress(db, user_id), 'sleep_8h')
+
+
+def record_weight(db: Session, user_id: int):
+    unlock(get_progress(db, user_id), 'weight_logged')
+
+
+# ---- Rebuild from history ----
+def _first_dates(rows) -> Dict[int, str]:
+    return {uid: d for uid, d in rows if d is not None}
+
+
+def rebuild(db: Session, user_id: Optional[int] = None, persist: bool = True) -> List[UserProgress]:
+    """Regenerate UserProgress rows from meals, daily logs and weights (no commit).
+
+    Achievements already unlocked keep their original timestamp, as with
+    incremental `unlock`; only newly reached ones get the date from history.
+    With persist=False missing rows are returned transient (read paths).
+    """
+    def scoped(q, col):
+        return q.where(col == user_id) if user_id is not None else q
+
+    user_ids = list(db.scalars(scoped(select(User.id), User.id)))
+    logged: Dict[int, List[str]] = {}
+    for uid, d in db.execute(scoped(select(DailyLog.user_id, DailyLog.date).where(DailyLog.calories > 0), DailyLog.user_id).order_by(DailyLog.user_id, DailyLog.date)):
+        logged.setdefault(uid, []).append(d)
+    counts = dict(db.execute(scoped(select(Meal.user_id, func.count(Meal.id)), Meal.user_id).group_by(Meal.user_id)).all())
+    # Timestamps of the 1st and 5th meal per user
+    rn = func.row_number().over(partition_by=Meal.user_id, order_by=(Meal.created_at, Meal.id)).label('rn')
+    ranked = scoped(select(Meal.user_id, Meal.created_at, rn), Meal.user_id).subquery()
+    nth: Dict[tuple, datetime] = {(uid, n): ts for uid, ts, n in db.execute(select(ranked.c.user_id, ranked.c.created_at, ranked.c.rn).where(ranked.c.rn.in_((1, 5))))}
+    water = _first_dates(db.execute(scoped(
+        select(DailyLog.user_id, func.min(DailyLog.date)).join(User, User.id == DailyLog.user_id)
+        .where(User.water_intake > 0, DailyLog.water_l >= User.water_intake), DailyLog.user_id).group_by(DailyLog.user_id)))
+    sleep = _first_dates(db.execute(scoped(
+        select(DailyLog.user_id, func.min(DailyLog.date)).where(DailyLog.sleep_h >= SLEEP_GOAL_H), DailyLog.user_id).group_by(DailyLog.user_id)))
+    weight = _first_dates(db.execute(scoped(
+        select(WeightEntry.user_id, func.min(WeightEntry.date)), WeightEntry.user_id).group_by(WeightEntry.user_id)))
+
+    existing = {p.user_id: p for p in db.scalars(scoped(select(UserProgress), UserProgress.user_id))}
+    out = []
+    for uid in user_ids:
+        current, longest, last, reached = _streaks(logged.get(uid, []))
+        ach: Dict[str, str] = {}
+        if (uid, 1) in nth: ach['first_meal'] = nth[(uid, 1)].replace(microsecond=0).isoformat()
+        if (uid, 5) in nth: ach['five_meals'] = nth[(uid, 5)].replace(microsecond=0).isoformat()
+        if 3 in reached: ach['streak_3'] = reached[3]
+        if 7 in reached: ach['streak_7'] = reached[7]
+        if uid in water: ach['water_goal'] = water[uid]
+        if uid in sleep: ach['sleep_8h'] = sleep[uid]
+        if uid in weight: ach['weight_logged'] = weight[uid]
+        progress = existing.get(uid) or UserProgress(user_id=uid)
+        ach.update(unlocked(progress))
+        progress.current_streak = current
+        progress.longest_streak = longest
+        progress.last_logged_day = last
+        progress.total_meals = counts.get(uid, 0)
+        progress.achievements = json.dumps(ach)
+        if uid not in existing and persist:
+            db.add(progress)
+        out.append(progress)
+    return out
+
+
+if __name__ == '__main__':
+    import argparse
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description='Rebuild materialized user progress from history')
+    parser.add_argument('--rebuild', action='store_true', required=True)
+    parser.add_argument('--user-id', type=int, default=None)
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        rows = rebuild(db, user_id=args.user_id)
+        db.commit()
+    finally:
+        db.close()
+    print(f"rebuilt progress for {len(rows)} user(s)")
@@ -0,0 +1,93 @@
+"""Bulk recomputation of BMR/TDEE/daily calories for all users.
+
+Run after changing ACTIVITY_MAP / GOAL_ADJUST or the formula in targets.py:
+
+    python -m backend.recompute --chunk-size 5000 --log-days 30
+
+Users are streamed in primary-key chunks, targets are computed with
+`compute_targets_batch`, and results are written back with executemany
+UPDATEs. DailyLog.target/deficit are refreshed for the last `--log-days`
+days. Running API workers pick the new values up when their user cache
+entries expire (USER_CACHE_TTL_SECONDS).
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.orm import Session
+from .models import User, DailyLog
+from .targets import activity_factor, compute_targets_batch
+from . import data_version
+
+
+def _chunks(db: Session, chunk_size: int):
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(User.id, User.weight, User.height, User.age, User.gender,
+                   User.activity_multiplier, User.activity_level, User.goal)
+            .where(User.id > last_id).order_by(User.id).limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def _nan(values):
+    return np.array([np.nan if v is None else v for v in values], dtype=float)
+
+
+def recompute_all(db: Session, chunk_size: int = 5000, log_days: int = 30, dry_run: bool = False) -> dict:
+    """Recompute targets for every user; returns counters and throughput."""
+    since = (datetime.utcnow().date() - timedelta(days=log_days - 1)).strftime('%Y-%m-%d') if log_days > 0 else None
+    logs = DailyLog.__table__
+    log_update = (
+        update(logs)
+        .where(logs.c.user_id == bindparam('uid'), logs.c.date >= since)
+        .values(target=bindparam('target'), deficit=bindparam('target') - func.coalesce(logs.c.calories, 0))
+    )
+    stats = {'users_seen': 0, 'users_updated': 0, 'logs_updated': 0}
+    t0 = time.perf_counter()
+    for rows in _chunks(db, chunk_size):
+        ids, weight, height, age, gender, mult, level, goal = zip(*rows)
+        factor = [activity_factor(m, l) for m, l in zip(mult, level)]
+        res = compute_targets_batch(_nan(weight), _nan(height), _nan(age), gender, factor, goal)
+        valid = res['valid']
+        user_params = [
+            {'id': uid, 'bmr': float(b), 'tdee': float(t), 'daily_calories': float(d)}
+            for uid, b, t, d, ok in zip(ids, res['bmr'], res['tdee'], res['daily_calories'], valid) if ok
+        ]
+        stats['users_seen'] += len(rows)
+        stats['users_updated'] += len(user_params)
+        if dry_run or not user_params:
+            continue
+        # ORM bulk UPDATE by primary key -> single executemany
+        db.execute(update(User), user_params)
+        data_version.touch(db, *(p['id'] for p in user_params))
+        if since:
+            result = db.connection().execute(log_update, [{'uid': p['id'], 'target': p['daily_calories']} for p in user_params])
+            stats['logs_updated'] += max(result.rowcount, 0)
+        db.commit()
+    elapsed = time.perf_counter() - t0
+    stats['seconds'] = round(elapsed, 3)
+    stats['users_per_sec'] = round(stats['users_seen'] / elapsed, 1) if elapsed else 0.0
+    return stats
+
+
+if __name__ == '__main__':
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description='Recompute BMR/TDEE/daily calories for all users')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--log-days', type=int, default=30, help='refresh DailyLog target/deficit for this many recent days (0 = skip)')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        stats = recompute_all(db, chunk_size=args.chunk_size, log_days=args.log_days, dry_run=args.dry_run)
+    finally:
+        db.close()
+    print(f"users: {stats['users_seen']} seen, {stats['users_updated']} updated; daily logs updated: {stats['logs_updated']}")
+    print(f"{stats['seconds']} s, {stats['users_per_sec']} users/s")
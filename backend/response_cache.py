@@ -0,0 +1,296 @@
+"""Server-side cache of serialized GET responses (overview, history).
+
+Entries are grouped per (user, endpoint); each group holds one body per
+variant. Variants include the user's data version and every input the body
+depends on (today's date, the `days` argument, ...), so writes made outside
+the API (CLIs, maintenance jobs) that bump the data version are never served
+stale. Write handlers also invalidate exactly the groups their change can
+affect, after committing.
+
+A read that misses takes a token from the backend and stores its body with
+it; if the group was invalidated in between (a write committed while the
+response was being built) the store is dropped, so a slow reader can't put
+stale data back.
+
+Backends (RESPONSE_CACHE_BACKEND):
+- `memory`: per-process LRU + TTL (default; with several workers an
+  invalidation only reaches the worker that handled the write, so keep the
+  TTL short or use Redis);
+- `redis`: shared, via `redis.asyncio` (RESPONSE_CACHE_URL; needs the
+  optional `redis` package);
+- `fake-redis`: the Redis backend on an in-process stand-in (dev/tests);
+- `off`: no caching.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from .config import get_settings
+from . import metrics
+
+settings = get_settings()
+
+OVERVIEW = 'overview'
+HISTORY = 'history'
+MAX_VARIANTS = 8  # bodies kept per (user, endpoint) group
+
+
+def group_key(user_id: int, endpoint: str) -> str:
+    return f"rc:{user_id}:{endpoint}"
+
+
+class MemoryBackend:
+    """LRU of groups; invalidations are stamped with a logical clock to reject stale stores."""
+
+    name = 'memory'
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, OrderedDict]]" = OrderedDict()
+        self._invalidated: "OrderedDict[str, int]" = OrderedDict()  # group -> clock at invalidation
+        self._floor = 0  # newest stamp dropped from _invalidated
+        self._clock = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expired = 0
+
+    async def lookup(self, key: str, field: str) -> Tuple[int, Optional[bytes]]:
+        now = time.monotonic()
+        with self._lock:
+            token = self._clock
+            entry = self._data.get(key)
+            if entry is None:
+                return token, None
+            if entry[0] < now:
+                del self._data[key]
+                self.expired += 1
+                return token, None
+            self._data.move_to_end(key)
+            return token, entry[1].get(field)
+
+    async def store(self, key: str, field: str, token: int, value: bytes):
+        with self._lock:
+            if self._invalidated.get(key, self._floor) > token:
+                return
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                entry = (time.monotonic() + self.ttl, OrderedDict())
+                self._data[key] = entry
+            self._data.move_to_end(key)
+            variants = entry[1]
+            variants[field] = value
+            while len(variants) > MAX_VARIANTS:
+                variants.popitem(last=False)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    async def invalidate(self, key: str):
+        with self._lock:
+            self._clock += 1
+            self._data.pop(key, None)
+            self._invalidated[key] = self._clock
+            self._invalidated.move_to_end(key)
+            while len(self._invalidated) > self.maxsize:
+                _, stamp = self._invalidated.popitem(last=False)
+                self._floor = max(self._floor, stamp)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'bytes': sum(len(v) for _, variants in self._data.values() for v in variants.values()),
+                'evictions': self.evictions,
+                'expired': self.expired,
+            }
+
+
+class RedisBackend:
+    """Generation-keyed hashes on a redis.asyncio-compatible client.
+
+    `<group>:gen` holds the group's generation; bodies live in the hash
+    `<group>:<gen>`. Invalidation increments the generation, so a store made
+    with an older token lands in a hash nobody reads (and expires).
+    """
+
+    name = 'redis'
+    STATS_INTERVAL = 30.0  # seconds between INFO polls for server-side evictions
+
+    def __init__(self, client, ttl: float):
+        self.client = client
+        self.ttl = max(int(ttl), 1)
+        self._server: Dict[str, int] = {}
+        self._server_at = 0.0
+
+    async def lookup(self, key: str, field: str) -> Tuple[int, Optional[bytes]]:
+        await self._poll_server_stats()
+        gen = int(await self.client.get(f"{key}:gen") or 0)
+        return gen, await self.client.hget(f"{key}:{gen}", field)
+
+    async def store(self, key: str, field: str, token: int, value: bytes):
+        data_key = f"{key}:{token}"
+        await self.client.hset(data_key, field, value)
+        await self.client.expire(data_key, self.ttl)
+
+    async def invalidate(self, key: str):
+        gen = await self.client.incr(f"{key}:gen")
+        await self.client.expire(f"{key}:gen", self.ttl * 2)
+        await self.client.delete(f"{key}:{gen - 1}")
+
+    async def _poll_server_stats(self):
+        now = time.monotonic()
+        if now - self._server_at < self.STATS_INTERVAL:
+            return
+        self._server_at = now
+        try:
+            info = await self.client.info('stats')
+        except Exception:
+            return
+        self._server = {'evictions': int(info.get('evicted_keys', 0)), 'expired': int(info.get('expired_keys', 0))}
+
+    def stats(self) -> dict:
+        # Server-wide counters (the Redis instance may be shared), refreshed every STATS_INTERVAL
+        return dict(self._server)
+
+
+class FakeRedis:
+    """In-process stand-in for the few redis.asyncio calls RedisBackend makes."""
+
+    def __init__(self, maxkeys: int = 100000):
+        self.maxkeys = maxkeys
+        self._data: "OrderedDict[str, list]" = OrderedDict()  # key -> [expires or None, value]
+        self.evicted_keys = 0
+        self.expired_keys = 0
+
+    def _get(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[0] is not None and item[0] < time.monotonic():
+            del self._data[key]
+            self.expired_keys += 1
+            return None
+        self._data.move_to_end(key)
+        return item
+
+    def _put(self, key: str, value):
+        self._data[key] = [None, value]
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxkeys:
+            self._data.popitem(last=False)
+            self.evicted_keys += 1
+
+    @staticmethod
+    def _bytes(value) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        item = self._get(key)
+        return item[1] if item is not None else None
+
+    async def incr(self, key: str) -> int:
+        item = self._get(key)
+        value = int(item[1]) + 1 if item is not None else 1
+        if item is None:
+            self._put(key, b"1")
+        else:
+            item[1] = self._bytes(value)
+        return value
+
+    async def hget(self, key: str, field: str) -> Optional[bytes]:
+        item = self._get(key)
+        return item[1].get(self._bytes(field)) if item is not None else None
+
+    async def hset(self, key: str, field: str, value) -> int:
+        item = self._get(key)
+        if item is None:
+            self._put(key, {})
+            item = self._data[key]
+        item[1][self._bytes(field)] = self._bytes(value)
+        return 1
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        item = self._get(key)
+        if item is None:
+            return False
+        item[0] = time.monotonic() + seconds
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self._data.pop(k, None) is not None for k in keys)
+
+    async def info(self, section: Optional[str] = None) -> dict:
+        return {'evicted_keys': self.evicted_keys, 'expired_keys': self.expired_keys}
+
+
+class ResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._counts = {'hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0, 'errors': 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counts[key] += 1
+
+    async def get(self, user_id: int, endpoint: str, variant: str) -> Tuple[Optional[int], Optional[bytes]]:
+        """(token, body); pass the token to `put` after a miss. Backend errors count as misses."""
+        if self.backend is None:
+            return None, None
+        try:
+            token, body = await self.backend.lookup(group_key(user_id, endpoint), variant)
+        except Exception:
+            self._count('errors')
+            return None, None
+        self._count('hits' if body is not None else 'misses')
+        return token, body
+
+    async def put(self, user_id: int, endpoint: str, variant: str, token: Optional[int], body: bytes):
+        if self.backend is None or token is None:
+            return
+        try:
+            await self.backend.store(group_key(user_id, endpoint), variant, token, body)
+            self._count('stores')
+        except Exception:
+            self._count('errors')
+
+    async def invalidate(self, user_id: int, *endpoints: str):
+        if self.backend is None:
+            return
+        for endpoint in endpoints:
+            try:
+                await self.backend.invalidate(group_key(user_id, endpoint))
+                self._count('invalidations')
+            except Exception:
+                self._count('errors')
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._counts)
+        lookups = data['hits'] + data['misses']
+        data['hit_ratio'] = round(data['hits'] / lookups, 4) if lookups else 0.0
+        data['backend'] = self.backend.name if self.backend is not None else 'off'
+        if self.backend is not None:
+            data.update(self.backend.stats())
+        return data
+
+
+def _make_backend():
+    kind = settings.RESPONSE_CACHE_BACKEND
+    ttl = settings.RESPONSE_CACHE_TTL_SECONDS
+    if kind == 'off':
+        return None
+    if kind == 'memory':
+        return MemoryBackend(settings.RESPONSE_CACHE_SIZE, ttl)
+    if kind == 'fake-redis':
+        return RedisBackend(FakeRedis(), ttl)
+    if kind == 'redis':
+        import redis.asyncio as redis  # type: ignore  # optional dependency
+        return RedisBackend(redis.Redis.from_url(settings.RESPONSE_CACHE_URL), ttl)
+    raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND: {kind}")
+
+
+cache = ResponseCache(_make_backend())
+metrics.register_stats('response_cache', cache.stats)
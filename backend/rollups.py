@@ -0,0 +1,124 @@
+"""Weekly and monthly rollups of DailyLog meal totals.
+
+Every DailyLog delta (meal create/update/delete, photo results, drift
+repairs, bulk imports) is applied to the day's week and month rows with one
+INSERT ... ON CONFLICT DO UPDATE, so long-range history is a single range
+scan on uq_rollup_user_period_start instead of a re-sum of logs or meals.
+`days_logged` counts days with at least one meal and moves when a day's
+meal count crosses zero.
+
+    python -m backend.rollups --rebuild [--user-id N]
+"""
+from datetime import date as _date, datetime, timedelta
+from typing import Dict, Optional, Tuple
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+from .models import DailyLog, LogRollup
+from . import daily_logs, data_version
+
+PERIODS = ('week', 'month')
+ROLLUP_FIELDS = ('calories', 'protein', 'carbs', 'fat', 'meals_count')
+INSERT_CHUNK = 5000
+
+
+def period_start(day: str, period: str) -> str:
+    d = datetime.strptime(day, '%Y-%m-%d').date()
+    if period == 'week':
+        d -= timedelta(days=d.weekday())
+    elif period == 'month':
+        d = d.replace(day=1)
+    else:
+        raise ValueError(f"Unknown period: {period}")
+    return d.isoformat()
+
+
+def range_start(days: int, period: str, today: Optional[_date] = None) -> str:
+    """Start of the first bucket overlapping the last `days` days."""
+    first = (today or datetime.utcnow().date()) - timedelta(days=days - 1)
+    return period_start(first.isoformat(), period)
+
+
+def apply(db: Session, user_id: int, day: str, delta: Dict[str, float], days_delta: int = 0):
+    """Add a DailyLog delta to the day's week and month rows (no commit)."""
+    apply_many(db, user_id, {day: (delta, days_delta)})
+
+
+def apply_many(db: Session, user_id: int, changes: Dict[str, Tuple[Dict[str, float], int]]):
+    """Add several days' (delta, days_delta) with one upsert, summed per bucket first (no commit)."""
+    acc: Dict[tuple, dict] = {}
+    for day, (delta, days_delta) in changes.items():
+        if not days_delta and not any(delta.get(f) for f in ROLLUP_FIELDS):
+            continue
+        for period in PERIODS:
+            key = (period, period_start(day, period))
+            row = acc.get(key)
+            if row is None:
+                row = acc[key] = dict(user_id=user_id, period=period, start=key[1], days_logged=0, **{f: 0 for f in ROLLUP_FIELDS})
+            for f in ROLLUP_FIELDS:
+                row[f] += delta.get(f, 0)
+            row['days_logged'] += days_delta
+    if not acc:
+        return
+    stmt = daily_logs.dialect_insert(db)(LogRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[LogRollup.user_id, LogRollup.period, LogRollup.start],
+        set_={f: getattr(LogRollup, f) + getattr(stmt.excluded, f) for f in ROLLUP_FIELDS + ('days_logged',)},
+    )
+    db.execute(stmt, list(acc.values()))
+
+
+def range_query(user_id: int, period: str, since: str):
+    """Rollup rows from `since` on, oldest first (one range scan on the unique index)."""
+    return (
+        select(LogRollup.start, *[getattr(LogRollup, f) for f in ROLLUP_FIELDS], LogRollup.days_logged)
+        .where(LogRollup.user_id == user_id, LogRollup.period == period, LogRollup.start >= since)
+        .order_by(LogRollup.start)
+    )
+
+
+def rebuild(db: Session, user_id: Optional[int] = None) -> int:
+    """Regenerate rollups from daily_logs (no commit); returns the number of rows written."""
+    q = delete(LogRollup)
+    logs = select(DailyLog.user_id, DailyLog.date, *[func.coalesce(getattr(DailyLog, f), 0) for f in ROLLUP_FIELDS])
+    if user_id is not None:
+        q = q.where(LogRollup.user_id == user_id)
+        logs = logs.where(DailyLog.user_id == user_id)
+        touched = {user_id}
+    else:
+        touched = set(db.scalars(select(LogRollup.user_id).distinct()))
+    db.execute(q)
+    acc: Dict[tuple, dict] = {}
+    for uid, day, *totals in db.execute(logs.execution_options(yield_per=INSERT_CHUNK)):
+        if not day or not any(totals):
+            continue  # water / sleep-only days
+        for period in PERIODS:
+            key = (uid, period, period_start(day, period))
+            row = acc.get(key)
+            if row is None:
+                row = acc[key] = dict(user_id=uid, period=period, start=key[2], days_logged=0, **{f: 0 for f in ROLLUP_FIELDS})
+            for f, v in zip(ROLLUP_FIELDS, totals):
+                row[f] += v
+            row['days_logged'] += 1 if totals[-1] > 0 else 0
+    rows = list(acc.values())
+    for i in range(0, len(rows), INSERT_CHUNK):
+        db.execute(insert(LogRollup), rows[i:i + INSERT_CHUNK])
+    # Core writes: bump the version so cached week / month history is not reused
+    data_version.touch(db, *touched, *{row['user_id'] for row in rows})
+    return len(rows)
+
+
+if __name__ == '__main__':
+    import argparse
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description='Rebuild weekly / monthly rollups from daily logs')
+    parser.add_argument('--rebuild', action='store_true', required=True)
+    parser.add_argument('--user-id', type=int, default=None)
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        n = rebuild(db, user_id=args.user_id)
+        db.commit()
+    finally:
+        db.close()
+    print(f"rebuilt {n} rollup row(s)")
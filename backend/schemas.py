@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from typing import Optional, List, Any
 import json
+from datetime import datetime
 
 class UserCreate(BaseModel):
     telegram_id: str = Field(..., min_length=1)
@@ -122,9 +123,19 @@ class MealOut(BaseModel):
     class Config:
         from_attributes = True
 
+class SummaryDay(BaseModel):
+    date: str  # YYYY-MM-DD
+    calories: float
+    protein: float
+    carbs: float
+    fat: float
+    meals_count: int
+
 class DailySummary(BaseModel):
     user_id: int
-    calories_target: Optional[float]
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    calories_target: Optional[float]  # daily target × number of days in range
     calories_consumed: float
     calories_remaining: Optional[float]
     meals_count: int
@@ -133,32 +144,60 @@ class DailySummary(BaseModel):
     carbs_total: float
     fat_total: float
     message: str
+    days: List[SummaryDay] = []
     meals: List[MealOut] = []
 
 class HistoryDay(BaseModel):
+    # For week / month rows `date` is the bucket start and calories / macros are
+    # averages per logged day (days_logged); `target` is the current daily target
     date: str  # YYYY-MM-DD
     calories: float
     target: Optional[float]
     deficit: Optional[float]
     percent: float
+    protein: Optional[float] = None
+    carbs: Optional[float] = None
+    fat: Optional[float] = None
+    meals_count: Optional[int] = None
+    days_logged: Optional[int] = None
+    calories_total: Optional[float] = None
 
 class HistoryResponse(BaseModel):
+    resolution: str = 'day'  # day, week, month
     days: List[HistoryDay]
 
+# ---- Weight ----
+class WeightEntryIn(BaseModel):
+    date: Optional[str] = None  # YYYY-MM-DD
+    weight_kg: float
+    source: Optional[str] = "manual"  # manual / imported / device
+
+class WeightEntryOut(BaseModel):
+    date: str
+    weight_kg: float
+    source: Optional[str]
+
 # ---- Weight Forecast ----
 class WeightForecastPoint(BaseModel):
     day: int
     date: str
     est_weight: float
     cumulative_deficit: float
+    lower: Optional[float] = None  # 80% band
+    upper: Optional[float] = None
 
 class WeightForecastResponse(BaseModel):
-    start_weight: float
+    start_weight: float  # smoothed trend weight today
     target_weight: Optional[float]
     daily_avg_deficit: float
     weekly_change_kg: float
     points: List[WeightForecastPoint]
     method: str
+    trend_kg_per_week: Optional[float] = None  # from weigh-ins
+    intake_kg_per_week: Optional[float] = None  # from logged deficits
+    trend_share: float = 0.0  # weight of the weigh-in trend in the blend
+    weight_entries: int = 0
+    target_date: Optional[str] = None
 
 # ---- Macro Goals ----
 class MacroGoals(BaseModel):
@@ -171,11 +210,26 @@ class MacroGoals(BaseModel):
     carbs_pct: float
     method: str
 
-# ---- Photo Analysis (placeholder) ----
+# ---- Photo Analysis ----
 class PhotoAnalysisResult(BaseModel):
-    status: str
-    notes: str
+    analyzer: str
+    sha256: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+    food_name: str
+    calories: float
+    protein: float
+    carbs: float
+    fat: float
+    notes: Optional[str] = None
+    cache: Optional[str] = None  # sha256 / phash when served from the image store
 
-class PhotoMealResponse(BaseModel):
-    meal: MealOut
-    analysis: PhotoAnalysisResult
+class PhotoJobOut(BaseModel):
+    job_id: str
+    status: str
+    meal_id: Optional[int] = None
+    meal: Optional[MealOut] = None
+    analysis: Optional[PhotoAnalysisResult] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
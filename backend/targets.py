@@ -0,0 +1,138 @@
+"""Energy (BMR/TDEE/daily calories) and macro targets.
+
+`compute_targets` is memoized on the profile inputs that affect the result, so
+endpoints can call it per request for free; `compute_targets_batch` is the
+NumPy variant used when recomputing every user after a formula change.
+Call `clear_cache()` after changing ACTIVITY_MAP / GOAL_ADJUST at runtime.
+"""
+from functools import lru_cache
+from typing import NamedTuple, Optional, Sequence
+import numpy as np
+
+ACTIVITY_MAP = {
+    'sedentary': 1.2,
+    'light': 1.375,
+    'moderate': 1.55,
+    'active': 1.725,
+    'very_active': 1.9
+}
+
+GOAL_ADJUST = {
+    'lose': -0.20,
+    'maintain': 0.0,
+    'gain': 0.15
+}
+
+# Macro split: protein g/kg body weight, fat share of calories
+PROTEIN_G_PER_KG = 1.7
+FAT_PCT = 0.28
+DEFAULT_WEIGHT_KG = 70
+MACRO_METHOD = "protein_1.7g_per_kg_fat28pct"
+
+
+class MacroSplit(NamedTuple):
+    calories: float
+    protein_g: float
+    fat_g: float
+    carbs_g: float
+    protein_pct: float
+    fat_pct: float
+    carbs_pct: float
+
+
+class Targets(NamedTuple):
+    bmr: float
+    tdee: float
+    daily_calories: float
+    macros: MacroSplit
+
+
+def activity_factor(activity_multiplier: Optional[float], activity_level: Optional[str]) -> float:
+    return activity_multiplier or ACTIVITY_MAP.get(activity_level or 'sedentary', 1.2)
+
+
+def profile_key(user) -> tuple:
+    """(weight, height, age, gender, activity factor, goal) — the inputs targets depend on."""
+    return (user.weight, user.height, user.age, user.gender,
+            activity_factor(user.activity_multiplier, user.activity_level), user.goal)
+
+
+@lru_cache(maxsize=4096)
+def macro_split(calories: float, weight: Optional[float]) -> MacroSplit:
+    weight = weight or DEFAULT_WEIGHT_KG
+    protein = weight * PROTEIN_G_PER_KG
+    protein_kcal = protein * 4
+    fat_kcal = calories * FAT_PCT
+    fat = fat_kcal / 9
+    remaining_kcal = calories - protein_kcal - fat_kcal
+    if remaining_kcal < 0:
+        remaining_kcal = max(calories * 0.25, 0)
+    carbs = remaining_kcal / 4
+    total_assigned = protein_kcal + fat_kcal + remaining_kcal
+    protein_pct = protein_kcal / total_assigned * 100 if total_assigned else 0
+    fat_pct = fat_kcal / total_assigned * 100 if total_assigned else 0
+    carbs_pct = remaining_kcal / total_assigned * 100 if total_assigned else 0
+    return MacroSplit(calories, protein, fat, carbs, protein_pct, fat_pct, carbs_pct)
+
+
+@lru_cache(maxsize=4096)
+def compute_targets(profile: tuple) -> Optional[Targets]:
+    """Targets for a `profile_key` tuple, or None if the profile is incomplete."""
+    weight, height, age, gender, factor, goal = profile
+    if not (age and gender and height and weight):
+        return None
+    # BMR (Mifflin-St Jeor)
+    base = 10 * weight + 6.25 * height - 5 * age
+    if gender == 'male':
+        bmr = base + 5
+    elif gender == 'female':
+        bmr = base - 161
+    else:
+        bmr = base + (5 - 161) / 2
+    tdee = bmr * factor
+    daily = tdee * (1 + GOAL_ADJUST.get(goal or 'maintain', 0.0))
+    return Targets(round(bmr, 1), round(tdee, 1), round(daily, 0), macro_split(round(daily, 0), weight))
+
+
+def compute_targets_batch(weight: Sequence[float], height: Sequence[float], age: Sequence[float],
+                          gender: Sequence[Optional[str]], factor: Sequence[float], goal: Sequence[Optional[str]]) -> dict:
+    """Vectorized compute_targets over equal-length columns.
+
+    Returns NumPy arrays keyed like Targets/MacroSplit fields plus `valid`
+    (False where the profile is incomplete; other values are NaN there).
+    """
+    weight = np.asarray(weight, dtype=float)
+    height = np.asarray(height, dtype=float)
+    age = np.asarray(age, dtype=float)
+    factor = np.asarray(factor, dtype=float)
+    gender = np.asarray(gender, dtype=object)
+    goal = np.asarray(goal, dtype=object)
+    valid = (np.nan_to_num(weight) > 0) & (np.nan_to_num(height) > 0) & (np.nan_to_num(age) > 0) & (gender != None) & (gender != '')  # noqa: E711
+    base = 10 * weight + 6.25 * height - 5 * age
+    offset = np.where(gender == 'male', 5.0, np.where(gender == 'female', -161.0, (5 - 161) / 2))
+    bmr = np.round(base + offset, 1)
+    tdee = np.round((base + offset) * factor, 1)
+    adjust = np.array([GOAL_ADJUST.get(g or 'maintain', 0.0) for g in goal], dtype=float)
+    daily = np.round((base + offset) * factor * (1 + adjust), 0)
+    protein_kcal = np.nan_to_num(weight, nan=DEFAULT_WEIGHT_KG) * PROTEIN_G_PER_KG * 4
+    fat_kcal = daily * FAT_PCT
+    remaining = daily - protein_kcal - fat_kcal
+    remaining = np.where(remaining < 0, np.maximum(daily * 0.25, 0), remaining)
+    total = protein_kcal + fat_kcal + remaining
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = {
+            'bmr': bmr, 'tdee': tdee, 'daily_calories': daily,
+            'protein_g': protein_kcal / 4, 'fat_g': fat_kcal / 9, 'carbs_g': remaining / 4,
+            'protein_pct': np.where(total > 0, protein_kcal / total * 100, 0.0),
+            'fat_pct': np.where(total > 0, fat_kcal / total * 100, 0.0),
+            'carbs_pct': np.where(total > 0, remaining / total * 100, 0.0),
+        }
+    for k, v in out.items():
+        out[k] = np.where(valid, v, np.nan)
+    out['valid'] = valid
+    return out
+
+
+def clear_cache():
+    compute_targets.cache_clear()
+    macro_split.cache_clear()
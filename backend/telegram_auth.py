@@ -0,0 +1,96 @@
+"""Telegram Mini App initData verification.
+
+The HMAC key sha256(TELEGRAM_BOT_TOKEN) is derived once at import. Verified
+init_data strings are remembered until their auth_date expires
+(TELEGRAM_AUTH_MAX_AGE_SECONDS): the same string presented again within
+TELEGRAM_INITDATA_REUSE_SECONDS of its first verification is answered from
+the cache without parsing or HMAC (mini-app reloads, double submits); after
+that it is rejected as a replay. Entries are keyed by the sha256 of the
+string, so memory per entry is bounded whatever the client sends. Only
+verified payloads are cached, and the cache is per process like the user
+cache.
+"""
+import hashlib
+import hmac
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+from typing import Dict, Tuple
+from fastapi import HTTPException
+from .config import get_settings
+from . import metrics
+
+settings = get_settings()
+
+_SECRET_KEY = hashlib.sha256(settings.TELEGRAM_BOT_TOKEN.encode()).digest() if settings.TELEGRAM_BOT_TOKEN else None
+
+_lock = threading.Lock()
+_verified: "OrderedDict[bytes, Tuple[float, float, Dict[str, str]]]" = OrderedDict()  # sha256(init_data) -> (expires, first seen, fields)
+_stats = {'verified': 0, 'hits': 0, 'replays': 0, 'rejected': 0, 'evictions': 0}
+
+
+def _count(key: str):
+    with _lock:
+        _stats[key] += 1
+
+
+def _reject(status: int, detail: str):
+    _count('rejected')
+    raise HTTPException(status_code=status, detail=detail)
+
+
+def _check(init_data: str, now: float) -> Dict[str, str]:
+    """Full verification: parse, rebuild the data-check string, compare the HMAC, check auth_date."""
+    data = dict(urllib.parse.parse_qsl(init_data, keep_blank_values=True))
+    received_hash = data.pop('hash', None)
+    if received_hash is None:
+        _reject(400, "Missing hash")
+    data_check_string = '\n'.join(f"{k}={v}" for k, v in sorted(data.items()))
+    expected = hmac.new(_SECRET_KEY, data_check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, received_hash):
+        _reject(401, "Invalid hash")
+    try:
+        auth_date = int(data.get('auth_date', '0'))
+    except ValueError:
+        _reject(400, "Invalid auth_date")
+    if now - auth_date > settings.TELEGRAM_AUTH_MAX_AGE_SECONDS:
+        _reject(401, "Auth data expired")
+    return data
+
+
+def verify(init_data: str) -> Dict[str, str]:
+    """Verified initData fields (without `hash`); raises HTTPException."""
+    if _SECRET_KEY is None:
+        raise HTTPException(status_code=500, detail="Bot token not configured")
+    now = time.time()
+    key = hashlib.sha256(init_data.encode()).digest()
+    with _lock:
+        entry = _verified.get(key)
+        seen = entry is not None and now < entry[0]
+        if seen and now - entry[1] <= settings.TELEGRAM_INITDATA_REUSE_SECONDS:
+            _stats['hits'] += 1
+            return dict(entry[2])
+        if seen:
+            _stats['replays'] += 1
+    if seen:
+        raise HTTPException(status_code=401, detail="Auth data already used")
+    data = _check(init_data, now)
+    expires = int(data.get('auth_date', '0')) + settings.TELEGRAM_AUTH_MAX_AGE_SECONDS
+    with _lock:
+        _stats['verified'] += 1
+        _verified[key] = (expires, now, data)
+        _verified.move_to_end(key)
+        # Oldest first: drop expired entries, then anything over the size bound
+        while _verified and (next(iter(_verified.values()))[0] <= now or len(_verified) > settings.TELEGRAM_INITDATA_CACHE_SIZE):
+            _verified.popitem(last=False)
+            _stats['evictions'] += 1
+    return dict(data)
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_stats, size=len(_verified))
+
+
+metrics.register_stats('telegram_auth', stats)
@@ -0,0 +1,44 @@
+import os
+import tempfile
+import uuid
+
+_tmp = tempfile.mkdtemp(prefix="nutriai-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/test.db"
+os.environ["JWT_SECRET"] = "test-secret-" + "x" * 32
+os.environ["TELEGRAM_BOT_TOKEN"] = "123:test"
+os.environ["MEDIA_DIR"] = os.path.join(_tmp, "media")
+os.environ["PHOTO_WORKERS"] = "0"
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from backend import database, main  # noqa: E402
+from backend.models import User  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.fixture
+def db():
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def user(client):
+    """A fresh user with a complete profile: (user id, auth headers)."""
+    r = client.post("/users", json={
+        "telegram_id": uuid.uuid4().hex[:12], "age": 30, "gender": "male", "height": 180, "weight": 80,
+        "goal": "lose", "activity_level": "moderate", "water_intake": 2,
+    })
+    assert r.status_code == 200, r.text
+    uid = r.json()["id"]
+    with database.SessionLocal() as s:
+        token, _ = main._issue_tokens(s.get(User, uid))
+    return uid, {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,75 @@
+import threading
+
+from backend import database, rollups
+from backend.daily_logs import apply_delta, meal_delta, meal_values, reconcile
+from backend.models import DailyLog, LogRollup, Meal, User
+
+
+def _add(db, uid, calories, day="2024-03-04"):
+    meal = Meal(user_id=uid, food_name="x", calories=calories, protein=1, carbs=2, fat=3, meal_type="lunch", day=day)
+    db.add(meal)
+    apply_delta(db, db.get(User, uid), day, meal_delta(meal_values(None), meal_values(meal)))
+    return meal
+
+
+def _log(db, uid, day="2024-03-04"):
+    return db.query(DailyLog).filter(DailyLog.user_id == uid, DailyLog.date == day).one()
+
+
+def test_first_write_creates_log_then_increments(db, user):
+    uid, _ = user
+    _add(db, uid, 300)
+    assert not [o for o in db.new if isinstance(o, DailyLog)]  # created by the upsert, not the ORM
+    db.commit()
+    _add(db, uid, 200)
+    db.commit()
+    log = _log(db, uid)
+    assert (log.calories, log.protein, log.meals_count) == (500, 2, 2)
+    assert log.deficit == log.target - 500
+
+
+def test_delete_delta_and_rollups_match_rebuild(db, user):
+    uid, _ = user
+    meal = _add(db, uid, 400)
+    _add(db, uid, 100, day="2024-03-10")
+    db.commit()
+    apply_delta(db, db.get(User, uid), meal.day, meal_delta(meal_values(meal), meal_values(None)))
+    db.delete(meal)
+    db.commit()
+    assert _log(db, uid).meals_count == 0
+
+    def snap():
+        return sorted((r.period, r.start, r.calories, r.meals_count, r.days_logged)
+                      for r in db.query(LogRollup).filter(LogRollup.user_id == uid))
+    incremental = snap()
+    rollups.rebuild(db, user_id=uid)
+    db.flush()
+    assert snap() == incremental
+    db.rollback()
+    assert reconcile(db, days=100000, user_id=uid) == []
+
+
+def test_concurrent_first_writes_of_a_day(user):
+    uid, _ = user
+    n = 4
+    barrier = threading.Barrier(n)
+    errors = []
+
+    def write():
+        with database.SessionLocal() as s:
+            try:
+                barrier.wait()
+                _add(s, uid, 100, day="2024-05-01")
+                s.commit()
+            except Exception as e:  # noqa: BLE001
+                errors.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    with database.SessionLocal() as s:
+        log = _log(s, uid, "2024-05-01")
+        assert (log.calories, log.meals_count) == (100 * n, n)
@@ -0,0 +1,42 @@
+import threading
+import uuid
+
+from backend import food_catalog
+
+
+def test_search_waits_for_build_off_event_loop(client, db, user):
+    _, headers = user
+    name = f"Гречка {uuid.uuid4().hex[:6]}"
+    food_catalog.load(db, [{"name": name, "calories": 343, "protein": 12.6, "carbs": 62.1, "fat": 3.3}])
+    assert food_catalog.loaded_index() is None
+
+    results = {}
+    # Hold the build lock as the startup warm-up thread would
+    with food_catalog._lock:
+        search = threading.Thread(target=lambda: results.update(r=client.get("/foods/search", params={"q": name}, headers=headers)))
+        search.start()
+        search.join(0.5)
+        assert search.is_alive()
+        # The event loop keeps serving other requests meanwhile
+        assert client.get("/health").status_code == 200
+    search.join(10)
+    r = results["r"]
+    assert r.status_code == 200, r.text
+    assert [f["name"] for f in r.json()] == [name]
+
+
+def _index(*names):
+    return food_catalog.FoodIndex(food_catalog.FoodHit(i, n, None, 100.0, 1.0, 1.0, 1.0, None) for i, n in enumerate(names))
+
+
+def test_misspelled_words_fall_back_to_trigrams():
+    index = _index("Плов с курицей", "Гречка отварная", "Chicken breast grilled", "Chickpea salad")
+    assert [h.name for h in index.search("плв")] == ["Плов с курицей"]
+    assert [h.name for h in index.search("chiken brest")] == ["Chicken breast grilled"]
+    assert index.search("zzz") == []
+
+
+def test_prefix_hits_come_before_fuzzy_ones():
+    index = _index("Рис отварной", "Рыс степной")
+    assert [h.name for h in index.search("рис", limit=1)] == ["Рис отварной"]
+    assert [h.name for h in index.search("рис")][0] == "Рис отварной"
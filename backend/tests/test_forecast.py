@@ -0,0 +1,82 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from backend import forecast
+
+TODAY = "2024-03-31"
+
+
+def _series(kg_per_day, days=28, start=80.0):
+    first = date.fromisoformat(TODAY) - timedelta(days=days - 1)
+    return [((first + timedelta(days=i)).isoformat(), start + kg_per_day * i) for i in range(days)]
+
+
+def test_theil_sen_recovers_a_line():
+    t = np.arange(-10, 1, dtype=float)
+    slope, intercept = forecast.theil_sen(t, 70.0 - 0.1 * t)
+    assert slope == pytest.approx(-0.1)
+    assert intercept == pytest.approx(70.0)
+
+
+def test_trend_ignores_one_bad_weigh_in():
+    weights = _series(-0.1)
+    spiked = list(weights)
+    spiked[14] = (spiked[14][0], spiked[14][1] + 6.0)
+    clean = forecast.forecast(weights, [], None, None, TODAY, 30)
+    noisy = forecast.forecast(spiked, [], None, None, TODAY, 30)
+    assert clean["trend_kg_per_week"] == pytest.approx(-0.7, abs=1e-3)
+    assert noisy["trend_kg_per_week"] == pytest.approx(clean["trend_kg_per_week"], abs=0.02)
+    # Only the smoothed level sees the spike, through its decayed residual
+    assert noisy["start_weight"] == pytest.approx(clean["start_weight"], abs=0.25)
+    assert clean["trend_share"] == 1.0
+
+
+def test_intake_only_below_two_weigh_ins():
+    result = forecast.forecast([(TODAY, 90.0)], [770.0] * 14, 95.0, 85.0, TODAY, 10)
+    assert result["trend_share"] == 0.0
+    assert result["trend_kg_per_week"] is None
+    assert result["start_weight"] == 90.0
+    assert result["weekly_change_kg"] == pytest.approx(-0.7)
+    assert result["points"][10]["est_weight"] == pytest.approx(89.0)
+    assert result["points"][10]["cumulative_deficit"] == pytest.approx(770.0 * 11)
+    # 5 kg at 0.1 kg/day
+    assert result["target_date"] == (date.fromisoformat(TODAY) + timedelta(days=50)).isoformat()
+
+
+def test_blend_weight_grows_with_weigh_ins():
+    few = forecast.forecast(_series(-0.1, days=4), [500.0] * 14, None, None, TODAY, 7)
+    many = forecast.forecast(_series(-0.1, days=28), [500.0] * 14, None, None, TODAY, 7)
+    assert 0 < few["trend_share"] < many["trend_share"] == 1.0
+
+
+def test_bands_widen_with_the_horizon():
+    points = forecast.forecast(_series(-0.05), [300.0, 500.0, 400.0], None, None, TODAY, 30)["points"]
+    widths = [p["upper"] - p["lower"] for p in points]
+    assert all(p["lower"] <= p["est_weight"] <= p["upper"] for p in points)
+    assert widths[-1] > widths[0]
+
+
+def test_no_target_date_when_moving_away():
+    result = forecast.forecast(_series(0.1), [], None, 70.0, TODAY, 30)
+    assert result["target_date"] is None
+
+
+def test_errors():
+    with pytest.raises(ValueError, match="Current weight unknown"):
+        forecast.forecast([], [500.0], None, None, TODAY, 30)
+    with pytest.raises(ValueError, match="Not enough data"):
+        forecast.forecast([(TODAY, 80.0)], [], 80.0, None, TODAY, 30)
+
+
+def test_etag_depends_on_horizon(client, user):
+    _, headers = user
+    assert client.post("/profile/weight", json={"weight_kg": 80}, headers=headers).status_code == 200
+    meal = {"food_name": "Суп", "calories": 400, "meal_type": "lunch"}
+    assert client.post("/meals", json=meal, headers=headers).status_code == 200
+    tag = client.get("/forecast/weight", params={"days": 30}, headers=headers).headers["etag"]
+    assert client.get("/forecast/weight", params={"days": 30}, headers=dict(headers, **{"If-None-Match": tag})).status_code == 304
+    r = client.get("/forecast/weight", params={"days": 14}, headers=dict(headers, **{"If-None-Match": tag}))
+    assert r.status_code == 200
+    assert len(r.json()["points"]) == 15
@@ -0,0 +1,57 @@
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import database, frequent_foods
+from backend.models import UserFood
+
+
+def _snap(name, food_id=None):
+    return {"food_name": name, "food_id": food_id, "calories": 250.0, "protein": 10.0, "carbs": 30.0, "fat": 8.0, "meal_type": "lunch"}
+
+
+def _row(db, uid, snap):
+    db.expire_all()
+    return db.query(UserFood).filter(UserFood.user_id == uid, UserFood.combo_key == frequent_foods.combo_key(snap)).one()
+
+
+def test_new_combo_used_several_times_in_one_call(db, user):
+    uid, _ = user
+    snap = _snap(f"Творог {uuid.uuid4().hex[:6]}")
+    t0 = datetime(2025, 3, 1, 8)
+    frequent_foods.record_many(db, uid, [(snap, t0), (snap, t0 + timedelta(days=2)), (snap, t0 + timedelta(days=1))])
+    db.commit()
+    row = _row(db, uid, snap)
+    assert row.count == 3
+    assert row.last_used_at == t0 + timedelta(days=2)
+    w = [frequent_foods._weight_log2(t0 + timedelta(days=d)) for d in (0, 2, 1)]
+    assert row.log_score == pytest.approx(frequent_foods._log2_add(frequent_foods._log2_add(w[0], w[1]), w[2]))
+
+    frequent_foods.record(db, uid, snap, t0 + timedelta(days=3))
+    db.commit()
+    assert _row(db, uid, snap).count == 4
+
+
+def test_concurrent_first_uses_of_a_combo(db, user):
+    uid, _ = user
+    snap = _snap(f"Гречка {uuid.uuid4().hex[:6]}")
+    frequent_foods.record(db, uid, snap, None)  # not committed yet
+    errors = []
+
+    def second():
+        with database.SessionLocal() as other:
+            try:
+                frequent_foods.record(other, uid, snap, None)
+                other.commit()
+            except Exception as e:
+                errors.append(e)
+
+    t = threading.Thread(target=second)
+    t.start()
+    t.join(0.3)
+    db.commit()
+    t.join(10)
+    assert errors == []
+    assert _row(db, uid, snap).count == 2
@@ -0,0 +1,54 @@
+MEAL = {"food_name": "Плов", "calories": 600, "protein": 25, "carbs": 70, "fat": 22, "meal_type": "lunch"}
+
+
+def test_etag_depends_on_resolution_and_days(client, user):
+    _, headers = user
+    assert client.post("/meals", json=MEAL, headers=headers).status_code == 200
+    urls = ["/history/7", "/history/30", "/history/7?resolution=week", "/history/7?resolution=month"]
+    tags = {}
+    for url in urls:
+        r = client.get(url, headers=headers)
+        assert r.status_code == 200, r.text
+        tags[url] = r.headers["etag"]
+    assert len(set(tags.values())) == len(urls)
+    for url in urls:
+        assert client.get(url, headers=dict(headers, **{"If-None-Match": tags[url]})).status_code == 304
+        other = next(u for u in urls if u != url)
+        r = client.get(other, headers=dict(headers, **{"If-None-Match": tags[url]}))
+        assert r.status_code == 200
+        assert r.json()["resolution"] == ("day" if "resolution" not in other else other.rsplit("=", 1)[1])
+
+
+def test_etag_changes_after_a_write(client, user):
+    _, headers = user
+    tag = client.get("/history/7", headers=headers).headers["etag"]
+    assert client.post("/meals", json=MEAL, headers=headers).status_code == 200
+    r = client.get("/history/7", headers=dict(headers, **{"If-None-Match": tag}))
+    assert r.status_code == 200
+    assert r.json()["days"][-1]["calories"] == 600
+
+
+def test_cached_bodies_follow_writes_made_outside_the_api(client, db, user):
+    from sqlalchemy import update
+
+    from backend import rollups
+    from backend.models import DailyLog
+
+    uid, headers = user
+    assert client.post("/meals", json=MEAL, headers=headers).status_code == 200
+    assert client.get("/history/7?resolution=week", headers=headers).json()["days"][-1]["calories"] == 600
+    # Maintenance writes with no cache invalidation: a Core update, then the rollup rebuild CLI
+    db.execute(update(DailyLog).where(DailyLog.user_id == uid).values(calories=650))
+    rollups.rebuild(db, user_id=uid)
+    db.commit()
+    assert client.get("/history/7?resolution=week", headers=headers).json()["days"][-1]["calories"] == 650
+
+
+def test_weight_history_etag_depends_on_days(client, user):
+    _, headers = user
+    assert client.post("/profile/weight", json={"weight_kg": 79.5}, headers=headers).status_code == 200
+    tag = client.get("/profile/weight/history", params={"days": 30}, headers=headers).headers["etag"]
+    assert client.get("/profile/weight/history", params={"days": 30}, headers=dict(headers, **{"If-None-Match": tag})).status_code == 304
+    r = client.get("/profile/weight/history", params={"days": 7}, headers=dict(headers, **{"If-None-Match": tag}))
+    assert r.status_code == 200
+    assert r.json()["entries"][-1]["weight_kg"] == 79.5
@@ -0,0 +1,81 @@
+import io
+import uuid
+
+from PIL import Image
+
+from backend.models import Meal
+
+MEAL = {"food_name": "Сырники", "calories": 350, "protein": 18, "carbs": 30, "fat": 16, "meal_type": "breakfast"}
+
+
+def _key():
+    return {"Idempotency-Key": uuid.uuid4().hex}
+
+
+def test_retry_is_replayed_without_a_second_write(client, db, user):
+    uid, headers = user
+    headers = dict(headers, **_key())
+    first = client.post("/meals", json=MEAL, headers=headers)
+    again = client.post("/meals", json=MEAL, headers=headers)
+    assert first.status_code == again.status_code == 200
+    assert again.headers["idempotent-replayed"] == "true"
+    assert again.json() == first.json()
+    assert db.query(Meal).filter(Meal.user_id == uid).count() == 1
+
+
+def test_key_reused_with_another_body_is_rejected(client, user):
+    _, headers = user
+    headers = dict(headers, **_key())
+    assert client.post("/meals", json=MEAL, headers=headers).status_code == 200
+    r = client.post("/meals", json=dict(MEAL, calories=1), headers=headers)
+    assert r.status_code == 422
+    assert "idempotent-replayed" not in r.headers
+
+
+def test_deterministic_client_error_is_stored(client, user):
+    _, headers = user
+    headers = dict(headers, **_key())
+    assert client.post("/meals", json={"meal_type": "lunch"}, headers=headers).status_code == 422
+    again = client.post("/meals", json={"meal_type": "lunch"}, headers=headers)
+    assert again.status_code == 422
+    assert again.headers["idempotent-replayed"] == "true"
+
+
+def test_auth_failure_is_not_stored(client):
+    headers = dict({"Authorization": "Bearer not-a-token"}, **_key())
+    for _ in range(2):
+        r = client.post("/meals", json=MEAL, headers=headers)
+        assert r.status_code == 401
+        assert "idempotent-replayed" not in r.headers
+
+
+def test_multipart_upload_passes_through(client, user):
+    _, headers = user
+    headers = dict(headers, **_key())
+    buf = io.BytesIO()
+    Image.new("RGB", (16, 16), (uuid.uuid4().int % 256, 10, 20)).save(buf, format="PNG")
+    jobs = []
+    for _ in range(2):
+        r = client.post("/analyze/photo", files={"file": ("a.png", buf.getvalue(), "image/png")}, headers=headers)
+        assert r.status_code == 202, r.text
+        assert "idempotent-replayed" not in r.headers
+        jobs.append(r.json()["job_id"])
+    assert jobs[0] != jobs[1]
+
+
+def test_retry_after_token_refresh_is_replayed(client, db, user):
+    import time
+
+    import jwt
+
+    from backend import main
+
+    uid, headers = user
+    key = _key()
+    first = client.post("/meals", json=MEAL, headers=dict(headers, **key))
+    refreshed = jwt.encode({"sub": str(uid), "exp": int(time.time()) + 7200}, main.settings.JWT_SECRET, algorithm="HS256")
+    assert f"Bearer {refreshed}" != headers["Authorization"]
+    again = client.post("/meals", json=MEAL, headers=dict({"Authorization": f"Bearer {refreshed}"}, **key))
+    assert again.headers["idempotent-replayed"] == "true"
+    assert again.json() == first.json()
+    assert db.query(Meal).filter(Meal.user_id == uid).count() == 1
@@ -0,0 +1,100 @@
+import hashlib
+import os
+import uuid
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from backend import image_store
+from backend.models import ImageBlob
+
+
+def _old_blob(db, size=100):
+    """A stored blob older than anything else, so it is evicted first."""
+    sha = uuid.uuid4().hex * 2
+    path = image_store.blob_path(sha, ".jpg")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    db.add(ImageBlob(sha256=sha, path=path, size=size, last_used_at=datetime(2000, 1, 1)))
+    db.commit()
+    return sha, path
+
+
+def _evict_one(db, size=100):
+    total = db.scalar(select(func.sum(ImageBlob.size)).where(ImageBlob.path.isnot(None)))
+    return image_store.evict(db, max_bytes=total - size)
+
+
+def test_rollback_keeps_evicted_file(db):
+    sha, path = _old_blob(db)
+    assert _evict_one(db) == 100
+    assert os.path.exists(path)
+    db.rollback()
+    assert os.path.exists(path)
+    assert db.get(ImageBlob, sha).path == path
+    db.delete(db.get(ImageBlob, sha))
+    db.commit()
+    os.remove(path)
+
+
+def test_commit_deletes_evicted_file(db):
+    sha, path = _old_blob(db)
+    assert _evict_one(db) == 100
+    assert os.path.exists(path)
+    db.commit()
+    assert not os.path.exists(path)
+    blob = db.get(ImageBlob, sha)
+    assert blob.path is None and blob.size == 0
+
+
+def test_eviction_detaches_meal_images(db, user):
+    from backend.models import Meal
+
+    uid, _ = user
+    sha, path = _old_blob(db)
+    meal = Meal(user_id=uid, food_name="Фото", calories=0, meal_type="snack", image_url=image_store.media_url(path))
+    db.add(meal)
+    db.commit()
+    _evict_one(db)
+    db.commit()
+    db.refresh(meal)
+    assert meal.image_url is None
+    assert not os.path.exists(path)
+
+
+def test_concurrent_first_uploads_of_same_bytes(db):
+    import threading
+
+    from backend import database
+
+    data = uuid.uuid4().bytes * 10
+    sha = hashlib.sha256(data).hexdigest()
+
+    def tmp_upload():
+        tmp = image_store.store_dir(image_store.TMP_SUBDIR, uuid.uuid4().hex)
+        os.makedirs(os.path.dirname(tmp), exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(data)
+        return tmp
+
+    image_store.put(db, sha, tmp_upload(), len(data), ".jpg")  # first upload, not committed yet
+    errors = []
+
+    def second():
+        with database.SessionLocal() as other:
+            try:
+                image_store.put(other, sha, tmp_upload(), len(data), ".jpg")
+                other.commit()
+            except Exception as e:
+                errors.append(e)
+
+    t = threading.Thread(target=second)
+    t.start()
+    t.join(0.3)
+    db.commit()
+    t.join(10)
+    assert errors == []
+    db.expire_all()
+    blob = db.get(ImageBlob, sha)
+    assert blob.size == len(data) and os.path.exists(blob.path)
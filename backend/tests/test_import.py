@@ -0,0 +1,55 @@
+import json
+from datetime import datetime, timedelta
+
+from backend import progress
+from backend.models import Meal, UserProgress, WeightEntry
+
+
+def _ndjson(records):
+    return "\n".join(json.dumps(r, ensure_ascii=False) for r in records).encode()
+
+
+def _import(client, headers, records):
+    r = client.post("/import", files={"file": ("history.ndjson", _ndjson(records), "application/x-ndjson")}, headers=headers)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _history(days_ago=10):
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(days=days_ago)
+    meals = [
+        {"table": "meals", "food_name": f"Каша {i}", "calories": 300 + i, "meal_type": "breakfast", "created_at": (start + timedelta(days=i)).isoformat()}
+        for i in range(6)
+    ]
+    weights = [{"table": "weight_entries", "date": (start + timedelta(days=i)).date().isoformat(), "weight_kg": 80 - i * 0.1} for i in range(3)]
+    return meals + weights
+
+
+def test_reimport_skips_duplicates_and_upserts_weights(client, db, user):
+    uid, headers = user
+    records = _history()
+    first = _import(client, headers, records)
+    assert (first["meals"], first["weights"], first["duplicates"], first["errors"]) == (6, 3, 0, 0)
+
+    records[-1] = dict(records[-1], weight_kg=75.5)
+    again = _import(client, headers, records)
+    assert (again["meals"], again["duplicates"]) == (0, 6)
+    assert db.query(Meal).filter(Meal.user_id == uid).count() == 6
+    weights = db.query(WeightEntry).filter(WeightEntry.user_id == uid).order_by(WeightEntry.date).all()
+    assert len(weights) == 3
+    assert weights[-1].weight_kg == 75.5
+
+
+def test_import_keeps_earned_achievement_dates(client, db, user):
+    uid, headers = user
+    meal = {"food_name": "Салат", "calories": 150, "protein": 5, "carbs": 10, "fat": 9, "meal_type": "lunch"}
+    assert client.post("/meals", json=meal, headers=headers).status_code == 200
+    earned = progress.unlocked(db.get(UserProgress, uid))["first_meal"]
+
+    _import(client, headers, _history(days_ago=30))
+    db.expire_all()
+    after = progress.unlocked(db.get(UserProgress, uid))
+    assert after["first_meal"] == earned
+    # Newly reached ones are dated from the imported history
+    assert after["five_meals"] < earned
+    assert "weight_logged" in after
@@ -0,0 +1,48 @@
+import uuid
+from datetime import datetime, timedelta
+
+from backend.models import DailyLog, Meal
+
+
+def _item(client_id, calories=300, **extra):
+    return dict({"client_id": client_id, "food_name": "Омлет", "calories": calories, "protein": 20, "carbs": 2, "fat": 22, "meal_type": "breakfast"}, **extra)
+
+
+def _logged(db, uid):
+    db.expire_all()
+    meals = db.query(Meal).filter(Meal.user_id == uid).count()
+    calories = sum(l.calories or 0 for l in db.query(DailyLog).filter(DailyLog.user_id == uid))
+    return meals, calories
+
+
+def test_replayed_batch_reports_existing(client, db, user):
+    uid, headers = user
+    items = [_item(uuid.uuid4().hex), _item(uuid.uuid4().hex, calories=500)]
+    first = client.post("/meals/batch", json={"items": items}, headers=headers).json()
+    assert first["created"] == 2
+    assert [r["status"] for r in first["items"]] == ["created", "created"]
+
+    again = client.post("/meals/batch", json={"items": items}, headers=headers).json()
+    assert again["created"] == 0
+    assert [r["status"] for r in again["items"]] == ["exists", "exists"]
+    assert [r["meal"]["id"] for r in again["items"]] == [r["meal"]["id"] for r in first["items"]]
+    assert _logged(db, uid) == (2, 800)
+
+
+def test_repeats_within_one_batch_insert_once(client, db, user):
+    uid, headers = user
+    key = uuid.uuid4().hex
+    body = client.post("/meals/batch", json={"items": [_item(key), _item(key, calories=999)]}, headers=headers).json()
+    assert body["created"] == 1
+    assert [r["status"] for r in body["items"]] == ["created", "exists"]
+    assert body["items"][0]["meal"] == body["items"][1]["meal"]
+    assert _logged(db, uid) == (1, 300)
+
+
+def test_item_errors_do_not_fail_the_batch(client, db, user):
+    uid, headers = user
+    future = (datetime.utcnow() + timedelta(days=2)).isoformat()
+    items = [_item(uuid.uuid4().hex), _item(uuid.uuid4().hex, created_at=future), {"client_id": uuid.uuid4().hex, "food_name": "?", "meal_type": "snack"}]
+    body = client.post("/meals/batch", json={"items": items}, headers=headers).json()
+    assert [r["status"] for r in body["items"]] == ["created", "error", "error"]
+    assert _logged(db, uid) == (1, 300)
@@ -0,0 +1,60 @@
+def _page_through(client, headers, limit, **params):
+    seen, cursor = [], None
+    for _ in range(100):
+        r = client.get("/meals", params={"limit": limit, **params, **({"cursor": cursor} if cursor else {})}, headers=headers)
+        assert r.status_code == 200, r.text
+        page = r.json()
+        seen += [m["id"] for m in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            return seen
+    raise AssertionError("cursor did not advance")
+
+
+def test_keyset_pages_cover_ties_once_in_order(client, user):
+    _, headers = user
+    # Batch items share created_at, so pages must break ties on id
+    items = [{"client_id": f"c{i}", "food_name": f"f{i}", "calories": 100, "meal_type": "lunch"} for i in range(5)]
+    assert client.post("/meals/batch", json={"items": items}, headers=headers).status_code == 200
+    for i in range(3):
+        assert client.post("/meals", json={"food_name": f"m{i}", "calories": 50, "meal_type": "snack"}, headers=headers).status_code == 200
+    everything = [m["id"] for m in client.get("/meals", params={"limit": 200}, headers=headers).json()["items"]]
+    assert len(everything) == 8
+    for limit in (1, 2, 3, 7):
+        assert _page_through(client, headers, limit) == everything
+
+
+def test_new_meal_between_pages_is_not_repeated(client, user):
+    _, headers = user
+    for i in range(4):
+        client.post("/meals", json={"food_name": f"m{i}", "calories": 50, "meal_type": "snack"}, headers=headers)
+    first = client.get("/meals", params={"limit": 2}, headers=headers).json()
+    client.post("/meals", json={"food_name": "late", "calories": 50, "meal_type": "snack"}, headers=headers)
+    second = client.get("/meals", params={"limit": 10, "cursor": first["next_cursor"]}, headers=headers).json()
+    ids = [m["id"] for m in first["items"] + second["items"]]
+    assert len(ids) == len(set(ids)) == 4
+
+
+def test_projection_and_bad_cursor(client, user):
+    _, headers = user
+    client.post("/meals", json={"food_name": "a", "calories": 1, "meal_type": "snack"}, headers=headers)
+    items = client.get("/meals", params={"fields": "id,food_name"}, headers=headers).json()["items"]
+    assert set(items[0]) == {"id", "food_name"}
+    assert client.get("/meals", params={"fields": "nope"}, headers=headers).status_code == 400
+    assert client.get("/meals", params={"cursor": "zzz"}, headers=headers).status_code == 400
+
+
+def test_cursor_compares_native_timestamps_on_postgres():
+    from datetime import datetime, timezone
+
+    from sqlalchemy.dialects.postgresql import asyncpg
+
+    from backend import main
+
+    after = (datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc), 42)
+    q = main._meals_page_query(1, ["id", "food_name"], None, None, after, "postgresql")
+    sql = str(q.compile(dialect=asyncpg.dialect()))
+    assert "(meals.created_at, meals.id) < ($" in sql
+    assert "VARCHAR" not in sql and "substr" not in sql
+    params = q.compile(dialect=asyncpg.dialect()).params
+    assert after[0] in params.values()
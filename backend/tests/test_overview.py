@@ -0,0 +1,53 @@
+from sqlalchemy import delete, event
+from sqlalchemy.orm import Session
+
+from backend.models import DailyLog, UserProgress
+
+MEAL = {"food_name": "Омлет", "calories": 300, "protein": 20, "carbs": 2, "fat": 22, "meal_type": "breakfast"}
+
+
+def _queries(client, headers):
+    r = client.get("/profile/overview", headers=headers)
+    assert r.status_code == 200, r.text
+    return int(r.headers["X-DB-Queries"])
+
+
+def test_overview_is_read_only_and_etag_stable(client, db, user):
+    uid, headers = user
+    first = client.get("/profile/overview", headers=headers)
+    assert first.status_code == 200
+    assert first.json()["today"]["calories"]["value"] == 0
+    assert first.json()["day_score"] == 0
+    assert db.query(DailyLog).filter(DailyLog.user_id == uid).count() == 0
+    again = client.get("/profile/overview", headers={**headers, "If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+
+
+def test_overview_query_count(client, user):
+    _, headers = user
+    assert _queries(client, headers) == 4  # new user, nothing logged
+    assert client.post("/meals", json=MEAL, headers=headers).status_code == 200
+    assert client.post("/profile/weight", json={"weight_kg": 79}, headers=headers).status_code == 200
+    assert _queries(client, headers) == 4  # history and materialized progress
+
+
+def test_overview_derives_missing_progress_without_adding_it(client, db, user):
+    uid, headers = user
+    assert client.post("/meals", json=MEAL, headers=headers).status_code == 200
+    # A user whose history predates the materialized progress row
+    db.execute(delete(UserProgress).where(UserProgress.user_id == uid))
+    db.commit()
+    added = []
+
+    def on_add(session, obj):
+        added.append(obj)
+
+    event.listen(Session, "transient_to_pending", on_add)
+    try:
+        r = client.get("/profile/overview", headers=headers)
+    finally:
+        event.remove(Session, "transient_to_pending", on_add)
+    assert r.status_code == 200
+    assert added == []
+    assert [a["id"] for a in r.json()["achievements"]] == ["first_meal"]
+    assert db.get(UserProgress, uid) is None
@@ -0,0 +1,73 @@
+import io
+import time
+import uuid
+
+from PIL import Image
+
+from backend import photo_pipeline
+from backend.models import DailyLog, Meal, PhotoJob
+
+RESULT = {"food_name": "Борщ", "calories": 420.0, "protein": 20.0, "carbs": 40.0, "fat": 15.0}
+
+
+def _png(seed: int) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (32, 32), (seed % 256, (seed * 7) % 256, (seed * 13) % 256)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _wait(client, headers, job_id, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/analyze/photo/jobs/{job_id}", headers=headers).json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("photo job did not finish")
+
+
+def _day_calories(db, uid):
+    db.expire_all()
+    return sum(l.calories or 0 for l in db.query(DailyLog).filter(DailyLog.user_id == uid))
+
+
+def test_job_fills_placeholder_and_daily_log(client, db, user):
+    uid, headers = user
+    r = client.post("/analyze/photo", files={"file": ("dish.png", _png(uuid.uuid4().int), "image/png")}, headers=headers)
+    assert r.status_code == 202, r.text
+    job = _wait(client, headers, r.json()["job_id"])
+    assert job["status"] == "done"
+    assert job["meal"]["calories"] == job["analysis"]["calories"] > 0
+    assert _day_calories(db, uid) == job["meal"]["calories"]
+
+
+def test_result_never_lands_on_another_users_meal(client, db, user):
+    owner, owner_headers = user
+    other = client.post("/users", json={"telegram_id": uuid.uuid4().hex[:12]}).json()["id"]
+    meal = Meal(user_id=other, food_name="чужое", calories=100, protein=0, carbs=0, fat=0, meal_type="lunch", day="2024-01-01")
+    db.add(meal)
+    db.flush()
+    # Placeholder id reused by someone else's meal (no FK enforcement on SQLite)
+    job = PhotoJob(id=uuid.uuid4().hex, user_id=owner, meal_id=meal.id, status="running", file_path="x.jpg")
+    db.add(job)
+    db.flush()
+    photo_pipeline._apply_result(db, job, dict(RESULT))
+    db.commit()
+    db.refresh(meal)
+    assert (meal.food_name, meal.calories) == ("чужое", 100)
+    assert job.status == "done"
+
+
+def test_deleting_placeholder_detaches_job(client, db, user):
+    uid, headers = user
+    meal_id = client.post("/meals", json={"food_name": "Фото", "calories": 0, "meal_type": "snack"}, headers=headers).json()["id"]
+    job_id = uuid.uuid4().hex
+    db.add(PhotoJob(id=job_id, user_id=uid, meal_id=meal_id, status="running", file_path="x.jpg"))
+    db.commit()
+    assert client.delete(f"/meals/{meal_id}", headers=headers).status_code == 200
+    db.expire_all()
+    job = db.get(PhotoJob, job_id)
+    assert job.meal_id is None
+    photo_pipeline._apply_result(db, job, dict(RESULT))
+    db.commit()
+    assert _day_calories(db, uid) == 0
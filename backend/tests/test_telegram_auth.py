@@ -0,0 +1,58 @@
+import hashlib
+import hmac
+import json
+import time
+import urllib.parse
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from backend import telegram_auth
+
+
+def _init_data(auth_date=None, **fields):
+    data = dict({"auth_date": str(int(auth_date or time.time())), "query_id": uuid.uuid4().hex,
+                 "user": json.dumps({"id": 42, "first_name": "Иван"})}, **fields)
+    check = "\n".join(f"{k}={v}" for k, v in sorted(data.items()))
+    secret = hashlib.sha256(b"123:test").digest()
+    data["hash"] = hmac.new(secret, check.encode(), hashlib.sha256).hexdigest()
+    return urllib.parse.urlencode(data)
+
+
+def _status(init_data):
+    with pytest.raises(HTTPException) as e:
+        telegram_auth.verify(init_data)
+    return e.value.status_code
+
+
+def test_reuse_window_answers_from_cache():
+    init_data = _init_data()
+    before = telegram_auth.stats()
+    first = telegram_auth.verify(init_data)
+    assert "hash" not in first and first["query_id"]
+    assert telegram_auth.verify(init_data) == first
+    after = telegram_auth.stats()
+    assert after["verified"] - before["verified"] == 1
+    assert after["hits"] - before["hits"] == 1
+    # Keyed by digest, not by the raw string
+    assert hashlib.sha256(init_data.encode()).digest() in telegram_auth._verified
+    assert init_data not in telegram_auth._verified
+
+
+def test_replay_after_the_window_is_rejected(monkeypatch):
+    monkeypatch.setattr(telegram_auth.settings, "TELEGRAM_INITDATA_REUSE_SECONDS", 0)
+    init_data = _init_data()
+    telegram_auth.verify(init_data)
+    time.sleep(0.01)
+    assert _status(init_data) == 401
+
+
+def test_bad_or_expired_data_is_rejected_and_not_cached():
+    size = telegram_auth.stats()["size"]
+    tampered = _init_data().replace("query_id=", "query_id=x")
+    assert _status(tampered) == 401
+    assert _status(tampered) == 401
+    assert _status(_init_data(auth_date=time.time() - telegram_auth.settings.TELEGRAM_AUTH_MAX_AGE_SECONDS - 60)) == 401
+    assert _status("auth_date=1") == 400
+    assert telegram_auth.stats()["size"] == size
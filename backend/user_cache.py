@@ -0,0 +1,86 @@
+"""Bounded TTL/LRU cache of User rows for request authentication.
+
+Entries hold plain column values, not ORM instances, so a hit can be attached
+to the request's session without a SELECT. Invalidate on every profile write;
+the TTL bounds staleness across worker processes.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from sqlalchemy.orm import Session, make_transient_to_detached
+from .models import User
+
+_COLUMNS = [attr.key for attr in User.__mapper__.column_attrs]
+
+
+class UserCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, db: Session, user_id: int) -> Optional[User]:
+        """Return the user attached to `db` from cache, or None on miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._data[user_id]
+                self.misses += 1
+                return None
+            self._data.move_to_end(user_id)
+            self.hits += 1
+            values = entry[1]
+        # Already loaded by this session (e.g. second dependency) -> reuse
+        existing = db.identity_map.get(db.identity_key(User, user_id))
+        if existing is not None:
+            return existing
+        user = User(**values)
+        make_transient_to_detached(user)
+        db.add(user)
+        return user
+
+    def contains(self, user_id: int) -> bool:
+        with self._lock:
+            entry = self._data.get(user_id)
+            return entry is not None and entry[0] >= time.monotonic()
+
+    def put(self, user: User):
+        if self.maxsize <= 0:
+            return
+        values = {k: getattr(user, k) for k in _COLUMNS}
+        with self._lock:
+            self._data[user.id] = (time.monotonic() + self.ttl, values)
+            self._data.move_to_end(user.id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: Optional[int] = None):
+        """Drop one user (or everything when user_id is None)."""
+        with self._lock:
+            if user_id is None:
+                self._data.clear()
+            else:
+                self._data.pop(user_id, None)
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
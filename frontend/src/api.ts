@@ -38,6 +38,15 @@ async function apiFetch(path: string, options: RequestInit = {}, auth = true, re
   return res.json()
 }
 
+function qs(params: Record<string, string | number | boolean | undefined>) {
+  const search = new URLSearchParams(Object.entries(params).filter(([, v]) => v !== undefined).map(([k, v]) => [k, String(v)]))
+  const str = search.toString()
+  return str ? `?${str}` : ''
+}
+
+// One key per logical write; retries of the same call reuse it
+const idem = () => ({ 'Idempotency-Key': crypto.randomUUID() })
+
 export const api = {
   health: () => apiFetch('/health', {}, false),
   authTelegram: async (init_data: string) => {
@@ -49,18 +58,21 @@ export const api = {
     return data
   },
   createOrUpdateUser: (payload: any) => apiFetch('/users', { method:'POST', body: JSON.stringify(payload) }),
-  summary: (tg_id: string) => apiFetch(`/summary/${tg_id}`, {}, false),
-  listMeals: () => apiFetch('/meals'),
-  createMeal: (payload: any) => apiFetch('/meals', { method:'POST', body: JSON.stringify(payload) }),
+  summary: (tg_id: string, params: { date?: string, from?: string, to?: string, include_meals?: boolean } = {}) => apiFetch(`/summary/${tg_id}${qs(params)}`, {}, false),
+  listMeals: (params: { limit?: number, cursor?: string, from?: string, to?: string, fields?: string } = {}) => apiFetch(`/meals${qs(params)}`),
+  frequentMeals: (params: { limit?: number, sort?: 'frequent' | 'recent' } = {}) => apiFetch(`/meals/frequent${qs(params)}`),
+  searchFoods: (q: string, limit: number = 10) => apiFetch(`/foods/search${qs({ q, limit })}`),
+  createMeal: (payload: any) => apiFetch('/meals', { method:'POST', headers: idem(), body: JSON.stringify(payload) }),
+  createMealsBatch: (items: any[]) => apiFetch('/meals/batch', { method:'POST', body: JSON.stringify({ items }) }),
   updateMeal: (id: number, payload: any) => apiFetch(`/meals/${id}`, { method:'PATCH', body: JSON.stringify(payload) }),
   deleteMeal: (id: number) => apiFetch(`/meals/${id}`, { method:'DELETE' }),
-  history: (days: number) => apiFetch(`/history/${days}`),
+  history: (days: number, resolution: 'day' | 'week' | 'month' = 'day') => apiFetch(`/history/${days}?resolution=${resolution}`),
   forecastWeight: (days: number = 30) => apiFetch(`/forecast/weight?days=${days}`),
   macroGoals: () => apiFetch('/goals/macros'),
   profileOverview: () => apiFetch('/profile/overview'),
   addWeight: (weight_kg: number, date?: string) => apiFetch('/profile/weight', { method:'POST', body: JSON.stringify({ weight_kg, date }) }),
   weightHistory: (days: number = 30) => apiFetch(`/profile/weight/history?days=${days}`),
-  addWater: (amount_l: number, date?: string) => apiFetch('/profile/water', { method:'POST', body: JSON.stringify({ amount_l, date }) }),
+  addWater: (amount_l: number, date?: string) => apiFetch('/profile/water', { method:'POST', headers: idem(), body: JSON.stringify({ amount_l, date }) }),
   setSleep: (hours: number, date?: string) => apiFetch('/profile/sleep', { method:'POST', body: JSON.stringify({ hours, date }) }),
   analyzePhoto: async (file: File) => {
     const { accessToken } = useDataStore.getState()
@@ -70,7 +82,8 @@ export const api = {
     const res = await fetch(`${API_BASE}/analyze/photo`, { method:'POST', headers:{ 'Authorization': `Bearer ${accessToken}` }, body: form })
     if (!res.ok) throw new Error(await res.text())
     return res.json()
-  }
+  },
+  photoJob: (jobId: string) => apiFetch(`/analyze/photo/jobs/${jobId}`)
 }
 
 export function logout() {